@@ -0,0 +1,161 @@
+"""Sign signature requests from files, without the REPL or a camera
+
+Run as ``hermit-sign``::
+
+    $ hermit-sign --testnet --output-dir /media/usb/signed /media/usb/requests/*
+
+Each request file may hold a JSON signature request, a PSBT (binary
+or base64), or an image of a signature request QR code.  The wallet
+is unlocked once, before the first request, and locked again once
+every request has been handled.
+
+Each request is validated and displayed just as ``sign-bitcoin``
+would, and the user is asked to confirm it unless ``--yes`` is given.
+Signatures are written to the output directory (by default, the
+directory of each request) as ``NAME.signature.json``, or as
+``NAME.signed.psbt`` for PSBTs.  A request whose signature would be
+written to the same file as an earlier request's (such as ``a.json``
+and ``a.png``) is reported and skipped.
+"""
+
+import argparse
+import time
+from base64 import b64encode
+from os import environ, path
+from typing import Dict, List, Optional
+
+from hermit.config import HermitConfig
+from hermit.errors import HermitError
+from hermit.pubkey_cache import PublicKeyCache
+from hermit.qrcode.reader import read_qr_code_image
+from hermit.signer.bitcoin_signer import BitcoinSigner
+from hermit.signer.psbt import PSBT_MAGIC, is_psbt
+from hermit.wallet import HDWallet
+
+#: Suffixes of request files read as images of a QR code.
+IMAGE_SUFFIXES = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tif', '.tiff')
+
+
+def read_request_file(request_path: str, max_size: Optional[int] = None) -> str:
+    """Return the signature request in a file
+
+    Binary PSBTs are base64-encoded, as they would be in a QR code.
+    """
+    if path.splitext(request_path)[1].lower() in IMAGE_SUFFIXES:
+        request_data = read_qr_code_image(request_path, max_size)
+        if request_data is None:
+            raise HermitError("No QR code found in {}".format(request_path))
+        return request_data
+
+    with open(request_path, 'rb') as request_file:
+        data = request_file.read()
+    if data.startswith(PSBT_MAGIC):
+        return b64encode(data).decode('ascii')
+    try:
+        return data.decode('utf8').strip()
+    except UnicodeDecodeError:
+        raise HermitError("{} is not a signature request".format(request_path))
+
+
+def signature_path(request_path: str,
+                   request_data: str,
+                   output_dir: Optional[str] = None) -> str:
+    """Return the path to write the signature of a request file to
+
+    The signature of a PSBT request is itself a PSBT.
+    """
+    (directory, filename) = path.split(request_path)
+    name = path.splitext(filename)[0]
+    suffix = '.signed.psbt' if is_psbt(request_data) else '.signature.json'
+    return path.join(output_dir if output_dir is not None else directory,
+                     name + suffix)
+
+
+def sign_files(wallet: HDWallet,
+               request_paths: List[str],
+               output_dir: Optional[str] = None,
+               testnet: bool = False,
+               confirm: bool = True,
+               config: Optional[HermitConfig] = None) -> int:
+    """Sign each request file, writing a signature file for each
+
+    A request that cannot be read or is invalid is reported and
+    skipped.  Returns the number of such requests.
+    """
+    if config is None:
+        config = HermitConfig.load()
+
+    failures = 0
+    signed = 0
+    # Request path by the signature path it was written to
+    written: Dict[str, str] = {}
+    start = time.perf_counter()
+    for request_path in request_paths:
+        print("==> {}".format(request_path))
+        signer = BitcoinSigner(wallet,
+                               signing_processes=config.signing_processes,
+                               parallel_signing_threshold=config.parallel_signing_threshold,
+                               request_limits=config.request_limits)
+        try:
+            request_data = read_request_file(
+                request_path, config.request_limits['max_request_size'])
+            output_path = path.normpath(
+                signature_path(request_path, request_data, output_dir))
+            if output_path in written:
+                raise HermitError("{} already holds the signature of {}".format(
+                    output_path, written[output_path]))
+            signature = signer.sign_request(request_data,
+                                            testnet=testnet,
+                                            confirm=confirm)
+        except (HermitError, IOError) as e:
+            print("Unable to sign {}: {}".format(request_path, e))
+            failures += 1
+            continue
+        if signature is None:
+            print("Not signed.")
+            continue
+        with open(output_path, 'w') as signature_file:
+            signature_file.write(signature)
+        written[output_path] = request_path
+        print("Signature written to {}".format(output_path))
+        signed += 1
+
+    print("Signed {} of {} requests in {:.2f}s".format(
+        signed, len(request_paths), time.perf_counter() - start))
+    return failures
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog='hermit-sign',
+        description="Sign Bitcoin signature requests read from files.")
+    parser.add_argument('requests', nargs='+', metavar='REQUEST',
+                        help="a JSON, PSBT, or QR code image signature request")
+    parser.add_argument('-o', '--output-dir',
+                        help="where to write signatures (default: next to each request)")
+    parser.add_argument('--testnet', action='store_true',
+                        default='TESTNET' in environ,
+                        help="sign testnet transactions")
+    parser.add_argument('-y', '--yes', action='store_true',
+                        help="sign without asking to confirm each request")
+    args = parser.parse_args(argv)
+
+    config = HermitConfig.load()
+    wallet = HDWallet(
+        public_key_cache=PublicKeyCache(config.public_key_cache_file))
+    try:
+        wallet.unlock()
+    except HermitError as e:
+        print("Unable to unlock wallet: {}".format(e))
+        return 1
+
+    try:
+        failures = sign_files(wallet,
+                              args.requests,
+                              output_dir=args.output_dir,
+                              testnet=args.testnet,
+                              confirm=not args.yes,
+                              config=config)
+    finally:
+        wallet.lock()
+    return 1 if failures else 0
@@ -0,0 +1,171 @@
+import hashlib
+from typing import List, Optional
+
+from bitcoin import base58
+from pybitcointools import bin_hash160
+
+from hermit import crypto, secp256k1
+from hermit.errors import HermitError
+
+#: Version bytes for mainnet extended private keys (``xprv``).
+XPRV_VERSION = bytes.fromhex('0488ade4')
+
+#: Version bytes for mainnet extended public keys (``xpub``).
+XPUB_VERSION = bytes.fromhex('0488b21e')
+
+HARDENED_OFFSET = 2 ** 31
+
+
+def _checksum(data: bytes) -> bytes:
+    return hashlib.sha256(hashlib.sha256(data).digest()).digest()[:4]
+
+
+class BIP32Node(object):
+    """A single node in a BIP32 hierarchy, held as raw bytes
+
+    Derivation works directly on the chain code and key bytes, so no
+    base58 encoding or checksum hashing happens until a node is
+    exported with ``to_xprv`` or ``to_xpub``.
+
+    A node always has a ``public_key``.  It also has a
+    ``private_key`` unless it was parsed from an ``xpub``.  The public
+    key of a private node is computed on first use and then kept.
+    """
+
+    __slots__ = ('depth', 'fingerprint', 'child_number', 'chain_code',
+                 'private_key', '_public_key')
+
+    def __init__(self,
+                 depth: int,
+                 fingerprint: bytes,
+                 child_number: int,
+                 chain_code: bytes,
+                 private_key: Optional[bytes] = None,
+                 public_key: Optional[bytes] = None) -> None:
+        self.depth = depth
+        self.fingerprint = fingerprint
+        self.child_number = child_number
+        self.chain_code = chain_code
+        self.private_key = private_key
+        self._public_key = public_key
+
+    @classmethod
+    def from_seed(cls, seed: bytes) -> 'BIP32Node':
+        """Return the master node for the given seed"""
+        I = crypto.backend().hmac_sha512(b"Bitcoin seed", seed)
+        return cls(0, b'\x00' * 4, 0, I[32:], private_key=I[:32])
+
+    @classmethod
+    def from_extended_key(cls, xkey: str) -> 'BIP32Node':
+        """Parse a base58check-encoded ``xprv`` or ``xpub``"""
+        data = base58.decode(xkey)
+        if len(data) != 82 or _checksum(data[:78]) != data[78:]:
+            raise HermitError("Invalid extended key.")
+        version = data[0:4]
+        depth = data[4]
+        fingerprint = data[5:9]
+        child_number = int.from_bytes(data[9:13], 'big')
+        chain_code = data[13:45]
+        if version == XPRV_VERSION:
+            return cls(depth, fingerprint, child_number, chain_code,
+                       private_key=data[46:78])
+        if version == XPUB_VERSION:
+            return cls(depth, fingerprint, child_number, chain_code,
+                       public_key=data[45:78])
+        raise HermitError("Invalid extended key.")
+
+    @property
+    def public_key(self) -> bytes:
+        """The 33-byte compressed public key of this node"""
+        if self._public_key is None:
+            if self.private_key is None:
+                raise HermitError("BIP32 node has no key.")
+            self._public_key = crypto.backend().public_key(self.private_key)
+        return self._public_key
+
+    def identifier(self) -> bytes:
+        """The HASH160 of this node's public key"""
+        return bin_hash160(self.public_key)
+
+    def child(self, index: int) -> 'BIP32Node':
+        """Derive the private child node at the given index"""
+        if self.private_key is None:
+            raise HermitError("Cannot derive a private child from a public key.")
+        if index >= HARDENED_OFFSET:
+            data = b'\x00' + self.private_key
+        else:
+            data = self.public_key
+        I = crypto.backend().hmac_sha512(self.chain_code,
+                                         data + index.to_bytes(4, 'big'))
+        tweak = int.from_bytes(I[:32], 'big')
+        secret = (tweak + int.from_bytes(self.private_key, 'big')) % secp256k1.N
+        if tweak >= secp256k1.N or secret == 0:
+            raise HermitError("Invalid BIP32 child key.")
+        return BIP32Node(self.depth + 1,
+                         self.identifier()[:4],
+                         index,
+                         I[32:],
+                         private_key=secret.to_bytes(32, 'big'))
+
+    def public_child(self, index: int) -> 'BIP32Node':
+        """Derive the public child node at the given index
+
+        Only needs this node's public key and chain code, so it works
+        on nodes parsed from an ``xpub``.  The child has no private
+        key, even if this node has one.
+        """
+        return self._public_child(index, self.identifier()[:4])
+
+    def public_children(self, indices: range) -> List['BIP32Node']:
+        """Derive the public child nodes at each of the given indices
+
+        This node's fingerprint is computed once and shared by every
+        child.
+        """
+        fingerprint = self.identifier()[:4]
+        return [self._public_child(index, fingerprint)
+                for index in indices]
+
+    def _public_child(self, index: int, fingerprint: bytes) -> 'BIP32Node':
+        if index >= HARDENED_OFFSET:
+            raise HermitError("Cannot derive a hardened child from a public key.")
+        I = crypto.backend().hmac_sha512(
+            self.chain_code, self.public_key + index.to_bytes(4, 'big'))
+        if int.from_bytes(I[:32], 'big') >= secp256k1.N:
+            raise HermitError("Invalid BIP32 child key.")
+        try:
+            child_key = crypto.backend().tweak_public_key(self.public_key, I[:32])
+        except ValueError:
+            raise HermitError("Invalid BIP32 child key.")
+        return BIP32Node(self.depth + 1,
+                         fingerprint,
+                         index,
+                         I[32:],
+                         public_key=child_key)
+
+    def neutered(self) -> 'BIP32Node':
+        """Return a copy of this node without its private key"""
+        return BIP32Node(self.depth,
+                         self.fingerprint,
+                         self.child_number,
+                         self.chain_code,
+                         public_key=self.public_key)
+
+    def to_xprv(self) -> str:
+        """Serialize this node as a base58check ``xprv``"""
+        if self.private_key is None:
+            raise HermitError("Cannot export a private key from a public key.")
+        return self._serialize(XPRV_VERSION, b'\x00' + self.private_key)
+
+    def to_xpub(self) -> str:
+        """Serialize this node as a base58check ``xpub``"""
+        return self._serialize(XPUB_VERSION, self.public_key)
+
+    def _serialize(self, version: bytes, key_data: bytes) -> str:
+        data = (version
+                + bytes([self.depth % 256])
+                + self.fingerprint
+                + self.child_number.to_bytes(4, 'big')
+                + self.chain_code
+                + key_data)
+        return base58.encode(data + _checksum(data))
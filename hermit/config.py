@@ -12,7 +12,15 @@ class HermitConfig:
     The following settings are supported:
 
     * `shards_file` -- path to store shards
+    * `public_key_cache_file` -- path to cache exported public keys (defaults to `shards_file` with a `.pubkeys` suffix)
     * `plugin_dir` -- directory containing plugins
+    * `signing_processes` -- number of processes to sign large requests with (defaults to 1, signing in-process)
+    * `parallel_signing_threshold` -- minimum number of inputs for a request to be signed across `signing_processes` (defaults to 256)
+    * `decryption_processes` -- number of processes to decrypt shards with while unlocking (defaults to 1, decrypting in-process).  Shard passwords are sent to, and decrypted mnemonics returned from, these worker processes.
+    * `max_request_size` -- largest signature request, in characters, that will be decoded (defaults to 1 MiB)
+    * `max_request_depth` -- deepest nesting of arrays and objects allowed in a signature request (defaults to 32)
+    * `max_request_inputs` -- most inputs (and input groups) allowed in a signature request (defaults to 10000)
+    * `max_request_outputs` -- most outputs allowed in a signature request (defaults to 10000)
     * `commands` -- a dictionary of command lines used to manipulate storage, see :attribute:`hermit.HermitConfig.DefaultCommands`.
 
     """
@@ -43,6 +51,22 @@ class HermitConfig:
         'plugin_dir': '/var/lib/hermit',
     }
 
+    DefaultSigning = {
+        'signing_processes': 1,
+        'parallel_signing_threshold': 256,
+    }
+
+    DefaultDecryption = {
+        'decryption_processes': 1,
+    }
+
+    DefaultRequestLimits = {
+        'max_request_size': 1048576,
+        'max_request_depth': 32,
+        'max_request_inputs': 10000,
+        'max_request_outputs': 10000,
+    }
+
     def __init__(self, config_file: str):
 
         """
@@ -62,8 +86,22 @@ class HermitConfig:
 
         if 'shards_file' in self.config:
             self.shards_file = self.config['shards_file']
+        self.public_key_cache_file = self.shards_file + '.pubkeys'
+        if 'public_key_cache_file' in self.config:
+            self.public_key_cache_file = self.config['public_key_cache_file']
         if 'plugin_dir' in self.config:
             self.plugin_dir = self.config['plugin_dir']
+        self.signing_processes = self.config.get(
+            'signing_processes', self.DefaultSigning['signing_processes'])
+        self.parallel_signing_threshold = self.config.get(
+            'parallel_signing_threshold',
+            self.DefaultSigning['parallel_signing_threshold'])
+        self.decryption_processes = self.config.get(
+            'decryption_processes',
+            self.DefaultDecryption['decryption_processes'])
+        self.request_limits = {
+            key: self.config.get(key, default)
+            for (key, default) in self.DefaultRequestLimits.items()}
         if 'commands' in self.config:
             self.commands = self.config['commands']
 
@@ -0,0 +1,296 @@
+"""Interchangeable implementations of Hermit's elliptic curve operations
+
+Key derivation and signing only need a handful of secp256k1
+operations, defined by `CryptoBackend`:
+
+* ``public_key`` -- multiply the generator by a private key
+* ``tweak_public_key`` -- add a multiple of the generator to a public key
+* ``sign_digests`` -- ECDSA-sign digests as canonical (low-S) DER
+* ``hmac_sha512`` -- the keyed hash behind BIP32 child key derivation
+
+Several backends implement them:
+
+* ``hermit`` -- the in-tree pure-Python ``hermit.secp256k1`` module
+* ``pybitcointools+ecdsa`` -- the pure-Python libraries Hermit used before
+* ``libsecp256k1`` -- the native library, when one is installed
+
+The first call to `backend` checks every available backend against
+known answers, times each one, and keeps the fastest backend that
+gave the right answers for the rest of the process.  All backends
+produce identical keys and signatures.
+"""
+
+import ctypes
+import ctypes.util
+import hashlib
+import hmac
+import os
+import time
+from hashlib import sha256
+from typing import List, Optional, Sequence, Tuple
+
+import ecdsa
+from pybitcointools import G, fast_add, fast_multiply
+
+from hermit import secp256k1
+
+#: Known answers every backend must reproduce before it is used.
+KNOWN_ANSWERS = dict(
+    seed=bytes.fromhex('000102030405060708090a0b0c0d0e0f'),
+    master=bytes.fromhex(
+        'e8f32e723decf4051aefac8e2c93c9c5b214313817cdb01a1494b917c8436b35'
+        '873dff81c02f525623fd1fe5167eac3a55a049de3d314bb42ee227ffed37d508'),
+    private_key=bytes.fromhex(
+        '1e99423a4ed27608a15a2616a2b0e9e52ced330ac530edcc32c8ffc6a526aedd'),
+    public_key=bytes.fromhex(
+        '03f028892bad7ed57d2fb57bf33081d5cfcf6f9ed3d3d7f159c2e2fff579dc341a'),
+    tweak=bytes.fromhex(
+        '3982f19bef1615bccfbb05e321c10e1d4cba3df0e841c2e41eeb6016347653c3'),
+    tweaked_public_key=bytes.fromhex(
+        '03d7de6b7f6c493e35c60ca5ebf5e66fb327bf09d8ab14108e8064e322d50e7129'),
+    digest=bytes.fromhex(
+        '3348f46a82490e50a3eb660adc96894757ea48f9463b4abaa9e493534569ed9c'),
+    signature=bytes.fromhex(
+        '3045022100d1f0327dfc2a1eed8e2b7a69924fddb8bcc299550d18c37ae4db1bf3'
+        '8c49df560220579bd3fd96db5af58551516766c42d17dfde99dd37f6d8be0355e9'
+        '3d31ae8abe'),
+)
+
+
+class CryptoBackend(object):
+    """The elliptic curve operations used by key derivation and signing
+
+    Keys are passed as bytes: private keys and tweaks are 32 bytes,
+    public keys are 33-byte compressed points.  Operations given an
+    invalid key or tweak raise `ValueError`.
+    """
+
+    #: The name shown in debug mode
+    name = ''
+
+    def public_key(self, private_key: bytes) -> bytes:
+        """Return the compressed public key for a private key"""
+        raise NotImplementedError
+
+    def tweak_public_key(self, public_key: bytes, tweak: bytes) -> bytes:
+        """Return ``public_key + tweak * G``"""
+        raise NotImplementedError
+
+    def sign_digests(self,
+                     requests: Sequence[Tuple[bytes, bytes]]) -> List[bytes]:
+        """Sign each `(private_key, digest)` pair
+
+        Signatures use RFC6979 nonces and are DER-encoded with a low
+        S value.
+        """
+        raise NotImplementedError
+
+    def hmac_sha512(self, key: bytes, data: bytes) -> bytes:
+        return hmac.new(key, data, hashlib.sha512).digest()
+
+    def passes_known_answers(self) -> bool:
+        """Whether this backend reproduces `KNOWN_ANSWERS`"""
+        answers = KNOWN_ANSWERS
+        try:
+            return (
+                self.hmac_sha512(b"Bitcoin seed", answers['seed']) == answers['master']
+                and self.public_key(answers['private_key']) == answers['public_key']
+                and self.tweak_public_key(answers['public_key'], answers['tweak'])
+                == answers['tweaked_public_key']
+                and self.sign_digests([(answers['private_key'], answers['digest'])])
+                == [answers['signature']])
+        except Exception:
+            return False
+
+
+class HermitBackend(CryptoBackend):
+    """Uses the in-tree ``hermit.secp256k1`` module"""
+
+    name = 'hermit'
+
+    def public_key(self, private_key: bytes) -> bytes:
+        secret = int.from_bytes(private_key, 'big')
+        if not 0 < secret < secp256k1.N:
+            raise ValueError("invalid private key")
+        point = secp256k1.multiply_g(secret)
+        if point is None:
+            raise ValueError("invalid private key")
+        return secp256k1.compress(point)
+
+    def tweak_public_key(self, public_key: bytes, tweak: bytes) -> bytes:
+        point = secp256k1.add(secp256k1.decompress(public_key),
+                              secp256k1.multiply_g(int.from_bytes(tweak, 'big')))
+        if point is None:
+            raise ValueError("tweak produced the point at infinity")
+        return secp256k1.compress(point)
+
+    def sign_digests(self,
+                     requests: Sequence[Tuple[bytes, bytes]]) -> List[bytes]:
+        return secp256k1.sign_digests([
+            (int.from_bytes(private_key, 'big'), digest)
+            for (private_key, digest) in requests])
+
+
+class PythonLibrariesBackend(CryptoBackend):
+    """Uses ``pybitcointools`` for points and ``ecdsa`` for signatures"""
+
+    name = 'pybitcointools+ecdsa'
+
+    def public_key(self, private_key: bytes) -> bytes:
+        secret = int.from_bytes(private_key, 'big')
+        if not 0 < secret < secp256k1.N:
+            raise ValueError("invalid private key")
+        return secp256k1.compress(fast_multiply(G, secret))
+
+    def tweak_public_key(self, public_key: bytes, tweak: bytes) -> bytes:
+        point = fast_add(fast_multiply(G, int.from_bytes(tweak, 'big')),
+                         secp256k1.decompress(public_key))
+        if point[0] == 0 and point[1] == 0:
+            raise ValueError("tweak produced the point at infinity")
+        return secp256k1.compress(point)
+
+    def sign_digests(self,
+                     requests: Sequence[Tuple[bytes, bytes]]) -> List[bytes]:
+        return [
+            ecdsa.SigningKey.from_string(
+                private_key,
+                curve=ecdsa.SECP256k1).sign_digest_deterministic(
+                    digest,
+                    sha256,
+                    sigencode=ecdsa.util.sigencode_der_canonize)
+            for (private_key, digest) in requests]
+
+
+class LibSecp256k1Backend(CryptoBackend):
+    """Uses a system libsecp256k1 through ``ctypes``
+
+    Raises `OSError` when constructed if no library can be found.
+    """
+
+    name = 'libsecp256k1'
+
+    # Libraries older than the removal of precomputed verification
+    # tables require a verify context for ``secp256k1_ec_pubkey_tweak_add``
+    # (and abort the process without one), so ask for both.
+    CONTEXT_SIGN = 0x201
+    CONTEXT_VERIFY = 0x101
+    EC_COMPRESSED = 0x102
+
+    def __init__(self, library: Optional[str] = None) -> None:
+        if library is None:
+            library = ctypes.util.find_library('secp256k1')
+        if library is None:
+            raise OSError("libsecp256k1 not found")
+        self.lib = ctypes.CDLL(library)
+        self.lib.secp256k1_context_create.restype = ctypes.c_void_p
+        self.lib.secp256k1_context_create.argtypes = [ctypes.c_uint]
+        size_p = ctypes.POINTER(ctypes.c_size_t)
+        for (function, argtypes) in (
+                ('secp256k1_context_randomize',
+                 [ctypes.c_void_p, ctypes.c_char_p]),
+                ('secp256k1_ec_pubkey_create',
+                 [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_char_p]),
+                ('secp256k1_ec_pubkey_parse',
+                 [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_char_p, ctypes.c_size_t]),
+                ('secp256k1_ec_pubkey_serialize',
+                 [ctypes.c_void_p, ctypes.c_char_p, size_p, ctypes.c_char_p, ctypes.c_uint]),
+                ('secp256k1_ec_pubkey_tweak_add',
+                 [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_char_p]),
+                ('secp256k1_ecdsa_sign',
+                 [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_char_p, ctypes.c_char_p,
+                  ctypes.c_void_p, ctypes.c_void_p]),
+                ('secp256k1_ecdsa_signature_serialize_der',
+                 [ctypes.c_void_p, ctypes.c_char_p, size_p, ctypes.c_char_p])):
+            getattr(self.lib, function).restype = ctypes.c_int
+            getattr(self.lib, function).argtypes = argtypes
+        self.context = ctypes.c_void_p(self.lib.secp256k1_context_create(
+            self.CONTEXT_SIGN | self.CONTEXT_VERIFY))
+        # Blind the signing context against side channels
+        if not self.lib.secp256k1_context_randomize(self.context, os.urandom(32)):
+            raise OSError("libsecp256k1 context could not be randomized")
+
+    def public_key(self, private_key: bytes) -> bytes:
+        pubkey = ctypes.create_string_buffer(64)
+        if not self.lib.secp256k1_ec_pubkey_create(
+                self.context, pubkey, private_key):
+            raise ValueError("invalid private key")
+        return self._serialize(pubkey)
+
+    def tweak_public_key(self, public_key: bytes, tweak: bytes) -> bytes:
+        pubkey = ctypes.create_string_buffer(64)
+        if not self.lib.secp256k1_ec_pubkey_parse(
+                self.context, pubkey, public_key, ctypes.c_size_t(len(public_key))):
+            raise ValueError("invalid public key")
+        if not self.lib.secp256k1_ec_pubkey_tweak_add(
+                self.context, pubkey, tweak):
+            raise ValueError("invalid tweak")
+        return self._serialize(pubkey)
+
+    def sign_digests(self,
+                     requests: Sequence[Tuple[bytes, bytes]]) -> List[bytes]:
+        signatures = []
+        for (private_key, digest) in requests:
+            signature = ctypes.create_string_buffer(64)
+            if not self.lib.secp256k1_ecdsa_sign(
+                    self.context, signature, digest, private_key, None, None):
+                raise ValueError("invalid private key")
+            der = ctypes.create_string_buffer(72)
+            der_length = ctypes.c_size_t(72)
+            self.lib.secp256k1_ecdsa_signature_serialize_der(
+                self.context, der, ctypes.byref(der_length), signature)
+            signatures.append(der.raw[:der_length.value])
+        return signatures
+
+    def _serialize(self, pubkey) -> bytes:
+        output = ctypes.create_string_buffer(33)
+        output_length = ctypes.c_size_t(33)
+        self.lib.secp256k1_ec_pubkey_serialize(
+            self.context, output, ctypes.byref(output_length),
+            pubkey, self.EC_COMPRESSED)
+        return output.raw[:output_length.value]
+
+
+#: Candidate backends, in order of preference when timings tie.
+BACKEND_CLASSES = [LibSecp256k1Backend, HermitBackend, PythonLibrariesBackend]
+
+_BENCHMARK_ROUNDS = 2
+
+_selected: Optional[CryptoBackend] = None
+
+
+def _benchmark(candidate: CryptoBackend) -> float:
+    answers = KNOWN_ANSWERS
+    start = time.perf_counter()
+    for _ in range(_BENCHMARK_ROUNDS):
+        candidate.public_key(answers['private_key'])
+        candidate.tweak_public_key(answers['public_key'], answers['tweak'])
+        candidate.sign_digests([(answers['private_key'], answers['digest'])])
+    return time.perf_counter() - start
+
+
+def select_backend(candidates: Sequence[type] = BACKEND_CLASSES) -> CryptoBackend:
+    """Return the fastest of the `candidates` that passes the known-answer tests
+
+    Candidates that cannot be constructed (e.g. because a native
+    library is missing) are skipped.
+    """
+    timings = []
+    for (preference, backend_class) in enumerate(candidates):
+        try:
+            candidate = backend_class()
+        except OSError:
+            continue
+        if not candidate.passes_known_answers():
+            continue
+        timings.append((_benchmark(candidate), preference, candidate))
+    if not timings:
+        raise RuntimeError("No working cryptography backend.")
+    return min(timings, key=lambda timing: timing[:2])[2]
+
+
+def backend() -> CryptoBackend:
+    """Return the backend selected for this process, selecting it on first use"""
+    global _selected
+    if _selected is None:
+        _selected = select_backend()
+    return _selected
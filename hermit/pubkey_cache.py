@@ -0,0 +1,91 @@
+import os
+from typing import Dict, Optional
+
+import bson
+
+
+class PublicKeyCache(object):
+    """Persists public data derived from a wallet between unlocks
+
+    Only public data is stored: each wallet's master fingerprint and
+    the extended public keys (xpubs) exported from it, by BIP32 path.
+
+    Entries are keyed by master fingerprint and record a digest of the
+    shards they were derived from.  An entry whose digest no longer
+    matches the current shards is ignored and dropped on the next
+    write, so changing shards invalidates the cache.
+
+    While the wallet is locked, the fingerprint is unknown, so a
+    lookup uses the single entry matching the current shards digest.
+    If several wallets share the same shards, nothing is returned and
+    the wallet must be unlocked.
+    """
+
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+        self._entries: Optional[Dict] = None
+
+    @property
+    def entries(self) -> Dict:
+        if self._entries is None:
+            self._entries = self._load()
+        return self._entries
+
+    def xpubs(self, shards_digest: str,
+              fingerprint: Optional[str] = None) -> Dict[str, str]:
+        """Return the cached xpubs by path for the wallet with the given shards
+
+        If `fingerprint` is not given, the wallet is the only one
+        cached for these shards.
+        """
+        if fingerprint is not None:
+            entry = self.entries.get(fingerprint)
+            if entry is not None and entry['shards'] == shards_digest:
+                return entry['xpubs']
+            return {}
+
+        matching = [entry
+                    for entry in self.entries.values()
+                    if entry['shards'] == shards_digest]
+        if len(matching) == 1:
+            return matching[0]['xpubs']
+        return {}
+
+    def store(self, shards_digest: str, fingerprint: str,
+              xpubs: Dict[str, str]) -> None:
+        """Add the given xpubs to the entry for a wallet and write the cache"""
+        entry = self.entries.get(fingerprint)
+        if entry is not None and entry['shards'] == shards_digest:
+            if all(entry['xpubs'].get(path) == xpub
+                   for (path, xpub) in xpubs.items()):
+                return
+        else:
+            entry = dict(shards=shards_digest, xpubs={})
+        entry['xpubs'].update(xpubs)
+
+        self._entries = {
+            other_fingerprint: other
+            for (other_fingerprint, other) in self.entries.items()
+            if other['shards'] == shards_digest
+        }
+        self._entries[fingerprint] = entry
+        self._save()
+
+    def _load(self) -> Dict:
+        if not os.path.exists(self.filename):
+            return {}
+        try:
+            with open(self.filename, 'rb') as f:
+                return bson.loads(f.read())
+        except Exception:
+            # A corrupt cache is the same as an empty one.
+            return {}
+
+    def _save(self) -> None:
+        try:
+            with open(self.filename, 'wb') as f:
+                f.write(bson.dumps(self.entries))
+        except OSError:
+            # The cache is an optimization; failing to write it is
+            # not an error.
+            pass
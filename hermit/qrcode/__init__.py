@@ -1,3 +1,3 @@
-from .reader    import read_qr_code
+from .reader    import read_qr_code, read_qr_code_image
 from .displayer import display_qr_code, create_qr_code_image
 from .format    import decode_qr_code_data, encode_qr_code_data
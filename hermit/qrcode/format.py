@@ -1,38 +1,82 @@
-from base64 import b32decode, b32encode
-from gzip import decompress, compress
+from base64 import b32decode, b32encode, b64decode, b64encode
+from gzip import compress
 from binascii import Error as Base32DecodeError
+from binascii import Error as Base64DecodeError
+from typing import Optional
+import zlib
 
-
+from hermit.config import HermitConfig
 from hermit.errors import InvalidSignatureRequest
 
+# Binary PSBTs are carried as-is, and exchanged with the rest of
+# Hermit as base64 strings (which always start with `cHNidP8`).
+_PSBT_MAGIC = b'psbt\xff'
+_PSBT_BASE64_PREFIX = 'cHNidP8'
+
 
-def decode_qr_code_data(encoded: bytes) -> str:
+def decode_qr_code_data(encoded: bytes, max_size: Optional[int] = None) -> str:
+    """Decode the data in a QR code
+
+    The data is gunzipped a piece at a time, and rejected as soon as
+    it would exceed `max_size` bytes (by default, the configured
+    ``max_request_size``).
+    """
     if not isinstance(encoded, (bytes,)):
         raise InvalidSignatureRequest("Can only decode bytes")
     if encoded == b'':
         raise InvalidSignatureRequest("Cannot decode empty bytes")
+    if max_size is None:
+        max_size = HermitConfig.DefaultRequestLimits['max_request_size']
     try:
         compressed_bytes = b32decode(encoded)
         try:
-            decompressed_bytes = decompress(compressed_bytes)
+            decompressed_bytes = _decompress(compressed_bytes, max_size)
+            if decompressed_bytes.startswith(_PSBT_MAGIC):
+                return b64encode(decompressed_bytes).decode('ascii')
             try:
                 data = decompressed_bytes.decode('utf-8')
                 return data
             except UnicodeError:
                 raise InvalidSignatureRequest("Not valid UTF-8")
-        except OSError:
+        except (OSError, zlib.error):
             raise InvalidSignatureRequest("Not gzipped")
     except (TypeError, Base32DecodeError):
         raise InvalidSignatureRequest("Not Base32")
 
 
+def _decompress(compressed: bytes, max_size: int) -> bytes:
+    # Like gzip.decompress, but never inflates more than `max_size`
+    # (+ 1) bytes.
+    chunks = []
+    size = 0
+    while compressed:
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        while not decompressor.eof:
+            chunk = decompressor.decompress(compressed, max_size - size + 1)
+            compressed = decompressor.unconsumed_tail
+            size += len(chunk)
+            if size > max_size:
+                raise InvalidSignatureRequest("Decompressed data is too large")
+            if not chunk and not compressed:
+                raise OSError("Truncated gzip data")
+            chunks.append(chunk)
+        compressed = decompressor.unused_data
+    return b''.join(chunks)
+
+
 def encode_qr_code_data(decoded: str) -> bytes:
     if not isinstance(decoded, (str,)):
         raise InvalidSignatureRequest("Can only encode strings")
     if decoded.strip() == '':
         raise InvalidSignatureRequest("Cannot encode empty string")
     try:
-        uncompressed_bytes = decoded.encode('utf-8')
+        if decoded.startswith(_PSBT_BASE64_PREFIX):
+            try:
+                uncompressed_bytes = b64decode(decoded, validate=True)
+            except Base64DecodeError:
+                raise InvalidSignatureRequest("Failed to Base64-decode PSBT")
+        else:
+            uncompressed_bytes = decoded.encode('utf-8')
         try:
             compressed_bytes = compress(uncompressed_bytes)
             try:
@@ -11,12 +11,12 @@ from .format import decode_qr_code_data
 from .utils import window_is_open
 
 
-def read_qr_code() -> Optional[str]:
-    task = _capture_qr_code_async()
+def read_qr_code(max_size: Optional[int] = None) -> Optional[str]:
+    task = _capture_qr_code_async(max_size)
     return asyncio.get_event_loop().run_until_complete(task)
 
 
-async def _capture_qr_code_async() -> Optional[str]:
+async def _capture_qr_code_async(max_size: Optional[int] = None) -> Optional[str]:
     capture = _start_camera()
     preview_dimensions = (640, 480)
     decoded_data = None
@@ -43,7 +43,7 @@ async def _capture_qr_code_async() -> Optional[str]:
             # Decode the QR code data
             encoded_data = qrcode.data
             try:
-                decoded_data = decode_qr_code_data(encoded_data)
+                decoded_data = decode_qr_code_data(encoded_data, max_size)
             except InvalidSignatureRequest as e:
                 print("Invalid signature request: {}".format(str(e)))
 
@@ -68,6 +68,19 @@ async def _capture_qr_code_async() -> Optional[str]:
     return decoded_data
 
 
+def read_qr_code_image(path: str, max_size: Optional[int] = None) -> Optional[str]:
+    """Decode the first QR code in an image file
+
+    Returns `None` if the image contains no QR code.
+    """
+    image = cv2.imread(path)
+    if image is None:
+        raise IOError("Cannot read image {}".format(path))
+    for qrcode in pyzbar.decode(image):
+        return decode_qr_code_data(qrcode.data, max_size)
+    return None
+
+
 def _start_camera() -> cv2.VideoCapture:
     capture = cv2.VideoCapture(0)
     if not capture.isOpened():
@@ -0,0 +1,419 @@
+"""Arithmetic and ECDSA signing on the secp256k1 curve
+
+Points are passed around in affine form as ``(x, y)`` tuples, with
+``None`` standing for the point at infinity.  Internally, sums are
+accumulated in Jacobian coordinates ``(X, Y, Z)`` (where ``x = X/Z^2``
+and ``y = Y/Z^3``) so that only one modular inversion is needed per
+result.
+
+Multiples of the generator use a table of precomputed affine points
+``v * 256^i * G`` for every byte position ``i`` and byte value ``v``.
+A multiplication is then just one mixed addition per non-zero byte of
+the scalar, with no doublings.  The table is built on first use.
+
+Multiples of any other point use a width-5 non-adjacent form (wNAF).
+
+Signatures are either ECDSA (DER-encoded, with RFC6979 nonces) or
+BIP340 Schnorr signatures.
+"""
+
+import hmac
+from hashlib import sha256
+from typing import Dict, List, Optional, Sequence, Tuple
+
+#: The field prime
+P = 2**256 - 2**32 - 977
+
+#: The order of the generator
+N = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
+
+#: The generator
+G = (0x79BE667EF9DCBBAC55A06295CE870B07029BFCDB2DCE28D959F2815B16F81798,
+     0x483ADA7726A3C4655DA4FBFC0E1108A8FD17B448A68554199C47D08FFB10D4B8)
+
+Point = Optional[Tuple[int, int]]
+JacobianPoint = Optional[Tuple[int, int, int]]
+
+_WNAF_WIDTH = 5
+
+_G_TABLE: List[List[Point]] = []
+
+_TAG_MIDSTATES: Dict = {}
+
+
+#
+# Jacobian arithmetic
+#
+
+def _double(p: JacobianPoint) -> JacobianPoint:
+    if p is None:
+        return None
+    (X1, Y1, Z1) = p
+    if Y1 == 0:
+        return None
+    A = X1 * X1 % P
+    B = Y1 * Y1 % P
+    C = B * B % P
+    D = 2 * ((X1 + B) * (X1 + B) - A - C) % P
+    E = 3 * A % P
+    X3 = (E * E - 2 * D) % P
+    Y3 = (E * (D - X3) - 8 * C) % P
+    Z3 = 2 * Y1 * Z1 % P
+    return (X3, Y3, Z3)
+
+
+def _add_affine(p: JacobianPoint, q: Point) -> JacobianPoint:
+    """Add an affine point `q` to a Jacobian point `p`"""
+    if q is None:
+        return p
+    if p is None:
+        return (q[0], q[1], 1)
+    (X1, Y1, Z1) = p
+    (x2, y2) = q
+    Z1Z1 = Z1 * Z1 % P
+    U2 = x2 * Z1Z1 % P
+    S2 = y2 * Z1 * Z1Z1 % P
+    H = (U2 - X1) % P
+    R = (S2 - Y1) % P
+    if H == 0:
+        if R == 0:
+            return _double(p)
+        return None
+    HH = H * H % P
+    HHH = H * HH % P
+    V = X1 * HH % P
+    X3 = (R * R - HHH - 2 * V) % P
+    Y3 = (R * (V - X3) - Y1 * HHH) % P
+    Z3 = Z1 * H % P
+    return (X3, Y3, Z3)
+
+
+def _negate(p: Point) -> Point:
+    if p is None:
+        return None
+    return (p[0], (P - p[1]) % P)
+
+
+def _to_affine(p: JacobianPoint) -> Point:
+    if p is None:
+        return None
+    (X, Y, Z) = p
+    z_inv = pow(Z, P - 2, P)
+    z_inv2 = z_inv * z_inv % P
+    return (X * z_inv2 % P, Y * z_inv2 * z_inv % P)
+
+
+def batch_inverse(values: Sequence[int], modulus: int) -> List[int]:
+    """Invert every value modulo `modulus` with a single modular inversion
+
+    Uses Montgomery's trick: the running products of the values are
+    inverted once and unwound to recover each individual inverse.
+    None of the values may be zero.
+    """
+    prefix = []
+    acc = 1
+    for value in values:
+        prefix.append(acc)
+        acc = acc * value % modulus
+    acc_inv = pow(acc, modulus - 2, modulus)
+    inverses = [0] * len(values)
+    for index in range(len(values) - 1, -1, -1):
+        inverses[index] = prefix[index] * acc_inv % modulus
+        acc_inv = acc_inv * values[index] % modulus
+    return inverses
+
+
+def _batch_to_affine(points: Sequence[JacobianPoint]) -> List[Point]:
+    finite = [p for p in points if p is not None]
+    z_invs = iter(batch_inverse([Z for (_, _, Z) in finite], P))
+    affine: List[Point] = []
+    for p in points:
+        if p is None:
+            affine.append(None)
+            continue
+        (X, Y, _) = p
+        z_inv = next(z_invs)
+        z_inv2 = z_inv * z_inv % P
+        affine.append((X * z_inv2 % P, Y * z_inv2 * z_inv % P))
+    return affine
+
+
+#
+# Multiplication
+#
+
+def _g_table() -> List[List[Point]]:
+    if not _G_TABLE:
+        rows = []
+        base: JacobianPoint = (G[0], G[1], 1)
+        for _ in range(32):
+            row = [base]
+            base_affine = _to_affine(base)
+            for _ in range(254):
+                row.append(_add_affine(row[-1], base_affine))
+            rows.append(row)
+            base = _add_affine(row[-1], base_affine)
+        flat = _batch_to_affine([p for row in rows for p in row])
+        _G_TABLE.extend(flat[i:i + 255] for i in range(0, len(flat), 255))
+    return _G_TABLE
+
+
+def _multiply_g_jacobian(scalar: int) -> JacobianPoint:
+    table = _g_table()
+    scalar = scalar % N
+    acc: JacobianPoint = None
+    for row in table:
+        byte = scalar & 0xff
+        if byte:
+            acc = _add_affine(acc, row[byte - 1])
+        scalar >>= 8
+    return acc
+
+
+def multiply_g(scalar: int) -> Point:
+    """Return ``scalar * G``"""
+    return _to_affine(_multiply_g_jacobian(scalar))
+
+
+def _wnaf(scalar: int, width: int) -> List[int]:
+    digits = []
+    window = 1 << width
+    while scalar > 0:
+        if scalar & 1:
+            digit = scalar % window
+            if digit >= window // 2:
+                digit -= window
+            scalar -= digit
+        else:
+            digit = 0
+        digits.append(digit)
+        scalar >>= 1
+    return digits
+
+
+def multiply(point: Point, scalar: int) -> Point:
+    """Return ``scalar * point`` for an arbitrary point"""
+    scalar = scalar % N
+    if point is None or scalar == 0:
+        return None
+
+    # Odd multiples P, 3P, 5P, ... as affine points
+    twice = _to_affine(_double((point[0], point[1], 1)))
+    odd: List[JacobianPoint] = [(point[0], point[1], 1)]
+    for _ in range((1 << (_WNAF_WIDTH - 2)) - 1):
+        odd.append(_add_affine(odd[-1], twice))
+    multiples = _batch_to_affine(odd)
+
+    acc: JacobianPoint = None
+    for digit in reversed(_wnaf(scalar, _WNAF_WIDTH)):
+        acc = _double(acc)
+        if digit > 0:
+            acc = _add_affine(acc, multiples[digit // 2])
+        elif digit < 0:
+            acc = _add_affine(acc, _negate(multiples[-digit // 2]))
+    return _to_affine(acc)
+
+
+def add(p: Point, q: Point) -> Point:
+    """Return ``p + q``"""
+    if p is None:
+        return q
+    return _to_affine(_add_affine((p[0], p[1], 1), q))
+
+
+#
+# Encoding
+#
+
+def compress(point: Tuple[int, int]) -> bytes:
+    """Return the 33-byte compressed encoding of a point"""
+    (x, y) = point
+    return bytes([2 + (y & 1)]) + x.to_bytes(32, 'big')
+
+
+def decompress(data: bytes) -> Tuple[int, int]:
+    """Return the point encoded by a 33-byte compressed public key
+
+    Raises `ValueError` if the data does not encode a point.
+    """
+    if len(data) != 33 or data[0] not in (2, 3):
+        raise ValueError("not a compressed public key")
+    x = int.from_bytes(data[1:], 'big')
+    y_squared = (pow(x, 3, P) + 7) % P
+    y = pow(y_squared, (P + 1) // 4, P)
+    if (y * y) % P != y_squared:
+        raise ValueError("not a point on secp256k1")
+    if (y & 1) != (data[0] & 1):
+        y = P - y
+    return (x, y)
+
+
+#
+# ECDSA
+#
+
+def rfc6979_nonce(secret: int, digest: bytes) -> int:
+    """Return the deterministic RFC6979 nonce (HMAC-SHA256) for a digest"""
+    z = int.from_bytes(digest, 'big')
+    if z >= N:
+        z -= N
+    bx = secret.to_bytes(32, 'big') + z.to_bytes(32, 'big')
+    v = b'\x01' * 32
+    k = b'\x00' * 32
+    k = hmac.new(k, v + b'\x00' + bx, sha256).digest()
+    v = hmac.new(k, v, sha256).digest()
+    k = hmac.new(k, v + b'\x01' + bx, sha256).digest()
+    v = hmac.new(k, v, sha256).digest()
+    while True:
+        v = hmac.new(k, v, sha256).digest()
+        nonce = int.from_bytes(v, 'big')
+        if 1 <= nonce < N:
+            return nonce
+        k = hmac.new(k, v + b'\x00', sha256).digest()
+        v = hmac.new(k, v, sha256).digest()
+
+
+def _der_integer(value: int) -> bytes:
+    encoded = value.to_bytes((value.bit_length() + 7) // 8 or 1, 'big')
+    if encoded[0] & 0x80:
+        encoded = b'\x00' + encoded
+    return b'\x02' + bytes([len(encoded)]) + encoded
+
+
+def encode_der_signature(r: int, s: int) -> bytes:
+    """DER-encode a signature, using the low-S form of `s`"""
+    if s > N // 2:
+        s = N - s
+    body = _der_integer(r) + _der_integer(s)
+    return b'\x30' + bytes([len(body)]) + body
+
+
+def sign_digest(secret: int, digest: bytes) -> bytes:
+    """Return a canonical DER ECDSA signature of a 32-byte digest
+
+    The nonce is derived as in RFC6979, so the output is identical to
+    that of ``ecdsa``'s ``sign_digest_deterministic`` with ``sha256``
+    and ``sigencode_der_canonize``.
+    """
+    return sign_digests([(secret, digest)])[0]
+
+
+def _finite(p: JacobianPoint) -> Tuple[int, int, int]:
+    if p is None:
+        raise ValueError("invalid nonce")
+    return p
+
+
+def sign_digests(requests: Sequence[Tuple[int, bytes]]) -> List[bytes]:
+    """Sign many `(secret, digest)` pairs, as `sign_digest` would
+
+    Each nonce point ``k * G`` is left in Jacobian form, and all of
+    their ``Z`` coordinates are inverted together, as are all of the
+    nonces, so a batch costs two modular inversions instead of two per
+    signature.
+    """
+    nonces = [rfc6979_nonce(secret, digest) for (secret, digest) in requests]
+    points = [_finite(_multiply_g_jacobian(k)) for k in nonces]
+    z_invs = batch_inverse([Z for (_, _, Z) in points], P)
+    k_invs = batch_inverse(nonces, N)
+
+    signatures = []
+    for ((secret, digest), (X, _, _), z_inv, k_inv) in zip(
+            requests, points, z_invs, k_invs):
+        r = X * z_inv * z_inv % P % N
+        s = k_inv * (int.from_bytes(digest, 'big') + secret * r) % N
+        if r == 0 or s == 0:
+            raise ValueError("invalid nonce")
+        signatures.append(encode_der_signature(r, s))
+    return signatures
+
+
+def verify_digest(point: Tuple[int, int], digest: bytes, r: int, s: int) -> bool:
+    """Verify an ECDSA signature `(r, s)` of a digest against a public point"""
+    if not (1 <= r < N and 1 <= s < N):
+        return False
+    z = int.from_bytes(digest, 'big')
+    s_inv = pow(s, N - 2, N)
+    u1 = z * s_inv % N
+    u2 = r * s_inv % N
+    result = add(multiply_g(u1), multiply(point, u2))
+    return result is not None and result[0] % N == r
+
+
+#
+# BIP340 Schnorr
+#
+
+def tagged_hash(tag: str, data: bytes) -> bytes:
+    """Return the BIP340 tagged hash ``SHA256(SHA256(tag) || SHA256(tag) || data)``
+
+    The hash state after the 64-byte tag prefix is computed once per
+    tag and copied for each call.
+    """
+    midstate = _TAG_MIDSTATES.get(tag)
+    if midstate is None:
+        tag_hash = sha256(tag.encode('utf8')).digest()
+        midstate = sha256(tag_hash + tag_hash)
+        _TAG_MIDSTATES[tag] = midstate
+    tagged = midstate.copy()
+    tagged.update(data)
+    return tagged.digest()
+
+
+def x_only(point: Tuple[int, int]) -> bytes:
+    """Return the 32-byte x-only encoding of a point"""
+    return point[0].to_bytes(32, 'big')
+
+
+def lift_x(data: bytes) -> Tuple[int, int]:
+    """Return the point with even y for a 32-byte x-only public key
+
+    Raises `ValueError` if the data does not encode a point.
+    """
+    return decompress(b'\x02' + data)
+
+
+def schnorr_sign(secret: int, message: bytes,
+                 aux_rand: bytes = b'\x00' * 32) -> bytes:
+    """Return the 64-byte BIP340 signature of a 32-byte message"""
+    if not 0 < secret < N:
+        raise ValueError("invalid private key")
+    point = multiply_g(secret)
+    if point is None:
+        raise ValueError("invalid private key")
+    d = secret if point[1] % 2 == 0 else N - secret
+    t = d ^ int.from_bytes(tagged_hash("BIP0340/aux", aux_rand), 'big')
+    k0 = int.from_bytes(
+        tagged_hash("BIP0340/nonce",
+                    t.to_bytes(32, 'big') + x_only(point) + message),
+        'big') % N
+    if k0 == 0:
+        raise ValueError("invalid nonce")
+    nonce_point = multiply_g(k0)
+    if nonce_point is None:
+        raise ValueError("invalid nonce")
+    k = k0 if nonce_point[1] % 2 == 0 else N - k0
+    e = int.from_bytes(
+        tagged_hash("BIP0340/challenge",
+                    x_only(nonce_point) + x_only(point) + message),
+        'big') % N
+    return x_only(nonce_point) + ((k + e * d) % N).to_bytes(32, 'big')
+
+
+def schnorr_verify(public_key: bytes, message: bytes, signature: bytes) -> bool:
+    """Verify a BIP340 signature against a 32-byte x-only public key"""
+    if len(public_key) != 32 or len(signature) != 64:
+        return False
+    try:
+        point = lift_x(public_key)
+    except ValueError:
+        return False
+    r = int.from_bytes(signature[:32], 'big')
+    s = int.from_bytes(signature[32:], 'big')
+    if r >= P or s >= N:
+        return False
+    e = int.from_bytes(
+        tagged_hash("BIP0340/challenge", signature[:32] + public_key + message),
+        'big') % N
+    result = add(multiply_g(s), multiply(point, N - e))
+    return result is not None and result[1] % 2 == 0 and result[0] == r
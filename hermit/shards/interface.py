@@ -108,6 +108,34 @@ class ShardWordUserInterface(object):
 
             print("Shard not found.")
 
+    def choose_unlock_plan(self,
+                           plans) -> Optional[List[str]]:
+        """Choose which shards to unlock with
+
+        `plans` are ``UnlockPlan`` instances, cheapest first.  Returns
+        the names of the shards in the chosen plan, or `None` to choose
+        shards one at a time instead.
+        """
+        print_formatted_text("\nShards that can unlock the wallet (fastest first):")
+        for (number, plan) in enumerate(plans, 1):
+            print_formatted_text("  {}. {}".format(number, ", ".join(plan.names())))
+
+        while True:
+            prompt_msg = ("Choose shards\n(options: 1-{}, 'manual' to choose "
+                          "one at a time, or <enter> for 1)\n> ").format(len(plans))
+            choice = prompt(prompt_msg, **self.options).strip()
+
+            if choice == '':
+                return plans[0].names()
+
+            if choice == 'manual':
+                return None
+
+            if choice.isdigit() and 1 <= int(choice) <= len(plans):
+                return plans[int(choice) - 1].names()
+
+            print("Choice not found.")
+
     def confirm_delete_shard(self, shard_name: str) -> bool:
         return prompt("Really delete shard {0}? ".format(shard_name),
                       completer=self.YesNoCompleter) == "yes"
@@ -0,0 +1,113 @@
+import heapq
+from itertools import combinations, islice, product
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from hermit import shamir_share
+from hermit.errors import HermitError
+from .shard import Shard
+
+
+def kdf_cost(shard: Shard) -> int:
+    """Return the number of PBKDF2 iterations needed to decrypt a shard"""
+    return (shamir_share.ROUND_COUNT
+            * (shamir_share.BASE_ITERATION_COUNT << shard.iteration_exponent))
+
+
+class UnlockPlan(object):
+    """A minimal set of shards which together unlock a secret
+
+    Every shard in a plan belongs to the same family.  A plan holds
+    exactly enough groups to meet the family's group threshold, and
+    exactly enough members of each of those groups to meet the
+    group's member threshold.
+    """
+
+    __slots__ = ('shards', 'cost')
+
+    def __init__(self, shards: List[Shard]) -> None:
+        self.shards = shards
+        self.cost = sum(kdf_cost(shard) for shard in shards)
+
+    def __repr__(self) -> str:
+        return 'UnlockPlan({!r}, cost={})'.format(self.names(), self.cost)
+
+    def names(self) -> List[str]:
+        return [shard.name for shard in self.shards]
+
+
+def unlock_plans(shards: Iterable[Shard],
+                 limit: Optional[int] = None) -> List[UnlockPlan]:
+    """Return the minimal sets of shards that unlock a secret, cheapest first
+
+    Plans are ranked by the total cost of decrypting their shards
+    (see `kdf_cost`).  Copies of a shard (shards with the same family,
+    group, and member) are alternatives to each other, so each copy
+    appears in its own plans.  At most `limit` plans are returned;
+    they are generated lazily, so the cheapest plans of a large
+    family can be found without enumerating every plan.
+
+    Raises `HermitError` if no family has enough shards to unlock its
+    secret.
+    """
+    families: Dict[int, List[Shard]] = {}
+    for shard in shards:
+        families.setdefault(shard.share_id, []).append(shard)
+
+    family_plans = [_family_plans(family_shards)
+                    for family_shards in families.values()
+                    if _satisfiable(family_shards)]
+    if len(family_plans) == 0:
+        raise HermitError("There are not enough shards available to unlock this secret.")
+
+    plans = heapq.merge(*family_plans, key=lambda plan: plan.cost)
+    return list(islice(plans, limit))
+
+
+def _members_by_group(shards: List[Shard]) -> Dict[int, Dict[int, List[Shard]]]:
+    groups: Dict[int, Dict[int, List[Shard]]] = {}
+    for shard in shards:
+        (group_id, member_id) = shard.shard_id
+        groups.setdefault(group_id, {}).setdefault(member_id, []).append(shard)
+    return groups
+
+
+def _satisfiable(shards: List[Shard]) -> bool:
+    groups = _members_by_group(shards)
+    filled = [group_id
+              for (group_id, members) in groups.items()
+              if len(members) >= _any(members).member_threshold]
+    return len(filled) >= shards[0].group_threshold
+
+
+def _family_plans(shards: List[Shard]) -> Iterator[UnlockPlan]:
+    """Yield the plans using shards of one family, cheapest first"""
+    groups = _members_by_group(shards)
+    # (cost, group ID, member threshold) of each group with enough members
+    filled: List[Tuple[int, int, int]] = []
+    for (group_id, members) in sorted(groups.items()):
+        threshold = _any(members).member_threshold
+        if len(members) >= threshold:
+            member_costs = sorted(kdf_cost(copies[0]) for copies in members.values())
+            filled.append((sum(member_costs[:threshold]), group_id, threshold))
+
+    # Within a family every shard has the same iteration exponent, so
+    # a plan's cost only depends on which groups it uses.
+    group_threshold = shards[0].group_threshold
+    group_choices = sorted(combinations(filled, group_threshold),
+                           key=lambda choice: sum(cost for (cost, _, _) in choice))
+    for group_choice in group_choices:
+        member_choices = [_member_choices(groups[group_id], threshold)
+                          for (_, group_id, threshold) in group_choice]
+        for chosen in product(*member_choices):
+            yield UnlockPlan([shard for members in chosen for shard in members])
+
+
+def _member_choices(members: Dict[int, List[Shard]],
+                    threshold: int) -> Iterator[Tuple[Shard, ...]]:
+    """Yield each way to choose `threshold` distinct members of a group"""
+    for member_ids in combinations(sorted(members), threshold):
+        yield from product(*(members[member_id] for member_id in member_ids))
+
+
+def _any(members: Dict[int, List[Shard]]) -> Shard:
+    return next(iter(members.values()))[0]
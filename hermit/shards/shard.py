@@ -6,28 +6,47 @@ from .interface import ShardWordUserInterface
 class Shard(object):
     """Represents a single Shamir shard.
 
+    A shard keeps its encrypted mnemonic packed into bytes (as
+    returned by ``to_bytes``) along with the mnemonic's header (family,
+    group, and member information), which is decoded once, when the
+    mnemonic is set.  The mnemonic words themselves are only produced
+    when they are asked for.
+
     """
 
+    __slots__ = ('name', 'interface', '_data', '_header')
+
     @property
-    def encrypted_mnemonic(self):
+    def encrypted_mnemonic(self) -> Optional[str]:
         """
         The encrypted mnemonic words representing this shard
         """
-        return self._encrypted_mnemonic
+        if self._data is None:
+            return None
+        return shamir_share.mnemonic_from_bytes(self._data)
 
     @encrypted_mnemonic.setter
-    def encrypted_mnemonic(self, words):
-        self._encrypted_mnemonic = words
-        self._share_id = None
+    def encrypted_mnemonic(self, words: Optional[str]) -> None:
+        if words is None:
+            self._data = None
+            self._header = None
+        else:
+            self._header = _decode_header(words)
+            self._data = shamir_share.mnemonic_to_bytes(words)
 
     @property
     def share_id(self):
         """
         An integer representing the share family that this shard belongs to.
         """
-        if self._share_id is None:
-            self._unpack_share()
-        return self._share_id
+        return self._header[0]
+
+    @property
+    def iteration_exponent(self):
+        """
+        The exponent setting how many PBKDF2 iterations encrypt this shard.
+        """
+        return self._header[1]
 
     @property
     def shard_id(self):
@@ -35,15 +54,11 @@ class Shard(object):
         A pair of integers representing the group index and the member index of
         this shard
         """
-        if self._group_id is None:
-            self._unpack_share()
-        return (self._group_id, self._member_id)
+        return (self._header[2], self._header[5])
 
     @property
     def group_id(self):
-        if self._group_id is None:
-            self._unpack_share()
-        return self._group_id
+        return self._header[2]
 
     @property
     def member_threshold(self):
@@ -51,9 +66,7 @@ class Shard(object):
         The number of members of this group needed to reconstruct the group
         secret.
         """
-        if self._member_threshold is None:
-            self._unpack_share()
-        return self._member_threshold
+        return self._header[6]
 
     @property
     def group_threshold(self):
@@ -61,9 +74,7 @@ class Shard(object):
         The number of members of this group needed to reconstruct the group
         secret.
         """
-        if self._group_threshold is None:
-            self._unpack_share()
-        return self._group_threshold
+        return self._header[3]
 
     def __init__(self,
                  name: str,
@@ -82,12 +93,7 @@ class Shard(object):
 
         """
         self.name = name
-        self._encrypted_mnemonic = encrypted_mnemonic
-        self._share_id = None
-        self._group_id = None
-        self._member_id = None
-        self._group_threshold = None
-        self._member_threshold = None
+        self.encrypted_mnemonic = encrypted_mnemonic
 
         if interface is None:
             self.interface = ShardWordUserInterface()
@@ -97,12 +103,15 @@ class Shard(object):
     def input(self) -> None:
         """Input this shard's data from a SLIP39 phrase"""
         words = self.interface.enter_shard_words(self.name)
-        shamir_share.decode_mnemonic(words)
         self.encrypted_mnemonic = words
 
     def words(self) -> List[str]:
         """Returns the (decrypted) SLIP39 phrase for this shard"""
-        return shamir_share.decrypt_mnemonic(self.encrypted_mnemonic, self._get_password())
+        return self.decrypt(self.request_password())
+
+    def decrypt(self, password: bytes) -> List[str]:
+        """Returns the SLIP39 phrase for this shard, decrypted with `password`"""
+        return shamir_share.decrypt_mnemonic(self.encrypted_mnemonic, password)
 
     def change_password(self):
         """Decrypt and re-encrypt this shard with a new password"""
@@ -110,36 +119,33 @@ class Shard(object):
 
         self.encrypted_mnemonic = shamir_share.reencrypt_mnemonic(
             self.encrypted_mnemonic, old_password, new_password)
-        self.encrypted_shard = shamir_share.decode_mnemonic(
-            self.encrypted_mnemonic)
 
     def from_bytes(self, bytes_data: bytes) -> None:
         """Initialize shard from the given bytes"""
-        self.encrypted_mnemonic = shamir_share.mnemonic_from_bytes(bytes_data)
-        self.encrypted_shard = shamir_share.decode_mnemonic(
-            self.encrypted_mnemonic)
+        self._header = _decode_header(shamir_share.mnemonic_from_bytes(bytes_data))
+        self._data = bytes(bytes_data)
 
-    def to_bytes(self) -> bytes:
-        """Serialize this shard to bytes"""
-        return shamir_share.mnemonic_to_bytes(self.encrypted_mnemonic)
+    def to_bytes(self) -> Optional[bytes]:
+        """Serialize this shard to bytes (`None` if it has no mnemonic yet)"""
+        return self._data
 
     def to_qr_bson(self) -> bytes:
         """Serialize this shard as BSON, suitable for a QR code"""
         return bson.dumps({self.name: self.to_bytes()})
 
-    def _unpack_share(self) -> None:
-        (self._share_id, _, self._group_id, self._group_threshold, _, self._member_id, self._member_threshold,
-         _) = shamir_share.decode_mnemonic(self.encrypted_mnemonic)
-
     def to_str(self) -> str:
         """Return a user friendly string describing this shard and its membership in a group"""
-        (identifier, _, group_index, _, _, member_identifier, _,
-         _) = shamir_share.decode_mnemonic(self.encrypted_mnemonic)
-        return "{0} (family:{1} group:{2} member:{3})".format(self.name, identifier, group_index + 1, member_identifier + 1)
+        (group_index, member_identifier) = self.shard_id
+        return "{0} (family:{1} group:{2} member:{3})".format(self.name, self.share_id, group_index + 1, member_identifier + 1)
 
-    def _get_password(self) -> bytes:
+    def request_password(self) -> bytes:
         """Prompt the user for this shard's password"""
         return self.interface.get_password(self.to_str())
 
     def _get_change_password(self) -> Tuple[bytes, bytes]:
         return self.interface.get_change_password(self.to_str())
+
+
+def _decode_header(words: str) -> Tuple[int, ...]:
+    """Decode (and check) a mnemonic, returning all but its share value"""
+    return tuple(shamir_share.decode_mnemonic(words)[:-1])
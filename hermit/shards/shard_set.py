@@ -1,13 +1,16 @@
 import bson
+import hashlib
 import os
 import textwrap
+from concurrent.futures import Future, ProcessPoolExecutor
 from hermit import shamir_share
 from prompt_toolkit import print_formatted_text, HTML
 from hermit.config import HermitConfig
 from hermit.errors import HermitError
-from typing import List, Dict, Optional
+from typing import Dict, Iterable, List, Optional, Set, Tuple, TypeVar
 from mnemonic import Mnemonic
 from .interface import ShardWordUserInterface
+from .planner import unlock_plans
 from .shard import Shard
 from hermit.rng import RandomGenerator
 
@@ -15,6 +18,9 @@ from hermit.rng import RandomGenerator
 RNG = RandomGenerator()
 shamir_share.set_random_bytes(RNG.random)
 
+# A key of one of the indexes in a ShardIndex
+IndexKey = TypeVar('IndexKey')
+
 def check_satisfaction_criteria(shards):
     """check_satisfaction_criteria(shards)
 
@@ -25,27 +31,180 @@ def check_satisfaction_criteria(shards):
     representing whether or not the overall group threshold is met and the
     second is a set of group indexes whose thresholds have been met.
     """
+    shards = list(shards)
+    tracker = ThresholdTracker(shards)
+    for shard in shards:
+        tracker.add(shard)
+    return (tracker.satisfied(), set(tracker.filled))
+
+
+class ThresholdTracker(object):
+    """Tracks how close a selection of shards from one family is to
+    unlocking its secret
+
+    The tracker starts from the family's `shards` that can be selected
+    (its candidates).  As shards are added to (or removed from) the
+    selection, it keeps the number of distinct members selected in each
+    group, the groups whose member threshold is met (``filled``), and
+    the number of groups that can still be filled from the selection
+    plus the remaining candidates.  Copies of a selected shard are no
+    longer candidates.
+
+    ``satisfied`` and ``satisfiable`` are answered in constant time.
+    """
 
-    groups = {}
-    filled = set()
-    satisfied = False
-
-    for s in shards:
-        (group_idx, _) = s.shard_id
-        if not group_idx in groups:
-            groups[group_idx] = 0
-        groups[group_idx] += 1
-        if groups[group_idx] >= s.member_threshold:
-            filled.add(group_idx)
-        satisfied = (len(filled) >= s.group_threshold)
+    def __init__(self, shards: Iterable[Shard]) -> None:
+        self.group_threshold = 0
+        self.member_thresholds: Dict[int, int] = {}
+        # group ID -> member ID -> unselected copies of that member
+        self.candidates: Dict[int, Dict[int, List[Shard]]] = {}
+        # group ID -> member ID -> selected copy of that member
+        self.selected: Dict[int, Dict[int, Shard]] = {}
+        self.filled: Set[int] = set()
+
+        for shard in shards:
+            (group_id, member_id) = shard.shard_id
+            self.group_threshold = shard.group_threshold
+            self.member_thresholds[group_id] = shard.member_threshold
+            self.candidates.setdefault(group_id, {}).setdefault(member_id, []).append(shard)
+            self.selected.setdefault(group_id, {})
+        self._fillable = sum(1 for group_id in self.candidates if self._capacity(group_id) >= 0)
+
+    def satisfied(self) -> bool:
+        """Whether the selected shards unlock the secret"""
+        # A tracker without shards has no threshold to meet, and
+        # cannot unlock anything.
+        return self.group_threshold > 0 and len(self.filled) >= self.group_threshold
+
+    def satisfiable(self) -> bool:
+        """Whether the secret can still be unlocked by selecting more candidates"""
+        return self.group_threshold > 0 and self._fillable >= self.group_threshold
+
+    def add(self, shard: Shard) -> None:
+        """Select a candidate shard"""
+        (group_id, member_id) = shard.shard_id
+        if member_id in self.selected[group_id]:
+            return
+        # Moving a member from the candidates to the selection leaves
+        # the group's capacity, and so ``_fillable``, unchanged.
+        self.candidates[group_id].pop(member_id)
+        self.selected[group_id][member_id] = shard
+        if len(self.selected[group_id]) >= self.member_thresholds[group_id]:
+            self.filled.add(group_id)
+
+    def remove(self, shard: Shard) -> None:
+        """Return a selected shard (but not its copies) to the candidates"""
+        (group_id, member_id) = shard.shard_id
+        if self.selected[group_id].get(member_id) is not shard:
+            return
+        del self.selected[group_id][member_id]
+        self.candidates[group_id][member_id] = [shard]
+        if len(self.selected[group_id]) < self.member_thresholds[group_id]:
+            self.filled.discard(group_id)
+
+    def discard(self, shard: Shard) -> None:
+        """Remove a shard from the candidates"""
+        (group_id, member_id) = shard.shard_id
+        copies = self.candidates.get(group_id, {}).get(member_id)
+        if copies is None or shard not in copies:
+            return
+        was_fillable = self._capacity(group_id) >= 0
+        copies.remove(shard)
+        if len(copies) == 0:
+            del self.candidates[group_id][member_id]
+            if was_fillable and self._capacity(group_id) < 0:
+                self._fillable -= 1
+
+    def unfilled_candidates(self) -> List[Shard]:
+        """Return the candidates in groups whose threshold is not yet met"""
+        return [shard
+                for (group_id, members) in self.candidates.items()
+                if group_id not in self.filled
+                for copies in members.values()
+                for shard in copies]
+
+    def _capacity(self, group_id: int) -> int:
+        # How many more members the group could fill than it needs
+        return (len(self.selected[group_id])
+                + len(self.candidates[group_id])
+                - self.member_thresholds[group_id])
+
+
+class ShardIndex(object):
+    """Indexes shards by family, group, and member
+
+    Shards are indexed under their family (``share_id``), their group
+    (``(share_id, group_id)``), and their member
+    (``(share_id, group_id, member_id)``).  Each index maps its key to
+    the shards under it, by name; copies of a shard share a member key.
+
+    Each shard's header is only read when it is added, so lookups
+    never decode a mnemonic.
+    """
 
-    return (satisfied, filled)
+    def __init__(self) -> None:
+        self.families: Dict[int, Dict[str, Shard]] = {}
+        self.groups: Dict[Tuple[int, int], Dict[str, Shard]] = {}
+        self.members: Dict[Tuple[int, int, int], Dict[str, Shard]] = {}
+        # shard name -> member key
+        self._keys: Dict[str, Tuple[int, int, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, name: str, shard: Shard) -> None:
+        self.remove(name)
+        (group_id, member_id) = shard.shard_id
+        key = (shard.share_id, group_id, member_id)
+        self._keys[name] = key
+        self.families.setdefault(key[0], {})[name] = shard
+        self.groups.setdefault(key[:2], {})[name] = shard
+        self.members.setdefault(key, {})[name] = shard
+
+    def remove(self, name: str) -> None:
+        key = self._keys.pop(name, None)
+        if key is None:
+            return
+        _remove_from_index(self.families, key[0], name)
+        _remove_from_index(self.groups, key[:2], name)
+        _remove_from_index(self.members, key, name)
+
+    def clear(self) -> None:
+        self.families.clear()
+        self.groups.clear()
+        self.members.clear()
+        self._keys.clear()
+
+    def family(self, share_id: int) -> List[Shard]:
+        """Return the shards of a family"""
+        return list(self.families.get(share_id, {}).values())
+
+    def group(self, share_id: int, group_id: int) -> List[Shard]:
+        """Return the shards of a group"""
+        return list(self.groups.get((share_id, group_id), {}).values())
+
+    def member(self, share_id: int, group_id: int, member_id: int) -> List[Shard]:
+        """Return a shard and its copies"""
+        return list(self.members.get((share_id, group_id, member_id), {}).values())
+
+
+def _remove_from_index(index: Dict[IndexKey, Dict[str, Shard]],
+                       key: IndexKey,
+                       name: str) -> None:
+    del index[key][name]
+    if len(index[key]) == 0:
+        del index[key]
 
 
 class ShardSet(object):
+
+    #: Most unlock plans offered to the user to choose from.
+    UNLOCK_PLAN_LIMIT = 10
+
     def __init__(self,
                  interface: Optional[ShardWordUserInterface] = None) -> None:
         self.shards: Dict = {}
+        self.index = ShardIndex()
         self._shards_loaded = False
         self.config = HermitConfig.load()
         if interface is None:
@@ -77,8 +236,9 @@ class ShardSet(object):
                 bdata = bson.loads(f.read())
 
             for name, shard_bytes in bdata.items():
-                self.shards[name] = Shard(
-                    name, shamir_share.mnemonic_from_bytes(shard_bytes))
+                shard = Shard(name, None, self.interface)
+                shard.from_bytes(shard_bytes)
+                self._add_shard(shard)
 
             self._shards_loaded = True
 
@@ -95,6 +255,11 @@ class ShardSet(object):
                 for (name, shard) in self.shards.items()}
         return bson.dumps(data)
 
+    def digest(self) -> str:
+        """Return a hex digest identifying the current set of shards"""
+        self._ensure_shards(shards_expected=False)
+        return hashlib.sha256(self.to_bytes()).hexdigest()
+
     def save(self) -> None:
         with open(self.config.shards_file, 'wb') as f:
             f.write(self.to_bytes())
@@ -159,7 +324,7 @@ class ShardSet(object):
                 password = self.interface.confirm_password()
                 shard = Shard(name, shamir_share.encrypt_mnemonic(
                     mnemonic, password), self.interface)
-                self.shards[name] = shard
+                self._add_shard(shard)
 
     def wallet_words(self) -> str:
         # This is a little retrograde, but at the moment, the walled code wants
@@ -172,29 +337,48 @@ class ShardSet(object):
         return mnemonic.to_mnemonic(seed)
 
     def secret_seed(self) -> bytes:
+        """Return the secret seed, unlocked by shards the user selects
+
+        The user is offered the cheapest sets of shards that can unlock
+        the secret (see `unlock_plans`) and asked only for the
+        passwords of the set they choose.  They may instead choose
+        shards one at a time.
+
+        Shards are decrypted (a deliberately slow key derivation) in up
+        to ``decryption_processes`` worker processes while the user
+        types the next password, so unlocking takes little longer than
+        decrypting one shard.  A secret unlocked by a single shard is
+        always decrypted in-process.
+        """
         self._ensure_shards()
 
-        selected : Dict[str, Shard]= {}
-        selected_share_id : Optional[int]= None
-        selected_shard_ids : set = set()
-        selected_shards : set = set()
-
-        satisfied = False
-        filled_groups = set()
-
-        while not satisfied:
-            shards = [shard
-                      for (name, shard)
-                      in self.shards.items()
-                      if (name not in selected)
-                      and (selected_share_id is None or shard.share_id == selected_share_id)
-                      and (shard.shard_id not in selected_shard_ids)
-                      and (shard.group_id not in filled_groups)
-                      ]
-
-            if selected_share_id is not None:
-                (enough_shards,_) = check_satisfaction_criteria(selected_shards.union(shards))
-                if not enough_shards:
+        plans = unlock_plans(self.shards.values(), limit=self.UNLOCK_PLAN_LIMIT)
+        names = self.interface.choose_unlock_plan(plans)
+
+        processes = self.config.decryption_processes
+        executor = ProcessPoolExecutor(max_workers=processes) if processes > 1 else None
+        try:
+            if names is None:
+                return self._secret_seed(executor)
+            plan_executor = executor if len(names) > 1 else None
+            decryptions = [self._decrypt(plan_executor, shard, shard.request_password())
+                           for shard in (self.shards[name] for name in names)]
+            return shamir_share.combine_mnemonics(
+                [decryption.result() for decryption in decryptions])
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False)
+
+    def _secret_seed(self, executor: Optional[ProcessPoolExecutor]) -> bytes:
+        selected : Dict[str, Future]= {}
+        tracker : Optional[ThresholdTracker] = None
+
+        while tracker is None or not tracker.satisfied():
+            if tracker is None:
+                shards = list(self.shards.values())
+            else:
+                shards = tracker.unfilled_candidates()
+                if not tracker.satisfiable():
                     print([shard.to_str() for shard in shards])
                     raise HermitError("There are not enough shards available to unlock this secret.")
 
@@ -210,18 +394,35 @@ class ShardSet(object):
                 raise HermitError("Not enough shards selected to unlock secret.")
 
             shard = self.shards[name]
-            if selected_share_id is None:
-                selected_share_id = shard.share_id
+            if tracker is None:
+                tracker = ThresholdTracker(self.index.family(shard.share_id))
 
-            selected_shard_ids.add(shard.shard_id)
-            selected[name] = shard.words()
-            selected_shards.add(shard)
+            tracker.add(shard)
+            if len(selected) == 0 and tracker.satisfied():
+                # This shard alone unlocks the secret.
+                selected[name] = self._decrypt(None, shard, shard.request_password())
+            else:
+                selected[name] = self._decrypt(executor, shard, shard.request_password())
 
-            (satisfied, filled_groups) = check_satisfaction_criteria(selected_shards)
-
-        unlocked_mnemonics = list(selected.values())
+        unlocked_mnemonics = [decryption.result() for decryption in selected.values()]
         return shamir_share.combine_mnemonics(unlocked_mnemonics)
 
+    def _add_shard(self, shard: Shard) -> None:
+        self.shards[shard.name] = shard
+        self.index.add(shard.name, shard)
+
+    def _decrypt(self,
+                 executor: Optional[ProcessPoolExecutor],
+                 shard: Shard,
+                 password: bytes) -> Future:
+        if executor is not None:
+            return executor.submit(shamir_share.decrypt_mnemonic,
+                                   shard.encrypted_mnemonic,
+                                   password)
+        decryption: Future = Future()
+        decryption.set_result(shard.decrypt(password))
+        return decryption
+
     def reveal_shard(self, shard_name: str) -> None:
         self._ensure_shards(shards_expected=True)
         shard = self.shards[shard_name]
@@ -266,7 +467,7 @@ class ShardSet(object):
         shard = Shard(name, None, interface=self.interface)
         shard.from_bytes(shard_dict[old_name])
 
-        self.shards[name] = shard
+        self._add_shard(shard)
 
     def input_shard_words(self, name) -> None:
         self._ensure_shards(shards_expected=False)
@@ -279,7 +480,7 @@ class ShardSet(object):
         shard = Shard(name, None, interface=self.interface)
         shard.input()
 
-        self.shards[name] = shard
+        self._add_shard(shard)
 
     def copy_shard(self, original: str, copy: str) -> None:
         self._ensure_shards()
@@ -295,10 +496,11 @@ class ShardSet(object):
         copy_shard = Shard(
             copy, original_shard.encrypted_mnemonic, interface=self.interface)
         copy_shard.change_password()
-        self.shards[copy] = copy_shard
+        self._add_shard(copy_shard)
 
     def clear_shards(self) -> None:
         self.shards = {}
+        self.index.clear()
 
     def wallet_words_shard(self, name: str) -> None:
         self._ensure_shards()
@@ -308,12 +510,17 @@ class ShardSet(object):
         self._ensure_shards()
         if self.interface.confirm_delete_shard(shard_name):
             del self.shards[shard_name]
+            self.index.remove(shard_name)
 
     def list_shards(self) -> None:
         self._ensure_shards(shards_expected=False)
         if len(self.shards) > 0:
-            for shard in self.shards.values():
-                print("     {}".format(shard.to_str()))
+            for share_id in sorted(self.index.families):
+                print("Family {}:".format(share_id))
+                shards = sorted(self.index.family(share_id),
+                                key=lambda shard: (shard.shard_id, shard.name))
+                for shard in shards:
+                    print("     {}".format(shard.to_str()))
         else:
             print("No shards.")
 
@@ -329,5 +536,6 @@ class ShardSet(object):
 
     def reload(self) -> None:
         self.shards = {}
+        self.index.clear()
         self._shards_loaded = False
         self._ensure_shards()
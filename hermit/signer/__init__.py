@@ -1,3 +1,4 @@
 from .base            import *
 from .bitcoin_signer  import *
 from .echo_signer     import *
+from .taproot_signer  import *
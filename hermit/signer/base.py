@@ -1,14 +1,17 @@
 import json
 import re
-from typing import Optional, Dict
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from hashlib import sha256
+from typing import Any, Optional, Dict, Iterable
 
 from prompt_toolkit import PromptSession, print_formatted_text, HTML
 
 import hermit
 from hermit.errors import HermitError, InvalidSignatureRequest
 from hermit.qrcode import reader, displayer
-from hermit.wallet import (compressed_private_key_from_bip32,
-                           compressed_public_key_from_bip32, HDWallet)
+from hermit.signer.request_parser import RequestParser
+from hermit.wallet import HDWallet
 
 
 class Signer(object):
@@ -28,6 +31,18 @@ class Signer(object):
 
     * ``validate_bip32_path``
     * ``generate_child_keys``
+    * ``generate_many_child_keys``
+
+    Subclasses may also implement ``precompute``, which runs in a
+    background thread while the user is asked to confirm the request.
+
+    Requests are rejected as soon as they exceed any of the
+    `request_limits` (see ``HermitConfig.DefaultRequestLimits``).
+
+    While the wallet is unlocked, signatures are memoized in the
+    wallet's ``signature_memo``.  Scanning a request that was already
+    signed (on the same network, by the same wallet) shows the same
+    signature again without asking to confirm or signing again.
 
     """
 
@@ -36,11 +51,15 @@ class Signer(object):
 
     def __init__(self,
                  signing_wallet: HDWallet,
-                 session: PromptSession = None) -> None:
+                 session: PromptSession = None,
+                 request_limits: Optional[Dict[str, int]] = None) -> None:
         self.wallet = signing_wallet
         self.session = session
+        self.request_parser = RequestParser(request_limits)
         self.signature: Optional[Dict] = None
         self.request_data: Optional[str] = None
+        self._precomputation: Optional[Future] = None
+        self._precomputation_discarded = threading.Event()
 
     def sign(self, testnet: bool = False) -> None:
         """Initiate signing.
@@ -52,12 +71,28 @@ class Signer(object):
         self.testnet = testnet
         self._wait_for_request()
         if self.request_data:
-            self._parse_request()
-            self.validate_request()
-            if self._confirm_create_signature():
-                self.create_signature()
+            if self._create_confirmed_signature():
                 self._show_signature()
 
+    def sign_request(self,
+                     request_data: str,
+                     testnet: bool = False,
+                     confirm: bool = True) -> Optional[str]:
+        """Sign request data that was not scanned from a QR code.
+
+        Handles validation, display, confirmation, and generation of
+        a signature just like ``sign``.  When `confirm` is false, the
+        request is displayed but signed without asking.
+
+        Returns the signature, serialized as it would be displayed in
+        a QR code, or `None` if the user declined to sign.
+        """
+        self.testnet = testnet
+        self.request_data = request_data
+        if not self._create_confirmed_signature(confirm):
+            return None
+        return self._serialized_signature()
+
     def validate_request(self) -> None:
         """Validate a signature request.
 
@@ -120,6 +155,26 @@ class Signer(object):
         """
         pass
 
+    def precompute(self) -> Any:
+        """Speculatively start the work of creating a signature.
+
+        Subclasses may override this method.
+
+        It is called in a background thread once the request has been
+        validated, while the user is asked to confirm it.  It must not
+        create signatures or prompt the user.  Its result is returned
+        by ``_precomputed`` once the user confirms, and is thrown away
+        if they don't.  Long computations should stop early when
+        ``precomputation_discarded`` becomes true, since a declined
+        request waits for this method to return.
+
+        """
+        return None
+
+    def precomputation_discarded(self) -> bool:
+        """Whether the result of ``precompute`` will be thrown away"""
+        return self._precomputation_discarded.is_set()
+
     def generate_child_keys(self, bip32_path:str) -> Dict:
         """Return keys at a given BIP32 path in the current wallet.
 
@@ -131,22 +186,109 @@ class Signer(object):
         * ``private_key`` -- the private key
         * ``public_key`` -- the public key
         """
-        xprv = self.wallet.extended_private_key(bip32_path)
-        xpub = self.wallet.extended_public_key(bip32_path)
-        return dict(
-            xprv=xprv,
-            xpub=xpub,
-            private_key=compressed_private_key_from_bip32(xprv).hex(),
-            public_key=compressed_public_key_from_bip32(xpub).hex())
+        return self.wallet.derive_many([bip32_path])[bip32_path]
 
+    def generate_many_child_keys(self, bip32_paths: Iterable[str]) -> Dict[str, Dict]:
+        """Return keys at each of the given BIP32 paths in the current wallet.
+
+        Derives every path in a single pass over the tree the paths
+        span.  The dictionary returned maps each path to a dictionary
+        of the form returned by ``generate_child_keys``.
+        """
+        return self.wallet.derive_many(bip32_paths)
+
+
+    def _start_precomputation(self) -> None:
+        self._precomputation_discarded = threading.Event()
+        executor = ThreadPoolExecutor(max_workers=1)
+        self._precomputation = executor.submit(self.precompute)
+        executor.shutdown(wait=False)
+
+    def _discard_precomputation(self) -> None:
+        # Wait for a running precomputation to stop, so that it never
+        # touches the wallet once control returns to the caller.
+        self._precomputation_discarded.set()
+        if self._precomputation is not None:
+            if not self._precomputation.cancel():
+                wait([self._precomputation])
+        self._precomputation = None
+
+    def _precomputed(self) -> Any:
+        """Return the result of ``precompute``, waiting for it to finish
+
+        Returns `None` if nothing was precomputed or precomputation
+        failed, in which case the work should be done from scratch.
+        Precomputed results are only returned once.
+        """
+        (precomputation, self._precomputation) = (self._precomputation, None)
+        if precomputation is None:
+            return None
+        try:
+            return precomputation.result()
+        except Exception:
+            return None
+
+    def _canonical_request(self) -> str:
+        """Return a form of the request shared by every encoding of it"""
+        return json.dumps(self.request, sort_keys=True, separators=(',', ':'))
+
+    def _memo_key(self) -> Optional[str]:
+        """Return the key of this request in the wallet's signature memo
+
+        Returns `None` while the wallet is locked.
+        """
+        if not self.wallet.unlocked():
+            return None
+        digest = sha256()
+        for part in (type(self).__name__,
+                     'testnet' if self.testnet else 'mainnet',
+                     self.wallet.fingerprint(),
+                     self._canonical_request()):
+            digest.update(part.encode('utf8') + b'\x00')
+        return digest.hexdigest()
+
+    def _memoized_signature(self) -> Optional[Dict]:
+        key = self._memo_key()
+        if key is None:
+            return None
+        return self.wallet.signature_memo.get(key)
+
+    def _memoize_signature(self) -> None:
+        key = self._memo_key()
+        if key is not None and self.signature is not None:
+            self.wallet.signature_memo[key] = self.signature
+
+    def _create_confirmed_signature(self, confirm: bool = True) -> bool:
+        self._parse_request()
+        self.validate_request()
+        memoized = self._memoized_signature()
+        if memoized is not None:
+            self.signature = memoized
+            return True
+        self._start_precomputation()
+        confirmed = False
+        try:
+            if confirm:
+                confirmed = self._confirm_create_signature()
+            else:
+                self.display_request()
+                confirmed = True
+        finally:
+            if not confirmed:
+                self._discard_precomputation()
+        if confirmed:
+            self.create_signature()
+            self._memoize_signature()
+        return confirmed
 
     def _wait_for_request(self) -> None:
-        self.request_data = reader.read_qr_code()
+        self.request_data = reader.read_qr_code(
+            max_size=self.request_parser.limits['max_request_size'])
 
     def _parse_request(self) -> None:
         if self.request_data is not None:
             try:
-                self.request = json.loads(self.request_data)
+                self.request = self.request_parser.parse(self.request_data)
             except ValueError as e:
                 err_msg = ("Invalid signature request: {} ({})"
                            .format(e, type(e).__name__))
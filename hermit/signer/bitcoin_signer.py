@@ -1,44 +1,56 @@
 import binascii
+from base64 import b64encode
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from hashlib import sha256
-from typing import Dict
-
-from bitcoin import SelectParams
-from bitcoin import base58, bech32
-from bitcoin.core import COutPoint, CMutableTxOut, CMutableTxIn, CTransaction
-from bitcoin.core.script import SignatureHash, SIGHASH_ALL, CScript
-from bitcoin.wallet import (CBitcoinAddress,
-                            CBitcoinAddressError,
-                            P2SHBitcoinAddress)
+from typing import Dict, List, Optional, Tuple
+
+from bitcoin.core import CTransaction, MoneyRange
+from bitcoin.core.script import CScript, SIGHASH_ALL
 import bitcoin
-import ecdsa
+from prompt_toolkit import PromptSession
 
+from hermit import crypto
 from hermit.errors import InvalidSignatureRequest
 from hermit.signer.base import Signer, print_formatted_text, HTML
+from hermit.signer.network import Network, network
+from hermit.signer.psbt import PSBT, is_psbt
+from hermit.signer.request import CompiledRequest, InputGroup
+from hermit.signer.sighash import LegacySignatureHasher, SegwitSignatureHasher
+from hermit.wallet import HDWallet, bip32_path_from_sequence
+
+
+#: Script types of multisig input groups: legacy P2SH, native
+#: segwit P2WSH, and P2WSH nested in P2SH.
+SCRIPT_TYPES = ('p2sh', 'p2wsh', 'p2sh-p2wsh')
 
+#: The largest witness script that is standard to spend.
+MAX_WITNESS_SCRIPT_SIZE = 3600
 
-def generate_multisig_address(redeemscript: str, testnet: bool = False) -> str:
+# (private key, signature hash)
+SigningRequest = Tuple[bytes, bytes]
+
+
+def generate_multisig_address(redeemscript: str,
+                              testnet: bool = False,
+                              script_type: str = 'p2sh') -> str:
     """
-    Generates a P2SH-multisig Bitcoin address from a redeem script
+    Generates a multisig Bitcoin address from a redeem script
 
     Args:
-        redeemscript: hex-encoded redeem script
+        redeemscript: hex-encoded redeem script (or witness script,
+                      for segwit script types)
                       use generate_multisig_redeem_script to create
                       the redeem script from three compressed public keys
          testnet: Should the address be testnet or mainnet?
+         script_type: one of ``SCRIPT_TYPES``
 
     Example:
         TODO
     """
 
-    if testnet:
-        bitcoin.SelectParams('testnet')
-
-    redeem_script = CScript(bitcoin.core.x(redeemscript))
-
-    addr = P2SHBitcoinAddress.from_redeemScript(redeem_script)
-
-    return str(addr)
+    return network(testnet).multisig_address(bitcoin.core.x(redeemscript),
+                                             script_type)
 
 
 class BitcoinSigner(Signer):
@@ -50,6 +62,7 @@ class BitcoinSigner(Signer):
 
           "inputs": [
             [
+              SCRIPT_TYPE,    (optional)
               REDEEM_SCRIPT,
               BIP32_PATH,
               {
@@ -72,10 +85,119 @@ class BitcoinSigner(Signer):
 
         }
 
+    ``SCRIPT_TYPE`` is one of ``p2sh`` (the default), ``p2wsh``, or
+    ``p2sh-p2wsh``.  For the segwit types, ``REDEEM_SCRIPT`` is the
+    witness script and inputs are signed with BIP143 signature hashes,
+    which commit to each input's amount.
+
     See the file ``examples/signature_requests/bitcoin_testnet.json``
     for a more complete example.
 
+    A request may instead be a base64-encoded BIP174 PSBT.  Each input
+    must carry its UTXO, its redeem and/or witness script, and a BIP32
+    derivation for a key from this wallet (which is unlocked to learn
+    its fingerprint).  A ``p2sh`` input's UTXO must be its full
+    previous transaction, since only that proves the input's amount.  The signature is then the same PSBT with a
+    partial signature added to each input, in place of the list of
+    signatures.
+
+    Requests with at least ``parallel_signing_threshold`` inputs are
+    signed across ``signing_processes`` worker processes when that is
+    greater than 1.  Keys and signature hashes are computed once,
+    here, and passed to the workers, which each sign a contiguous run
+    of inputs.
+
+    Validation compiles the request into a ``CompiledRequest``
+    (``self.compiled``), which display and signing read from.
+
+    Signature hashes are computed in the background while the user
+    confirms the request, as are keys if the wallet is already
+    unlocked.  No signature is created until the user confirms.
+
     """
+
+    def __init__(self,
+                 signing_wallet: HDWallet,
+                 session: Optional[PromptSession] = None,
+                 signing_processes: int = 1,
+                 parallel_signing_threshold: int = 256,
+                 request_limits: Optional[Dict[str, int]] = None) -> None:
+        super().__init__(signing_wallet, session, request_limits)
+        self.signing_processes = signing_processes
+        self.parallel_signing_threshold = parallel_signing_threshold
+        self.psbt: Optional[PSBT] = None
+        self.compiled = CompiledRequest()
+
+    def _parse_request(self) -> None:
+        if self.request_data is not None and is_psbt(self.request_data):
+            limits = self.request_parser.limits
+            if len(self.request_data) > limits['max_request_size']:
+                raise InvalidSignatureRequest("request is too large")
+            self.psbt = PSBT.from_base64(self.request_data)
+            if len(self.psbt.tx.vin) > limits['max_request_inputs']:
+                raise InvalidSignatureRequest("too many inputs")
+            if len(self.psbt.tx.vout) > limits['max_request_outputs']:
+                raise InvalidSignatureRequest("too many outputs")
+            self.request = self._request_from_psbt(self.psbt)
+        else:
+            super()._parse_request()
+
+    @property
+    def network(self) -> Network:
+        """The network of the request being signed"""
+        return network(self.testnet)
+
+    def _request_from_psbt(self, psbt: PSBT) -> Dict:
+        fingerprint = bytes.fromhex(self.wallet.fingerprint())
+
+        input_groups = []
+        for (psbt_input, txin) in zip(psbt.inputs, psbt.tx.vin):
+            if psbt_input.amount is None:
+                raise InvalidSignatureRequest("PSBT input has no UTXO")
+            if psbt_input.sighash_type not in (None, SIGHASH_ALL):
+                raise InvalidSignatureRequest("PSBT inputs must use SIGHASH_ALL")
+            sequences = [sequence
+                         for (_, key_fingerprint, sequence) in psbt_input.derivations
+                         if key_fingerprint == fingerprint]
+            if len(sequences) == 0:
+                raise InvalidSignatureRequest("PSBT input has no key from this wallet")
+            if psbt_input.witness_script is not None:
+                script = psbt_input.witness_script
+                if psbt_input.redeem_script is None:
+                    script_type = 'p2wsh'
+                else:
+                    script_type = 'p2sh-p2wsh'
+                    witness_program = CScript([0, sha256(script).digest()])
+                    if psbt_input.redeem_script != witness_program:
+                        raise InvalidSignatureRequest("PSBT redeem script does not match witness script")
+            elif psbt_input.redeem_script is not None:
+                # Legacy signature hashes do not commit to amounts, so
+                # only the previous transaction can vouch for them.
+                if psbt_input.non_witness_utxo_amount is None:
+                    raise InvalidSignatureRequest("PSBT legacy input has no previous transaction")
+                script = psbt_input.redeem_script
+                script_type = 'p2sh'
+            else:
+                raise InvalidSignatureRequest("PSBT input has no redeem or witness script")
+            input_groups.append([
+                script_type,
+                script.hex(),
+                bip32_path_from_sequence(sequences[0]),
+                {
+                    "txid": bitcoin.core.b2lx(txin.prevout.hash),
+                    "index": txin.prevout.n,
+                    "amount": psbt_input.amount,
+                }])
+
+        outputs = []
+        for txout in psbt.tx.vout:
+            try:
+                address = self.network.address(txout.scriptPubKey)
+            except ValueError:
+                raise InvalidSignatureRequest("PSBT output has an unsupported script")
+            outputs.append({"address": address, "amount": txout.nValue})
+
+        return {"inputs": input_groups, "outputs": outputs}
     
     #
     # Validation
@@ -90,10 +212,8 @@ class BitcoinSigner(Signer):
         * inputs & outputs
         * fee
         """
-        if self.testnet:
-            SelectParams('testnet')
-        else:
-            SelectParams('mainnet')
+        if not isinstance(self.request, dict):
+            raise InvalidSignatureRequest("request is not an object")
         self._validate_input_groups()
         self._validate_outputs()
         self._validate_fee()
@@ -106,36 +226,52 @@ class BitcoinSigner(Signer):
             raise InvalidSignatureRequest("input groups is not an array")
         if len(input_groups) == 0:
             raise InvalidSignatureRequest("at least one input group is required")
-        self.inputs = []
+        self.compiled = CompiledRequest()
         for input_group in input_groups:
+            if not isinstance(input_group, list):
+                raise InvalidSignatureRequest("input group is not an array")
             self._validate_input_group(input_group)
 
     def _validate_input_group(self, input_group: list) -> None:
+        script_type = 'p2sh'
+        if len(input_group) > 0 and input_group[0] in SCRIPT_TYPES:
+            script_type = input_group[0]
+            input_group = input_group[1:]
         if len(input_group) < 3:
             raise InvalidSignatureRequest("input group must include redeem script, BIP32 path, and at least one input")
         redeem_script = input_group[0]
         self._validate_redeem_script(redeem_script)
+        if script_type != 'p2sh':
+            self._validate_witness_script(redeem_script)
         bip32_path = input_group[1]
         self.validate_bip32_path(bip32_path)
-        address = generate_multisig_address(redeem_script, self.testnet)
+        script = CScript(bitcoin.core.x(redeem_script))
+        self.compiled.add_group(InputGroup(script_type,
+                                           script,
+                                           bip32_path,
+                                           self.network.multisig_address(script,
+                                                                         script_type)))
         for input in input_group[2:]:
             self._validate_input(input)
-            input['redeem_script'] = redeem_script
-            input['bip32_path'] = bip32_path
-            input['address'] = address
-            self.inputs.append(input)
+            self.compiled.add_input(bitcoin.core.lx(input['txid']),
+                                    input['index'],
+                                    input['amount'])
 
     def _validate_input(self, input: Dict) -> None:
+        if not isinstance(input, dict):
+            raise InvalidSignatureRequest("input is not an object")
         if 'amount' not in input:
             raise InvalidSignatureRequest("no amount in input")
         if type(input['amount']) != int:
             err_msg = "input amount must be an integer (satoshis)"
             raise InvalidSignatureRequest(err_msg)
-        if input['amount'] <= 0:
+        if input['amount'] <= 0 or not MoneyRange(input['amount']):
             raise InvalidSignatureRequest("invalid input amount")
 
         if 'txid' not in input:
             raise InvalidSignatureRequest("no txid in input")
+        if not isinstance(input['txid'], str):
+            raise InvalidSignatureRequest("input TXIDs must be hexadecimal strings")
         if len(input['txid']) != 64:
             raise InvalidSignatureRequest("txid must be 64 characters")
         try:
@@ -149,7 +285,7 @@ class BitcoinSigner(Signer):
         if type(input['index']) != int:
             err_msg = "input index must be an integer"
             raise InvalidSignatureRequest(err_msg)
-        if input['index'] < 0:
+        if input['index'] < 0 or input['index'] > 0xffffffff:
             raise InvalidSignatureRequest("invalid input index")
 
     def _validate_redeem_script(self, redeem_script: bytes) -> None:
@@ -158,57 +294,46 @@ class BitcoinSigner(Signer):
         except (ValueError, AttributeError):
             raise InvalidSignatureRequest("redeem script is not valid hex")
 
+    def _validate_witness_script(self, witness_script: str) -> None:
+        if len(witness_script) // 2 > MAX_WITNESS_SCRIPT_SIZE:
+            raise InvalidSignatureRequest("witness script is too large")
+
     def _validate_outputs(self) -> None:
         if 'outputs' not in self.request:
             raise InvalidSignatureRequest("no outputs")
-        self.outputs = self.request['outputs']
-        if not isinstance(self.outputs, list):
+        outputs = self.request['outputs']
+        if not isinstance(outputs, list):
             raise InvalidSignatureRequest("outputs is not an array")
-        if len(self.outputs) == 0:
+        if len(outputs) == 0:
             raise InvalidSignatureRequest("at least one output is required")
-        for output in self.outputs:
+        for output in outputs:
             self._validate_output(output)
 
     def _validate_output(self, output: Dict) -> None:
+        if not isinstance(output, dict):
+            raise InvalidSignatureRequest("output is not an object")
         if 'address' not in output:
             raise InvalidSignatureRequest("no address in output")
         if not isinstance(output['address'], (str,)):
             err_msg = "output addresses must be base58-encoded strings"
             raise InvalidSignatureRequest(err_msg)
-
-        if output['address'][:2] in ('bc', 'tb'):
-            try:
-                bech32.CBech32Data(output['address'])
-            except bech32.Bech32Error:
-                err_msg = "invalid bech32 output address (check mainnet vs. testnet)"
-                raise InvalidSignatureRequest(err_msg)
-        else:
-            try:
-                base58.CBase58Data(output['address'])
-            except base58.InvalidBase58Error:
-                err_msg = "output addresses must be base58-encoded strings"
-                raise InvalidSignatureRequest(err_msg)
-            except base58.Base58ChecksumError:
-                err_msg = "invalid output address checksum"
-                raise InvalidSignatureRequest(err_msg)
-        try:
-            CBitcoinAddress(output['address'])
-        except CBitcoinAddressError:
-            err_msg = "invalid output address (check mainnet vs. testnet)"
-            raise InvalidSignatureRequest(err_msg)
+        script = self._validate_output_address(output['address'])
 
         if 'amount' not in output:
             raise InvalidSignatureRequest("no amount in output")
         if type(output['amount']) != int:
             err_msg = "output amount must be an integer (satoshis)"
             raise InvalidSignatureRequest(err_msg)
-        if output['amount'] <= 0:
+        if output['amount'] <= 0 or not MoneyRange(output['amount']):
             raise InvalidSignatureRequest("invalid output amount")
+        self.compiled.add_output(output['address'], script, output['amount'])
+
+    def _validate_output_address(self, address: str) -> CScript:
+        """Validate an output address and return its scriptPubKey"""
+        return self.network.script_pubkey(address)
 
     def _validate_fee(self) -> None:
-        sum_inputs = sum([input['amount'] for input in self.inputs])
-        sum_outputs = sum([output['amount'] for output in self.outputs])
-        self.fee = sum_inputs - sum_outputs
+        self.fee = self.compiled.fee()
         if self.fee < 0:
             raise InvalidSignatureRequest("fee cannot be negative")
 
@@ -232,10 +357,12 @@ class BitcoinSigner(Signer):
     def _formatted_input_groups(self) -> str:
         bip32_paths  = {}
         addresses: Dict = defaultdict(int)
-        for input in self.inputs:
-            address = input['address']
-            addresses[address] += input['amount']
-            bip32_paths[address] = input['bip32_path'] # they're all the same
+        groups = self.compiled.groups
+        for (group_index, amount) in zip(self.compiled.input_groups,
+                                         self.compiled.amounts):
+            group = groups[group_index]
+            addresses[group.address] += amount
+            bip32_paths[group.address] = group.bip32_path # they're all the same
             
         lines = []
         for address in addresses:
@@ -246,15 +373,16 @@ class BitcoinSigner(Signer):
         return "\n".join(lines)
 
     def _formatted_outputs(self) -> str:
-        formatted_outputs = [self._format_output(output)
-                             for output
-                             in self.outputs]
+        formatted_outputs = [self._format_output(address, amount)
+                             for (address, amount)
+                             in zip(self.compiled.output_addresses,
+                                    self.compiled.output_amounts)]
         return "\n".join(formatted_outputs)
 
-    def _format_output(self, output: Dict) -> str:
+    def _format_output(self, address: str, amount: int) -> str:
         return "  {}\t{} BTC".format(
-            output['address'],
-            self._format_amount(output['amount']))
+            address,
+            self._format_amount(amount))
 
     def _format_amount(self, amount) -> str:
         return "%0.8f" % (amount / pow(10, 8))
@@ -263,74 +391,154 @@ class BitcoinSigner(Signer):
     # Signing
     #
 
-    def create_signature(self) -> None:
-        """Signs a given transaction"""
-        # Keys are derived in base.py
-
-        if self.testnet:
-            SelectParams('testnet')
-        else:
-            SelectParams('mainnet')
-
-        # Construct Inputs
-        tx_inputs = []
-        parsed_redeem_scripts = {}
-        for input in self.inputs:
-            if input['redeem_script'] not in parsed_redeem_scripts:
-                parsed_redeem_scripts[input['redeem_script']] = CScript(bitcoin.core.x(input['redeem_script']))
-
-            txid = bitcoin.core.lx(input['txid'])
-            vout = input['index']
-            tx_inputs.append(CMutableTxIn(COutPoint(txid, vout)))
-
-        # Construct Outputs
-        tx_outputs = []
+    def precompute(self) -> Dict:
+        """Compute signature hashes while the user confirms the request
 
-        for output in self.outputs:
-            output_script = (CBitcoinAddress(output['address'])
-                             .to_scriptPubKey())
-            tx_outputs.append(CMutableTxOut(output['amount'], output_script))
-
-        # Construct Transaction
-        tx = CTransaction(tx_inputs, tx_outputs)
+        Keys are derived too if the wallet is already unlocked.  (If
+        it is locked, unlocking would prompt for shards, so derivation
+        waits until the user confirms.)  Keys are derived one path at
+        a time from the root the wallet had when precomputation
+        started, stopping as soon as the precomputation is discarded
+        or the wallet is locked.
+        """
+        precomputed: Dict = {'signature_hashes': self._signature_hashes(self._transaction())}
+        root_node = self.wallet.root_node
+        if root_node is not None:
+            keys: Dict[str, Dict] = {}
+            for bip32_path in sorted(set(group.bip32_path for group in self.compiled.groups)):
+                if (self.precomputation_discarded()
+                        or self.wallet.root_node is not root_node):
+                    return precomputed
+                keys.update(self.wallet.derive_many([bip32_path], root_node=root_node))
+            precomputed['keys'] = keys
+            precomputed['root_node'] = root_node
+        return precomputed
 
-        # Construct data for each signature (1 per input)
-        signature_hashes = []
-        keys = {}
-        for input_index, input in enumerate(self.inputs):
-            redeem_script = input['redeem_script']
-            bip32_path = input['bip32_path']
-
-            # Signature Hash
-            signature_hashes.append(SignatureHash(
-                parsed_redeem_scripts[redeem_script],
-                tx, input_index, SIGHASH_ALL))
-
-            # Only need to generate keys once per unique BIP32 path
-            if keys.get(bip32_path) is None:
-                keys[bip32_path] = self.generate_child_keys(bip32_path)
-                keys[bip32_path]['signing_key'] = ecdsa.SigningKey.from_string(
-                    bytes.fromhex(keys[bip32_path]['private_key']),
-                    curve=ecdsa.SECP256k1)
+    def create_signature(self) -> None:
+        """Signs a given transaction"""
+        (keys, signature_hashes) = self._keys_and_signature_hashes()
+        requests = self._signing_requests(keys, signature_hashes)
 
         # Construct signatures (1 per input)
         # 
         # WARNING: We do not append the SIGHASH_ALL byte,
         # transaction constructioin should account for that.
         # 
-        signatures = []
-        for input_index, input in enumerate(self.inputs):
-            input = self.inputs[input_index]
-            signature_hash = signature_hashes[input_index]
-            signing_key = keys[input['bip32_path']]['signing_key']
-            signatures.append(
-                signing_key.sign_digest_deterministic(
-                    signature_hash,
-                    sha256,
-                    sigencode=ecdsa.util.sigencode_der_canonize
-                ).hex())
+        if (self.signing_processes > 1
+                and len(requests) >= self.parallel_signing_threshold):
+            signatures = self._sign_digests_in_parallel(requests)
+        else:
+            signatures = _sign_digests(requests, crypto.backend())
 
         # Assign result
-        result = {"signatures": signatures}
+        result: Dict
+        if self.psbt is not None:
+            result = {"psbt": self._signed_psbt(self.psbt, keys, signatures)}
+        else:
+            result = {"signatures": signatures}
 
         self.signature = result
+
+    def _keys(self) -> Dict[str, Dict]:
+        # Generate keys for all unique BIP32 paths in one pass
+        return self.generate_many_child_keys(
+            group.bip32_path for group in self.compiled.groups)
+
+    def _signature_hashes(self, tx: CTransaction) -> List[bytes]:
+        """Return the signature hash of each input of `tx`"""
+        legacy_hasher = LegacySignatureHasher(tx)
+        segwit_hasher = SegwitSignatureHasher(tx)
+        groups = self.compiled.groups
+        signature_hashes = []
+        for (input_index, (group_index, amount)) in enumerate(
+                zip(self.compiled.input_groups, self.compiled.amounts)):
+            group = groups[group_index]
+            if group.script_type == 'p2sh':
+                signature_hashes.append(legacy_hasher.signature_hash(
+                    input_index, group.script))
+            else:
+                signature_hashes.append(segwit_hasher.signature_hash(
+                    input_index, group.script, amount))
+        return signature_hashes
+
+    def _keys_and_signature_hashes(self) -> Tuple[Dict[str, Dict], List[bytes]]:
+        """Return the keys and signature hashes to sign with
+
+        Uses whatever ``precompute`` finished, and computes the rest.
+        Precomputed keys are only used if the wallet is still unlocked
+        with the root they were derived from.
+        """
+        precomputed = self._precomputed() or {}
+        keys = precomputed.get('keys')
+        if keys is None or self.wallet.root_node is not precomputed.get('root_node'):
+            keys = self._keys()
+        signature_hashes = precomputed.get('signature_hashes')
+        if signature_hashes is None:
+            signature_hashes = self._signature_hashes(self._transaction())
+        return (keys, signature_hashes)
+
+    def _signing_requests(self,
+                          keys: Dict[str, Dict],
+                          signature_hashes: List[bytes]) -> List[SigningRequest]:
+        """Pair each input's signature hash with the private key to sign it"""
+        private_keys = [bytes.fromhex(keys[group.bip32_path]['private_key'])
+                        for group in self.compiled.groups]
+        return [(private_keys[group_index], signature_hash)
+                for (group_index, signature_hash)
+                in zip(self.compiled.input_groups, signature_hashes)]
+
+    def _signed_psbt(self,
+                     psbt: PSBT,
+                     keys: Dict[str, Dict],
+                     signatures: List[str]) -> str:
+        partial_signatures = [
+            {bytes.fromhex(keys[self.compiled.group(input_index).bip32_path]['public_key']):
+             bytes.fromhex(signature) + bytes([SIGHASH_ALL])}
+            for (input_index, signature) in enumerate(signatures)]
+        return b64encode(
+            psbt.with_partial_signatures(partial_signatures)).decode('ascii')
+
+    def _canonical_request(self) -> str:
+        # A signed PSBT keeps every field of the original, not just
+        # those in the request.
+        if self.psbt is not None:
+            return self.psbt.to_base64()
+        return super()._canonical_request()
+
+    def _serialized_signature(self) -> str:
+        if self.psbt is not None and self.signature is not None:
+            return self.signature['psbt']
+        return super()._serialized_signature()
+
+    def _transaction(self) -> CTransaction:
+        """Construct the unsigned transaction for this request"""
+        if self.psbt is not None:
+            return self.psbt.tx
+        return self.compiled.transaction()
+
+    def _sign_digests_in_parallel(self,
+                                  requests: List[SigningRequest]) -> List[str]:
+        chunk_size = -(-len(requests) // self.signing_processes)
+        chunks = [requests[start:start + chunk_size]
+                  for start in range(0, len(requests), chunk_size)]
+        backend_class = type(crypto.backend())
+        with ProcessPoolExecutor(max_workers=self.signing_processes) as executor:
+            results = executor.map(_sign_digests_in_worker,
+                                   chunks,
+                                   [backend_class] * len(chunks))
+            return [signature
+                    for chunk_signatures in results
+                    for signature in chunk_signatures]
+
+
+def _sign_digests(requests: List[SigningRequest],
+                  backend: crypto.CryptoBackend) -> List[str]:
+    """Sign each `(private key, signature hash)` pair, returning hex signatures"""
+    return [signature.hex() for signature in backend.sign_digests(requests)]
+
+
+def _sign_digests_in_worker(requests: List[SigningRequest],
+                            backend_class: type) -> List[str]:
+    # Runs in a worker process, so the parent's backend is
+    # constructed afresh.
+    return _sign_digests(requests, backend_class())
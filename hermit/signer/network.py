@@ -0,0 +1,186 @@
+from collections import OrderedDict
+from hashlib import sha256
+from threading import Lock
+from typing import Callable, Hashable, TypeVar
+
+from bitcoin import base58, segwit_addr
+from bitcoin.core import Hash160
+from bitcoin.core.script import (CScript,
+                                 OP_0,
+                                 OP_CHECKSIG,
+                                 OP_DUP,
+                                 OP_EQUAL,
+                                 OP_EQUALVERIFY,
+                                 OP_HASH160)
+
+from hermit.errors import InvalidSignatureRequest
+
+T = TypeVar('T')
+
+
+class LookupCache(object):
+    """A bounded cache of computed values that counts its hits
+
+    Holds at most ``max_size`` values, evicting the least recently
+    used value first.  Computations that raise are not cached.  The
+    cache may be shared between threads.
+    """
+
+    def __init__(self, max_size: int = 1024) -> None:
+        self.max_size = max_size
+        self.values: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.values.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def get(self, key: Hashable, compute: Callable[[], T]) -> T:
+        """Return the value for `key`, calling `compute` on a miss"""
+        with self._lock:
+            if key in self.values:
+                self.hits += 1
+                self.values.move_to_end(key)
+                return self.values[key]
+            self.misses += 1
+        value = compute()
+        with self._lock:
+            self.values[key] = value
+            while len(self.values) > self.max_size:
+                self.values.popitem(last=False)
+        return value
+
+    def hit_rate(self) -> float:
+        """The fraction of lookups answered from the cache"""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class Network(object):
+    """The address parameters of a Bitcoin network
+
+    python-bitcoinlib keeps these in process-global state, switched
+    with ``bitcoin.SelectParams``.  A `Network` encodes and decodes
+    addresses for its own network only, so requests for different
+    networks can be handled side by side (in threads or worker
+    processes) without any global state.
+
+    Use the `MAINNET` and `TESTNET` instances (or `network`) rather
+    than constructing new ones.
+
+    Large requests tend to repeat the same few redeem scripts and
+    change addresses, so each network keeps two `LookupCache`
+    instances of at most `cache_size` entries: one maps scripts to
+    their multisig addresses, the other maps addresses to their
+    scriptPubKeys.
+    """
+
+    __slots__ = ('name', 'pubkey_address_prefix', 'script_address_prefix', 'bech32_hrp',
+                 'address_cache', 'script_pubkey_cache')
+
+    def __init__(self,
+                 name: str,
+                 pubkey_address_prefix: int,
+                 script_address_prefix: int,
+                 bech32_hrp: str,
+                 cache_size: int = 1024) -> None:
+        self.name = name
+        self.pubkey_address_prefix = pubkey_address_prefix
+        self.script_address_prefix = script_address_prefix
+        self.bech32_hrp = bech32_hrp
+        self.address_cache = LookupCache(cache_size)
+        self.script_pubkey_cache = LookupCache(cache_size)
+
+    def __repr__(self) -> str:
+        return 'Network({!r})'.format(self.name)
+
+    def script_pubkey(self, address: str) -> CScript:
+        """Return the scriptPubKey an address on this network pays to
+
+        Raises `InvalidSignatureRequest` if the address is malformed
+        or belongs to another network.
+        """
+        return self.script_pubkey_cache.get(
+            address, lambda: self._decode_address(address))
+
+    def _decode_address(self, address: str) -> CScript:
+        if address[:2] in ('bc', 'tb'):
+            (version, program) = segwit_addr.decode(self.bech32_hrp, address)
+            if version is None:
+                err_msg = "invalid bech32 output address (check mainnet vs. testnet)"
+                raise InvalidSignatureRequest(err_msg)
+            if version == 0 and len(program) in (20, 32):
+                return CScript([OP_0, bytes(program)])
+        else:
+            try:
+                data = base58.CBase58Data(address)
+            except base58.InvalidBase58Error:
+                err_msg = "output addresses must be base58-encoded strings"
+                raise InvalidSignatureRequest(err_msg)
+            except base58.Base58ChecksumError:
+                err_msg = "invalid output address checksum"
+                raise InvalidSignatureRequest(err_msg)
+            if len(data) == 20:
+                if data.nVersion == self.script_address_prefix:
+                    return CScript([OP_HASH160, bytes(data), OP_EQUAL])
+                if data.nVersion == self.pubkey_address_prefix:
+                    return CScript([OP_DUP, OP_HASH160, bytes(data),
+                                    OP_EQUALVERIFY, OP_CHECKSIG])
+        err_msg = "invalid output address (check mainnet vs. testnet)"
+        raise InvalidSignatureRequest(err_msg)
+
+    def address(self, script_pubkey: bytes) -> str:
+        """Return the address on this network paying to a scriptPubKey
+
+        Raises `ValueError` for scripts without a standard address.
+        """
+        script_pubkey = bytes(script_pubkey)
+        if (len(script_pubkey) == 23
+                and script_pubkey[:2] == b'\xa9\x14'
+                and script_pubkey[22] == OP_EQUAL):
+            return self._base58(self.script_address_prefix, script_pubkey[2:22])
+        if (len(script_pubkey) == 25
+                and script_pubkey[:3] == b'\x76\xa9\x14'
+                and script_pubkey[23:] == b'\x88\xac'):
+            return self._base58(self.pubkey_address_prefix, script_pubkey[3:23])
+        if (len(script_pubkey) in (22, 34)
+                and script_pubkey[0] == OP_0
+                and script_pubkey[1] == len(script_pubkey) - 2):
+            return segwit_addr.encode(self.bech32_hrp, 0, script_pubkey[2:])
+        raise ValueError("script has no standard address")
+
+    def multisig_address(self, script: bytes, script_type: str = 'p2sh') -> str:
+        """Return the address of a multisig redeem (or witness) script
+
+        `script_type` is one of ``p2sh``, ``p2wsh``, or ``p2sh-p2wsh``.
+        """
+        return self.address_cache.get(
+            (script_type, bytes(script)),
+            lambda: self._multisig_address(script, script_type))
+
+    def _multisig_address(self, script: bytes, script_type: str) -> str:
+        if script_type == 'p2sh':
+            return self._base58(self.script_address_prefix, Hash160(script))
+        witness_program = bytes(CScript([OP_0, sha256(script).digest()]))
+        if script_type == 'p2wsh':
+            return self.address(witness_program)
+        return self._base58(self.script_address_prefix, Hash160(witness_program))
+
+    def _base58(self, prefix: int, data: bytes) -> str:
+        return str(base58.CBase58Data.from_bytes(data, prefix))
+
+
+MAINNET = Network('mainnet', 0, 5, 'bc')
+TESTNET = Network('testnet', 111, 196, 'tb')
+
+
+def network(testnet: bool = False) -> Network:
+    """Return `TESTNET` or `MAINNET`"""
+    return TESTNET if testnet else MAINNET
@@ -0,0 +1,227 @@
+from base64 import b64decode, b64encode
+from binascii import Error as Base64DecodeError
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from bitcoin.core import CTransaction, CTxOut
+from bitcoin.core.serialize import SerializationError, VarIntSerializer
+
+from hermit.errors import InvalidSignatureRequest
+
+#: The magic bytes every PSBT starts with
+PSBT_MAGIC = b'psbt\xff'
+
+#: The base64 prefix of every PSBT (the encoding of ``PSBT_MAGIC``)
+PSBT_BASE64_PREFIX = 'cHNidP8'
+
+PSBT_GLOBAL_UNSIGNED_TX = 0x00
+PSBT_IN_NON_WITNESS_UTXO = 0x00
+PSBT_IN_WITNESS_UTXO = 0x01
+PSBT_IN_PARTIAL_SIG = 0x02
+PSBT_IN_SIGHASH_TYPE = 0x03
+PSBT_IN_REDEEM_SCRIPT = 0x04
+PSBT_IN_WITNESS_SCRIPT = 0x05
+PSBT_IN_BIP32_DERIVATION = 0x06
+
+
+def is_psbt(data: str) -> bool:
+    """Whether a signature request is a base64-encoded PSBT"""
+    return data.startswith(PSBT_BASE64_PREFIX)
+
+
+def _read_compact_size(data: memoryview, offset: int) -> Tuple[int, int]:
+    if offset >= len(data):
+        raise InvalidSignatureRequest("PSBT is truncated")
+    first = data[offset]
+    if first < 0xfd:
+        return (first, offset + 1)
+    width = {0xfd: 2, 0xfe: 4, 0xff: 8}[first]
+    if offset + 1 + width > len(data):
+        raise InvalidSignatureRequest("PSBT is truncated")
+    value = int.from_bytes(data[offset + 1:offset + 1 + width], 'little')
+    return (value, offset + 1 + width)
+
+
+def _read_map(data: memoryview,
+              offset: int) -> Iterator[Tuple[int, memoryview, memoryview, int]]:
+    """Yield the ``(type, key data, value, end)`` of each pair in the map at `offset`
+
+    Keys and values are views into `data`, not copies.  ``end`` is
+    the offset just past the pair; after the last pair, the generator
+    yields a pair of type ``-1`` whose ``end`` is just past the map's
+    terminating zero byte.
+    """
+    while True:
+        (key_length, offset) = _read_compact_size(data, offset)
+        if key_length == 0:
+            yield (-1, data[0:0], data[0:0], offset)
+            return
+        if offset + key_length > len(data):
+            raise InvalidSignatureRequest("PSBT is truncated")
+        key = data[offset:offset + key_length]
+        offset += key_length
+        (value_length, offset) = _read_compact_size(data, offset)
+        if offset + value_length > len(data):
+            raise InvalidSignatureRequest("PSBT is truncated")
+        value = data[offset:offset + value_length]
+        offset += value_length
+        yield (key[0], key[1:], value, offset)
+
+
+class PSBTInput(object):
+    """The fields Hermit needs from one input map of a PSBT
+
+    An input's amount may come from its witness UTXO or from the full
+    previous transaction (its non-witness UTXO), whose txid is checked
+    against the input's outpoint.  Only the latter can be trusted for
+    legacy inputs, whose signature hashes do not commit to amounts.
+    """
+
+    __slots__ = ('witness_utxo_amount', 'non_witness_utxo_amount',
+                 'redeem_script', 'witness_script',
+                 'sighash_type', 'derivations', 'signed_keys', 'end')
+
+    def __init__(self) -> None:
+        self.witness_utxo_amount: Optional[int] = None
+        self.non_witness_utxo_amount: Optional[int] = None
+        self.redeem_script: Optional[bytes] = None
+        self.witness_script: Optional[bytes] = None
+        self.sighash_type: Optional[int] = None
+        # (public key, master fingerprint, derivation sequence)
+        self.derivations: List[Tuple[bytes, bytes, Tuple[int, ...]]] = []
+        # Public keys that already have a partial signature
+        self.signed_keys: List[bytes] = []
+        # Offset of the input map's terminating zero byte
+        self.end = 0
+
+    @property
+    def amount(self) -> Optional[int]:
+        """The amount of this input, preferring its verified non-witness UTXO"""
+        if self.non_witness_utxo_amount is not None:
+            return self.non_witness_utxo_amount
+        return self.witness_utxo_amount
+
+
+class PSBT(object):
+    """A parsed BIP174 partially signed Bitcoin transaction
+
+    Parsing walks the serialized key-value maps once, keeping only
+    the unsigned transaction and the per-input fields used for
+    signing.  Every other field is left in the original bytes, which
+    are kept so that signatures can be spliced into them.
+    """
+
+    __slots__ = ('data', 'tx', 'inputs')
+
+    def __init__(self, data: bytes, tx: CTransaction,
+                 inputs: List[PSBTInput]) -> None:
+        self.data = data
+        self.tx = tx
+        self.inputs = inputs
+
+    @classmethod
+    def from_base64(cls, encoded: str) -> 'PSBT':
+        try:
+            return cls.parse(b64decode(encoded, validate=True))
+        except (Base64DecodeError, ValueError):
+            raise InvalidSignatureRequest("PSBT is not valid base64")
+
+    @classmethod
+    def parse(cls, data: bytes) -> 'PSBT':
+        if not data.startswith(PSBT_MAGIC):
+            raise InvalidSignatureRequest("not a PSBT")
+        view = memoryview(data)
+        offset = len(PSBT_MAGIC)
+
+        tx = None
+        for (key_type, key_data, value, offset) in _read_map(view, offset):
+            if key_type == PSBT_GLOBAL_UNSIGNED_TX and len(key_data) == 0:
+                tx = _deserialize_transaction(value)
+        if tx is None:
+            raise InvalidSignatureRequest("PSBT has no unsigned transaction")
+        for txin in tx.vin:
+            if len(txin.scriptSig) != 0:
+                raise InvalidSignatureRequest("PSBT transaction is not unsigned")
+
+        inputs = []
+        for txin in tx.vin:
+            psbt_input = PSBTInput()
+            for (key_type, key_data, value, offset) in _read_map(view, offset):
+                if key_type == PSBT_IN_WITNESS_UTXO:
+                    psbt_input.witness_utxo_amount = _deserialize_txout(value).nValue
+                elif key_type == PSBT_IN_NON_WITNESS_UTXO:
+                    utxo = _deserialize_transaction(value)
+                    if (utxo.GetTxid() != txin.prevout.hash
+                            or txin.prevout.n >= len(utxo.vout)):
+                        raise InvalidSignatureRequest("PSBT input UTXO does not match its outpoint")
+                    psbt_input.non_witness_utxo_amount = utxo.vout[txin.prevout.n].nValue
+                elif key_type == PSBT_IN_PARTIAL_SIG:
+                    psbt_input.signed_keys.append(bytes(key_data))
+                elif key_type == PSBT_IN_SIGHASH_TYPE:
+                    psbt_input.sighash_type = int.from_bytes(value, 'little')
+                elif key_type == PSBT_IN_REDEEM_SCRIPT:
+                    psbt_input.redeem_script = bytes(value)
+                elif key_type == PSBT_IN_WITNESS_SCRIPT:
+                    psbt_input.witness_script = bytes(value)
+                elif key_type == PSBT_IN_BIP32_DERIVATION:
+                    if len(value) < 4 or len(value) % 4 != 0:
+                        raise InvalidSignatureRequest("invalid PSBT BIP32 derivation")
+                    psbt_input.derivations.append((
+                        bytes(key_data),
+                        bytes(value[:4]),
+                        tuple(int.from_bytes(value[index:index + 4], 'little')
+                              for index in range(4, len(value), 4))))
+                elif key_type == -1:
+                    psbt_input.end = offset - 1
+            if (psbt_input.witness_utxo_amount is not None
+                    and psbt_input.non_witness_utxo_amount is not None
+                    and psbt_input.witness_utxo_amount != psbt_input.non_witness_utxo_amount):
+                raise InvalidSignatureRequest("PSBT input UTXOs do not agree on its amount")
+            inputs.append(psbt_input)
+
+        for txout in tx.vout:
+            for (_, _, _, offset) in _read_map(view, offset):
+                pass
+        if offset != len(data):
+            raise InvalidSignatureRequest("PSBT has trailing data")
+
+        return cls(data, tx, inputs)
+
+    def with_partial_signatures(self,
+                                signatures: List[Dict[bytes, bytes]]) -> bytes:
+        """Return this PSBT with partial signatures added to each input
+
+        `signatures` holds, for each input, a map from public key to
+        signature (including its sighash type byte).  Public keys that
+        already have a partial signature are skipped.
+        """
+        pieces = []
+        start = 0
+        for (psbt_input, input_signatures) in zip(self.inputs, signatures):
+            pieces.append(self.data[start:psbt_input.end])
+            for (public_key, signature) in input_signatures.items():
+                if public_key in psbt_input.signed_keys:
+                    continue
+                key = bytes([PSBT_IN_PARTIAL_SIG]) + public_key
+                pieces.append(VarIntSerializer.serialize(len(key)) + key
+                              + VarIntSerializer.serialize(len(signature))
+                              + signature)
+            start = psbt_input.end
+        pieces.append(self.data[start:])
+        return b''.join(pieces)
+
+    def to_base64(self) -> str:
+        return b64encode(self.data).decode('ascii')
+
+
+def _deserialize_transaction(value: memoryview) -> CTransaction:
+    try:
+        return CTransaction.deserialize(bytes(value))
+    except (SerializationError, ValueError):
+        raise InvalidSignatureRequest("invalid transaction in PSBT")
+
+
+def _deserialize_txout(value: memoryview) -> CTxOut:
+    try:
+        return CTxOut.deserialize(bytes(value))
+    except (SerializationError, ValueError):
+        raise InvalidSignatureRequest("invalid UTXO in PSBT")
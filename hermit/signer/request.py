@@ -0,0 +1,98 @@
+from array import array
+from typing import List
+
+from bitcoin.core import COutPoint, CMutableTxIn, CMutableTxOut, CTransaction
+from bitcoin.core.script import CScript
+
+
+class InputGroup(object):
+    """Inputs spent by the same script and signed by the same key
+
+    `script` is the redeem script (or witness script, for segwit
+    script types), and `script_pubkey` is the scriptPubKey of the
+    outputs the group spends.
+    """
+
+    __slots__ = ('script_type', 'script', 'bip32_path', 'address', 'script_pubkey')
+
+    def __init__(self,
+                 script_type: str,
+                 script: CScript,
+                 bip32_path: str,
+                 address: str,
+                 script_pubkey: bytes = b'') -> None:
+        self.script_type = script_type
+        self.script = script
+        self.bip32_path = bip32_path
+        self.address = address
+        self.script_pubkey = script_pubkey
+
+
+class CompiledRequest(object):
+    """A validated Bitcoin signature request
+
+    Validation decodes each part of a request once into this form,
+    which display and signing then read from.  Inputs are stored
+    column-wise, rather than as one dictionary per input:
+
+    * ``input_groups`` -- the index into ``groups`` of each input
+    * ``txids`` -- each input's 32-byte txid, in internal byte order,
+      concatenated
+    * ``indices`` -- each input's output index
+    * ``amounts`` -- each input's amount, in satoshis
+
+    Outputs are likewise stored as ``output_addresses``,
+    ``output_scripts`` (scriptPubKeys), and ``output_amounts``.
+    """
+
+    __slots__ = ('groups', 'input_groups', 'txids', 'indices', 'amounts',
+                 'output_addresses', 'output_scripts', 'output_amounts')
+
+    def __init__(self) -> None:
+        self.groups: List[InputGroup] = []
+        self.input_groups = array('L')
+        self.txids = bytearray()
+        self.indices = array('L')
+        self.amounts = array('q')
+        self.output_addresses: List[str] = []
+        self.output_scripts: List[CScript] = []
+        self.output_amounts = array('q')
+
+    def __len__(self) -> int:
+        return len(self.amounts)
+
+    def add_group(self, group: InputGroup) -> None:
+        """Add a group, which inputs added after it belong to"""
+        self.groups.append(group)
+
+    def add_input(self, txid: bytes, index: int, amount: int) -> None:
+        """Add an input to the most recently added group"""
+        self.input_groups.append(len(self.groups) - 1)
+        self.txids += txid
+        self.indices.append(index)
+        self.amounts.append(amount)
+
+    def add_output(self, address: str, script: CScript, amount: int) -> None:
+        self.output_addresses.append(address)
+        self.output_scripts.append(script)
+        self.output_amounts.append(amount)
+
+    def group(self, input_index: int) -> InputGroup:
+        """Return the group of an input"""
+        return self.groups[self.input_groups[input_index]]
+
+    def txid(self, input_index: int) -> bytes:
+        """Return the txid of an input, in internal byte order"""
+        return bytes(self.txids[32 * input_index:32 * (input_index + 1)])
+
+    def fee(self) -> int:
+        return sum(self.amounts) - sum(self.output_amounts)
+
+    def transaction(self) -> CTransaction:
+        """Construct the unsigned transaction spending the inputs"""
+        return CTransaction(
+            [CMutableTxIn(COutPoint(self.txid(input_index), index))
+             for (input_index, index) in enumerate(self.indices)],
+            [CMutableTxOut(amount, script)
+             for (script, amount) in zip(self.output_scripts,
+                                         self.output_amounts)])
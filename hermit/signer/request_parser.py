@@ -0,0 +1,140 @@
+import re
+from json import JSONDecodeError, JSONDecoder
+from json.scanner import NUMBER_RE
+from typing import Any, Dict, Optional, Tuple
+
+from hermit.config import HermitConfig
+from hermit.errors import InvalidSignatureRequest
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+_LITERALS = (('true', True), ('false', False), ('null', None))
+
+# Decodes strings, which need no limits of their own
+_STRING_DECODER = JSONDecoder()
+
+#: Arrays whose elements are counted, keyed by their path in the
+#: request (``None`` matches any array index), with the limit and
+#: name of what is counted.
+_COUNTED_ARRAYS = {
+    ('inputs',): ('max_request_inputs', 'input groups'),
+    ('inputs', None): ('max_request_inputs', 'inputs'),
+    ('outputs',): ('max_request_outputs', 'outputs'),
+}
+
+
+class RequestParser(object):
+    """Parses JSON signature requests within configured limits
+
+    ``json.loads`` builds the whole document before anything can be
+    checked.  This parser checks as it goes and raises
+    `InvalidSignatureRequest` as soon as the request is found to
+    exceed one of its `limits`:
+
+    * ``max_request_size`` -- characters in the request
+    * ``max_request_depth`` -- nesting of arrays and objects
+    * ``max_request_inputs`` -- input groups, and inputs across all groups
+    * ``max_request_outputs`` -- outputs
+
+    Limits missing from `limits` take their values from
+    ``HermitConfig.DefaultRequestLimits``.
+
+    Malformed JSON raises ``json.JSONDecodeError``, as ``json.loads``
+    would.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, int]] = None) -> None:
+        self.limits = dict(HermitConfig.DefaultRequestLimits)
+        if limits is not None:
+            self.limits.update(limits)
+
+    def parse(self, text: str) -> Any:
+        if len(text) > self.limits['max_request_size']:
+            raise InvalidSignatureRequest("request is too large")
+        self._text = text
+        self._counts: Dict[Tuple, int] = {}
+        (value, index) = self._value(self._skip(0), (), 0)
+        if self._skip(index) != len(text):
+            raise JSONDecodeError("Extra data", text, self._skip(index))
+        return value
+
+    def _skip(self, index: int) -> int:
+        match = _WHITESPACE.match(self._text, index)
+        return index if match is None else match.end()
+
+    def _value(self, index: int, path: Tuple, depth: int) -> Tuple[Any, int]:
+        text = self._text
+        char = text[index:index + 1]
+        if char == '"':
+            return _STRING_DECODER.raw_decode(text, index)
+        if char == '{':
+            return self._object(index + 1, path, depth + 1)
+        if char == '[':
+            return self._array(index + 1, path, depth + 1)
+        for (literal, value) in _LITERALS:
+            if text.startswith(literal, index):
+                return (value, index + len(literal))
+        match = NUMBER_RE.match(text, index)
+        if match is None:
+            raise JSONDecodeError("Expecting value", text, index)
+        (integer, fraction, exponent) = match.groups()
+        if fraction or exponent:
+            return (float(integer + (fraction or '') + (exponent or '')), match.end())
+        return (int(integer), match.end())
+
+    def _object(self, index: int, path: Tuple, depth: int) -> Tuple[Dict, int]:
+        self._check_depth(depth)
+        text = self._text
+        result: Dict = {}
+        index = self._skip(index)
+        if text[index:index + 1] == '}':
+            return (result, index + 1)
+        while True:
+            if text[index:index + 1] != '"':
+                raise JSONDecodeError(
+                    "Expecting property name enclosed in double quotes", text, index)
+            (key, index) = _STRING_DECODER.raw_decode(text, index)
+            index = self._skip(index)
+            if text[index:index + 1] != ':':
+                raise JSONDecodeError("Expecting ':' delimiter", text, index)
+            (result[key], index) = self._value(self._skip(index + 1),
+                                               path + (key,),
+                                               depth)
+            index = self._skip(index)
+            char = text[index:index + 1]
+            if char == '}':
+                return (result, index + 1)
+            if char != ',':
+                raise JSONDecodeError("Expecting ',' delimiter", text, index)
+            index = self._skip(index + 1)
+
+    def _array(self, index: int, path: Tuple, depth: int) -> Tuple[list, int]:
+        self._check_depth(depth)
+        text = self._text
+        counted = _COUNTED_ARRAYS.get(path)
+        result: list = []
+        index = self._skip(index)
+        if text[index:index + 1] == ']':
+            return (result, index + 1)
+        while True:
+            if counted is not None and text[index:index + 1] in ('{', '['):
+                self._count(path, *counted)
+            (value, index) = self._value(index, path + (None,), depth)
+            result.append(value)
+            index = self._skip(index)
+            char = text[index:index + 1]
+            if char == ']':
+                return (result, index + 1)
+            if char != ',':
+                raise JSONDecodeError("Expecting ',' delimiter", text, index)
+            index = self._skip(index + 1)
+
+    def _check_depth(self, depth: int) -> None:
+        if depth > self.limits['max_request_depth']:
+            raise InvalidSignatureRequest("request is nested too deeply")
+
+    def _count(self, path: Tuple, limit: str, name: str) -> None:
+        count = self._counts.get(path, 0) + 1
+        if count > self.limits[limit]:
+            raise InvalidSignatureRequest("too many {}".format(name))
+        self._counts[path] = count
@@ -0,0 +1,196 @@
+import hashlib
+import struct
+from typing import Dict, Sequence
+
+from bitcoin.core import CTransaction
+from bitcoin.core.script import (CScript,
+                                 FindAndDelete,
+                                 OP_CODESEPARATOR,
+                                 SIGHASH_ALL)
+from bitcoin.core.serialize import VarIntSerializer
+
+from hermit.secp256k1 import tagged_hash
+
+
+class LegacySignatureHasher(object):
+    """Computes legacy (pre-segwit) ``SIGHASH_ALL`` signature hashes
+
+    python-bitcoinlib's ``SignatureHash`` copies and re-serializes the
+    whole transaction for every input, so hashing every input of a
+    transaction takes time quadratic in the number of inputs.
+
+    This class serializes the transaction once, as it would appear
+    with every scriptSig empty.  The preimage for an input is that
+    serialization with the input's (empty) scriptSig replaced by its
+    script code.  The hash of everything before the input is carried
+    forward from one input to the next, so each input only costs one
+    copy of the running hash plus hashing the bytes after it.
+
+    Results are identical to
+    ``SignatureHash(script, tx, input_index, SIGHASH_ALL)``.
+
+    Example:
+
+        hasher = LegacySignatureHasher(tx)
+        for index in range(len(tx.vin)):
+            sighash = hasher.signature_hash(index, redeem_script)
+
+    """
+
+    def __init__(self, tx: CTransaction) -> None:
+        self.tx = tx
+        header = (struct.pack('<i', tx.nVersion)
+                  + VarIntSerializer.serialize(len(tx.vin)))
+        inputs = []
+        self._outpoints = []
+        self._sequences = []
+        self._offsets = []
+        offset = len(header)
+        for txin in tx.vin:
+            outpoint = txin.prevout.serialize()
+            sequence = struct.pack('<I', txin.nSequence)
+            self._outpoints.append(outpoint)
+            self._sequences.append(sequence)
+            self._offsets.append(offset)
+            inputs.append(outpoint + b'\x00' + sequence)
+            offset += len(inputs[-1])
+        self._offsets.append(offset)
+        self._serialization = memoryview(
+            header
+            + b''.join(inputs)
+            + VarIntSerializer.serialize(len(tx.vout))
+            + b''.join(txout.serialize() for txout in tx.vout)
+            + struct.pack('<I', tx.nLockTime)
+            + struct.pack('<i', SIGHASH_ALL))
+        self._prefix = hashlib.sha256()
+        self._prefix_end = 0
+        self._script_codes: Dict[bytes, bytes] = {}
+
+    def signature_hash(self, input_index: int, script: CScript) -> bytes:
+        """Return the ``SIGHASH_ALL`` signature hash of an input
+
+        Hashing inputs in increasing order is fastest; going back to an
+        earlier input rehashes the transaction up to it.
+        """
+        start = self._offsets[input_index]
+        end = self._offsets[input_index + 1]
+        if start < self._prefix_end:
+            self._prefix = hashlib.sha256()
+            self._prefix_end = 0
+        self._prefix.update(self._serialization[self._prefix_end:start])
+        self._prefix_end = start
+
+        script_code = self._script_code(script)
+        preimage = self._prefix.copy()
+        preimage.update(self._outpoints[input_index])
+        preimage.update(VarIntSerializer.serialize(len(script_code)))
+        preimage.update(script_code)
+        preimage.update(self._sequences[input_index])
+        preimage.update(self._serialization[end:])
+        return hashlib.sha256(preimage.digest()).digest()
+
+    def _script_code(self, script: CScript) -> bytes:
+        script_code = self._script_codes.get(script)
+        if script_code is None:
+            script_code = bytes(FindAndDelete(script, CScript([OP_CODESEPARATOR])))
+            self._script_codes[script] = script_code
+        return script_code
+
+
+class SegwitSignatureHasher(object):
+    """Computes BIP143 (segwit version 0) ``SIGHASH_ALL`` signature hashes
+
+    The hashes of all outpoints, all sequence numbers, and all outputs
+    that BIP143 commits to are computed once per transaction, so each
+    input only hashes a fixed-size preimage.
+
+    Results are identical to
+    ``SignatureHash(script, tx, input_index, SIGHASH_ALL, amount=amount,
+    sigversion=SIGVERSION_WITNESS_V0)``.
+
+    Example:
+
+        hasher = SegwitSignatureHasher(tx)
+        for index in range(len(tx.vin)):
+            sighash = hasher.signature_hash(index, witness_script, amounts[index])
+
+    """
+
+    def __init__(self, tx: CTransaction) -> None:
+        self.tx = tx
+        self._outpoints = [txin.prevout.serialize() for txin in tx.vin]
+        self._sequences = [struct.pack('<I', txin.nSequence) for txin in tx.vin]
+        self._header = struct.pack('<i', tx.nVersion) + _double_sha256(
+            b''.join(self._outpoints)) + _double_sha256(b''.join(self._sequences))
+        self._trailer = (_double_sha256(b''.join(txout.serialize()
+                                                 for txout in tx.vout))
+                         + struct.pack('<I', tx.nLockTime)
+                         + struct.pack('<i', SIGHASH_ALL))
+
+    def signature_hash(self,
+                       input_index: int,
+                       script: CScript,
+                       amount: int) -> bytes:
+        """Return the ``SIGHASH_ALL`` signature hash of an input spending `amount` satoshis"""
+        return _double_sha256(self._header
+                              + self._outpoints[input_index]
+                              + VarIntSerializer.serialize(len(script))
+                              + bytes(script)
+                              + struct.pack('<q', amount)
+                              + self._sequences[input_index]
+                              + self._trailer)
+
+
+class TaprootSignatureHasher(object):
+    """Computes BIP341 key path ``SIGHASH_DEFAULT`` signature hashes
+
+    BIP341 signature hashes commit to every input's outpoint, amount,
+    scriptPubKey, and sequence number, and to every output.  Each of
+    those five hashes (``sha_prevouts``, ``sha_amounts``,
+    ``sha_scriptpubkeys``, ``sha_sequences``, and ``sha_outputs``) is
+    computed once per transaction, so each input only hashes a
+    fixed-size message.
+
+    `amounts` and `script_pubkeys` give the amount and scriptPubKey
+    of the output spent by each input of `tx`, in order.
+    """
+
+    #: The ``SIGHASH_DEFAULT`` hash type, which signs like
+    #: ``SIGHASH_ALL`` without a trailing hash type byte.
+    SIGHASH_DEFAULT = 0
+
+    def __init__(self,
+                 tx: CTransaction,
+                 amounts: Sequence[int],
+                 script_pubkeys: Sequence[bytes]) -> None:
+        self.tx = tx
+        sha_prevouts = hashlib.sha256(
+            b''.join(txin.prevout.serialize() for txin in tx.vin)).digest()
+        sha_amounts = hashlib.sha256(
+            b''.join(struct.pack('<q', amount) for amount in amounts)).digest()
+        sha_scriptpubkeys = hashlib.sha256(
+            b''.join(VarIntSerializer.serialize(len(script_pubkey)) + script_pubkey
+                     for script_pubkey in script_pubkeys)).digest()
+        sha_sequences = hashlib.sha256(
+            b''.join(struct.pack('<I', txin.nSequence) for txin in tx.vin)).digest()
+        sha_outputs = hashlib.sha256(
+            b''.join(txout.serialize() for txout in tx.vout)).digest()
+        self._prefix = (b'\x00'  # epoch
+                        + bytes([self.SIGHASH_DEFAULT])
+                        + struct.pack('<i', tx.nVersion)
+                        + struct.pack('<I', tx.nLockTime)
+                        + sha_prevouts
+                        + sha_amounts
+                        + sha_scriptpubkeys
+                        + sha_sequences
+                        + sha_outputs
+                        + b'\x00')  # key path spend, no annex
+
+    def signature_hash(self, input_index: int) -> bytes:
+        """Return the key path signature hash of an input"""
+        return tagged_hash("TapSighash",
+                           self._prefix + struct.pack('<I', input_index))
+
+
+def _double_sha256(data: bytes) -> bytes:
+    return hashlib.sha256(hashlib.sha256(data).digest()).digest()
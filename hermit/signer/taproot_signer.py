@@ -0,0 +1,193 @@
+import os
+from typing import List, Optional, Sequence, Tuple
+
+import bitcoin
+from bitcoin.core import CTransaction
+from bitcoin.core.script import CScript
+from bitcoin.segwit_addr import (CHARSET,
+                                 bech32_hrp_expand,
+                                 bech32_polymod,
+                                 convertbits)
+
+from hermit import secp256k1
+from hermit.errors import InvalidSignatureRequest
+from hermit.signer.bitcoin_signer import BitcoinSigner
+from hermit.signer.psbt import is_psbt
+from hermit.signer.request import InputGroup
+from hermit.signer.sighash import TaprootSignatureHasher
+
+#: The bech32m checksum constant (BIP350)
+BECH32M_CONST = 0x2bc830a3
+
+
+def taproot_output_key(public_key: bytes) -> bytes:
+    """Return the x-only BIP86 output key for a compressed internal public key
+
+    The internal key is tweaked with the hash of its own x coordinate
+    (committing to no script tree).
+    """
+    internal_key = secp256k1.lift_x(public_key[1:])
+    tweak = int.from_bytes(
+        secp256k1.tagged_hash("TapTweak", secp256k1.x_only(internal_key)), 'big')
+    if tweak >= secp256k1.N:
+        raise ValueError("invalid taproot tweak")
+    output_key = secp256k1.add(internal_key, secp256k1.multiply_g(tweak))
+    if output_key is None:
+        raise ValueError("invalid taproot tweak")
+    return secp256k1.x_only(output_key)
+
+
+def taproot_private_key(private_key: bytes) -> int:
+    """Return the secret for the BIP86 output key of a private key"""
+    secret = int.from_bytes(private_key, 'big')
+    point = secp256k1.multiply_g(secret)
+    if point is None:
+        raise ValueError("invalid private key")
+    if point[1] % 2 != 0:
+        secret = secp256k1.N - secret
+    tweak = int.from_bytes(
+        secp256k1.tagged_hash("TapTweak", secp256k1.x_only(point)), 'big')
+    return (secret + tweak) % secp256k1.N
+
+
+def taproot_script_pubkey(output_key: bytes) -> bytes:
+    """Return the ``OP_1 <output key>`` scriptPubKey for an output key"""
+    return b'\x51\x20' + output_key
+
+
+def encode_taproot_address(output_key: bytes, testnet: bool = False) -> str:
+    """Return the bech32m (BIP350) address for an x-only output key"""
+    hrp = 'tb' if testnet else 'bc'
+    data = [1] + convertbits(output_key, 8, 5)
+    polymod = bech32_polymod(bech32_hrp_expand(hrp) + data + [0] * 6) ^ BECH32M_CONST
+    checksum = [(polymod >> 5 * (5 - i)) & 31 for i in range(6)]
+    return hrp + '1' + ''.join(CHARSET[d] for d in data + checksum)
+
+
+def decode_taproot_address(address: str, testnet: bool = False) -> Optional[bytes]:
+    """Return the output key of a bech32m taproot address, or `None`"""
+    hrp = 'tb' if testnet else 'bc'
+    if address.lower() != address and address.upper() != address:
+        return None
+    address = address.lower()
+    if not address.startswith(hrp + '1'):
+        return None
+    try:
+        data = [CHARSET.index(c) for c in address[len(hrp) + 1:]]
+    except ValueError:
+        return None
+    if len(data) < 7 or bech32_polymod(bech32_hrp_expand(hrp) + data) != BECH32M_CONST:
+        return None
+    if data[0] != 1:
+        return None
+    program = convertbits(data[1:-6], 5, 8, False)
+    if program is None or len(program) != 32:
+        return None
+    return bytes(program)
+
+
+class TaprootSigner(BitcoinSigner):
+    """Signs BTC transactions spending BIP86 taproot outputs
+
+    Each input is spent with a BIP340 Schnorr signature along the
+    taproot key path.  The signing key at each input's BIP32 path is
+    the BIP86 internal key, tweaked to commit to no script tree.
+
+    Signature requests must match the following schema:
+
+        {
+
+          "inputs": [
+            [
+              BIP32_PATH,
+              {
+                "txid": TXID,
+                "index": INDEX,
+                "amount": SATOSHIS
+              },
+              ...
+            ],
+            ...
+          ],
+
+          "outputs": [
+            {
+              "address": ADDRESS,
+              "amount": SATOSHIS
+            },
+            ...
+          ]
+
+        }
+
+    Outputs may pay to taproot (bech32m) addresses as well as to every
+    address type ``BitcoinSigner`` accepts.
+
+    Input addresses are derived from the wallet's public keys during
+    validation, so validation may unlock the wallet unless the public
+    keys are cached.
+
+    The signature is a list of hex-encoded 64-byte Schnorr signatures,
+    one per input, which are signed with ``SIGHASH_DEFAULT``.
+    """
+
+    def _parse_request(self) -> None:
+        # A PSBT would otherwise be parsed by BitcoinSigner into input
+        # groups of the wrong shape, after unlocking the wallet.
+        if self.request_data is not None and is_psbt(self.request_data):
+            raise InvalidSignatureRequest("PSBT requests cannot be signed with a taproot signer")
+        super()._parse_request()
+
+    def _validate_input_group(self, input_group: list) -> None:
+        if len(input_group) < 2:
+            raise InvalidSignatureRequest("input group must include BIP32 path and at least one input")
+        bip32_path = input_group[0]
+        self.validate_bip32_path(bip32_path)
+        output_key = taproot_output_key(
+            bytes.fromhex(self.wallet.public_key(bip32_path)))
+        address = encode_taproot_address(output_key, self.testnet)
+        self.compiled.add_group(InputGroup('p2tr',
+                                           CScript(),
+                                           bip32_path,
+                                           address,
+                                           taproot_script_pubkey(output_key)))
+        for input in input_group[1:]:
+            self._validate_input(input)
+            self.compiled.add_input(bitcoin.core.lx(input['txid']),
+                                    input['index'],
+                                    input['amount'])
+
+    def _validate_output_address(self, address: str) -> CScript:
+        output_key = decode_taproot_address(address, self.testnet)
+        if output_key is None:
+            return super()._validate_output_address(address)
+        return CScript(taproot_script_pubkey(output_key))
+
+    def create_signature(self) -> None:
+        """Signs a given transaction"""
+        (keys, signature_hashes) = self._keys_and_signature_hashes()
+        self.signature = {
+            "signatures": _sign_taproot_digests(
+                self._signing_requests(keys, signature_hashes))
+        }
+
+    def _signature_hashes(self, tx: CTransaction) -> List[bytes]:
+        groups = self.compiled.groups
+        hasher = TaprootSignatureHasher(
+            tx,
+            self.compiled.amounts,
+            [groups[group_index].script_pubkey
+             for group_index in self.compiled.input_groups])
+        return [hasher.signature_hash(input_index)
+                for input_index in range(len(self.compiled))]
+
+
+def _sign_taproot_digests(requests: Sequence[Tuple[bytes, bytes]]) -> List[str]:
+    # Each private key is tweaked once, however many inputs it signs
+    secrets = {private_key: taproot_private_key(private_key)
+               for private_key in set(private_key for (private_key, _) in requests)}
+    return [
+        secp256k1.schnorr_sign(secrets[private_key],
+                               signature_hash,
+                               os.urandom(32)).hex()
+        for (private_key, signature_hash) in requests]
@@ -4,7 +4,7 @@ from .shards import shard_command
 import hermit.ui.state as state
 import traceback
 import sys
-from hermit import __version__;
+from hermit import __version__, crypto
 
 @wallet_command('unlock')
 @shard_command('unlock')
@@ -57,10 +57,14 @@ def toggle_debug():
   When debug mode is active, more information is displayed about
   errors and some additional commands are available.
 
-  The word DEBUG will also appear in Hermit's bottom toolbar.
+  The word DEBUG will also appear in Hermit's bottom toolbar, and
+  the cryptography backend in use is printed.
 
     """
     state.Debug = not state.Debug
+    if state.Debug:
+        print_formatted_text("Cryptography backend: {}".format(
+            crypto.backend().name))
 
 @wallet_command('version')
 @shard_command('version')
@@ -68,7 +72,11 @@ def unlock():
     """usage:  version
 
   Print out the version of hermit currently running.
-  
-  
+
+  In debug mode, also print the cryptography backend in use.
+
     """
     print_formatted_text(__version__)
+    if state.Debug:
+        print_formatted_text("Cryptography backend: {}".format(
+            crypto.backend().name))
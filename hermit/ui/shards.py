@@ -99,7 +99,7 @@ def build_family_from_wallet():
 def list_shards():
     """usage:  list-shards
 
-  List all shards.
+  List all shards, grouped by family.
 
     """
     state.Wallet.shards.list_shards()
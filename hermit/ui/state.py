@@ -1,5 +1,7 @@
 from os import environ
 
+from hermit.config import HermitConfig
+from hermit.pubkey_cache import PublicKeyCache
 from hermit.wallet import HDWallet
 
 Timeout = 0
@@ -10,6 +12,7 @@ Live = False
 Debug = 'DEBUG' in environ
 Testnet = 'TESTNET' in environ
 
-Wallet = HDWallet()
+Wallet = HDWallet(
+    public_key_cache=PublicKeyCache(HermitConfig.load().public_key_cache_file))
 
 Session = None
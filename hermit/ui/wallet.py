@@ -1,8 +1,11 @@
 from prompt_toolkit import print_formatted_text
 from json import dumps
 
+from hermit.config import HermitConfig
 from hermit.signer import (BitcoinSigner,
-                           EchoSigner)
+                           EchoSigner,
+                           TaprootSigner)
+from hermit.signer.network import Network
 
 from .base import *
 from .repl import repl
@@ -34,7 +37,10 @@ def echo():
   Agreeing to "sign" does not require unlocking the wallet.
 
     """
-    EchoSigner(state.Wallet, state.Session).sign(testnet=state.Testnet)
+    EchoSigner(state.Wallet,
+               state.Session,
+               request_limits=HermitConfig.load().request_limits,
+               ).sign(testnet=state.Testnet)
 
 
 @wallet_command('sign-bitcoin')
@@ -55,8 +61,49 @@ def sign_bitcoin():
 
   Creating a signature requires unlocking the wallet.
 
+  In debug mode, also print how often address lookups were answered
+  from cache.
+
     """
-    BitcoinSigner(state.Wallet, state.Session).sign(testnet=state.Testnet)
+    config = HermitConfig.load()
+    signer = BitcoinSigner(state.Wallet,
+                           state.Session,
+                           signing_processes=config.signing_processes,
+                           parallel_signing_threshold=config.parallel_signing_threshold,
+                           request_limits=config.request_limits)
+    signer.sign(testnet=state.Testnet)
+    if state.Debug:
+        _print_address_cache_stats(signer.network)
+
+
+@wallet_command('sign-taproot')
+def sign_taproot():
+    """usage:  sign-taproot
+
+  Create a signature for a Bitcoin transaction spending taproot
+  (BIP86) outputs.
+
+  Works like sign-bitcoin, except that each input group is a BIP32
+  path followed by inputs, with no redeem script, and each signature
+  is a 64-byte Schnorr signature.
+
+  Creating a signature requires unlocking the wallet.
+
+    """
+    signer = TaprootSigner(state.Wallet,
+                           state.Session,
+                           request_limits=HermitConfig.load().request_limits)
+    signer.sign(testnet=state.Testnet)
+    if state.Debug:
+        _print_address_cache_stats(signer.network)
+
+
+def _print_address_cache_stats(network: Network) -> None:
+    for (name, cache) in (("Address", network.address_cache),
+                          ("ScriptPubKey", network.script_pubkey_cache)):
+        print_formatted_text(
+            "{} cache ({}): {} hits, {} misses ({:.0%} hit rate)".format(
+                name, network.name, cache.hits, cache.misses, cache.hit_rate()))
 
 
 @wallet_command('export-xpub')
@@ -68,7 +115,9 @@ def export_xpub(path):
   Hermit will open a window displaying the extended public key as a QR
   code.
 
-  Exporting an extended public key requires unlocking the wallet.
+  Exporting an extended public key requires unlocking the wallet,
+  unless it (or its last hardened ancestor) was already exported with
+  the current shards.
 
   Examples:
 
@@ -76,7 +125,7 @@ def export_xpub(path):
     wallet> export-xpub m/44'/60'/2'
 
     """
-    xpub = state.Wallet.extended_public_key(path)
+    xpub = state.Wallet.export_extended_public_key(path)
     name = "Extended public key for BIP32 path {}:".format(path)
     print_formatted_text("\n" + name)
     print_formatted_text(xpub)
@@ -91,7 +140,9 @@ def export_pub(path):
 
   Hermit will open a window displaying the public key as a QR code.
 
-  Exporting a public key requires unlocking the wallet.
+  Exporting a public key requires unlocking the wallet, unless it (or
+  its last hardened ancestor) was already exported with the current
+  shards.
 
   Examples:
 
@@ -99,7 +150,7 @@ def export_pub(path):
     wallet> export-pub m/44'/60'/2'/1/12
 
     """
-    pubkey = state.Wallet.public_key(path)
+    pubkey = state.Wallet.export_public_key(path)
     name = "Public key for BIP32 path {}:".format(path)
     print_formatted_text("\n" + name)
     print_formatted_text(pubkey)
@@ -173,6 +224,8 @@ def wallet_help(*args,):
   <b>SIGNING</b>
         <i>sign-bitcoin</i>
           Produce a signature for a Bitcoin transaction
+        <i>sign-taproot</i>
+          Produce a signature for a taproot Bitcoin transaction
       <i>sign-echo</i>
           Echo a signature request back as a signature
   <b>KEYS</b>
@@ -1,15 +1,14 @@
+from collections import OrderedDict
 from re import match
-from typing import Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 
 from mnemonic import Mnemonic
-from pybitcointools import (bip32_ckd,
-                            bip32_privtopub,
-                            bip32_master_key,
-                            bip32_deserialize,
-                            bip32_extract_key)
+from pybitcointools import bip32_deserialize
 
 from hermit import shards
+from hermit.bip32 import BIP32Node, HARDENED_OFFSET
 from hermit.errors import HermitError
+from hermit.pubkey_cache import PublicKeyCache
 
 
 def compressed_private_key_from_bip32(bip32_xkey: str) -> bytes:
@@ -26,8 +25,7 @@ def compressed_public_key_from_bip32(bip32_xkey: str) -> bytes:
 
 
 def _hardened(id: int) -> int:
-    hardening_offset = 2 ** 31
-    return (hardening_offset + id)
+    return (HARDENED_OFFSET + id)
 
 
 def _decode_segment(segment: str) -> int:
@@ -51,23 +49,168 @@ def bip32_sequence(bip32_path: str) -> Tuple[int, ...]:
         if len(segment) != 0)
 
 
+def bip32_path_from_sequence(sequence: Tuple[int, ...]) -> str:
+    """Turn a tuple of derivation points back into a BIP32 path
+    """
+    segments = ["m"]
+    for index in sequence:
+        if index >= HARDENED_OFFSET:
+            segments.append("{}'".format(index - HARDENED_OFFSET))
+        else:
+            segments.append(str(index))
+    return "/".join(segments)
+
+
+def hardened_prefix_length(sequence: Tuple[int, ...]) -> int:
+    """Return the length of the prefix of `sequence` ending in its last hardened index
+
+    Every index after this prefix is non-hardened and can be derived
+    from the public node at the end of the prefix.
+    """
+    for depth in range(len(sequence), 0, -1):
+        if sequence[depth - 1] >= HARDENED_OFFSET:
+            return depth
+    return 0
+
+
+class DerivationCache(object):
+    """Caches derived BIP32 nodes keyed by their path prefix
+
+    Each entry maps a derivation sequence (a tuple of child indices
+    from the root) to the ``BIP32Node`` at that path.  Looking
+    up a path finds the longest cached prefix and only derives the
+    remaining steps, caching every intermediate node on the way.
+
+    Many paths in a signature request share the same hardened account
+    prefix (e.g. ``m/45'/1'/120'``), so that prefix is derived once
+    and every deeper path starts from it.
+
+    The cache holds at most ``max_size`` nodes, evicting the least
+    recently used node first.  A lookup also refreshes every cached
+    ancestor of the node it starts from, so the prefix shared by a
+    long run of sibling paths is never evicted in favour of the
+    siblings themselves.
+    """
+
+    def __init__(self, max_size: int = 1024) -> None:
+        self.max_size = max_size
+        self.nodes: OrderedDict = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def clear(self) -> None:
+        self.nodes.clear()
+
+    def derive(self,
+               root: BIP32Node,
+               sequence: Tuple[int, ...],
+               offset: int = 0,
+               public: bool = False) -> BIP32Node:
+        """Return the node at `sequence`
+
+        `root` is the node at ``sequence[:offset]``.  When `public` is
+        set, the remaining steps use public derivation, so `root` need
+        not have a private key.
+        """
+        depth = len(sequence)
+        node = root
+        while depth > offset:
+            cached = self.nodes.get(sequence[:depth])
+            if cached is not None:
+                node = cached
+                break
+            depth -= 1
+
+        for index in range(offset + 1, depth + 1):
+            if sequence[:index] in self.nodes:
+                self.nodes.move_to_end(sequence[:index])
+
+        for index in range(depth, len(sequence)):
+            if public:
+                node = node.public_child(sequence[index])
+            else:
+                node = node.child(sequence[index])
+            self._put(sequence[:index + 1], node)
+
+        return node
+
+    def _put(self, prefix: Tuple[int, ...], node: BIP32Node) -> None:
+        self.nodes[prefix] = node
+        self.nodes.move_to_end(prefix)
+        while len(self.nodes) > self.max_size:
+            self.nodes.popitem(last=False)
+
+
 class HDWallet(object):
     """Represents a hierarchical deterministic (HD) wallet
 
     Before the wallet can be used, its root private key must be
     reconstructed by unlocking a sufficient set of shards.
+
+    Derived nodes are cached while the wallet is unlocked so that
+    paths sharing a prefix are only derived once.  The cache is wiped
+    whenever the root private key changes, including on ``lock``.
+
+    Public keys are derived privately only down to the last hardened
+    index of a path.  The non-hardened remainder is derived publicly
+    from that node and kept in a separate cache of public nodes.
+
+    If the wallet has a ``public_key_cache``, the keys exported with
+    ``export_extended_public_key`` and ``export_public_key`` are
+    remembered in it by the xpub of their last hardened ancestor.
+    While the wallet is locked, ``extended_public_key`` and
+    ``public_key`` answer from that cache when they can, deriving any
+    non-hardened remainder publicly, instead of unlocking.  They never
+    write to the cache themselves.
+
+    Signers memoize the signatures they create in ``signature_memo``
+    while the wallet is unlocked, so that rescanning a request shows
+    the same signature again without re-signing.  The memo is wiped on
+    ``lock``.
     """
 
-    def __init__(self) -> None:
-        self.root_priv = None
+    #: Maximum number of derived nodes kept in memory while unlocked.
+    DERIVATION_CACHE_SIZE = 1024
+
+    def __init__(self,
+                 public_key_cache: Optional[PublicKeyCache] = None) -> None:
+        self.public_key_cache = public_key_cache
+        self.derivation_cache = DerivationCache(self.DERIVATION_CACHE_SIZE)
+        self.public_derivation_cache = DerivationCache(self.DERIVATION_CACHE_SIZE)
+        self.signature_memo: Dict[str, Dict] = {}
+        self.root_node = None
         self.shards = shards.ShardSet()
         self.language = "english"
 
+    @property
+    def root_node(self) -> Optional[BIP32Node]:
+        return self._root_node
+
+    @root_node.setter
+    def root_node(self, node: Optional[BIP32Node]) -> None:
+        self.derivation_cache.clear()
+        self.public_derivation_cache.clear()
+        self._root_node = node
+
+    @property
+    def root_priv(self) -> Optional[str]:
+        if self.root_node is None:
+            return None
+        return self.root_node.to_xprv()
+
+    @root_priv.setter
+    def root_priv(self, xprv: Optional[str]) -> None:
+        if xprv is None:
+            self.root_node = None
+        else:
+            self.root_node = BIP32Node.from_extended_key(xprv)
+
     def unlocked(self) -> bool:
-        return self.root_priv is not None
+        return self.root_node is not None
 
     def unlock(self, passphrase: str = "") -> None:
-        if self.root_priv is not None:
+        if self.root_node is not None:
             return
 
         mnemonic = Mnemonic(self.language)
@@ -76,25 +219,151 @@ class HDWallet(object):
         words = self.shards.wallet_words()
         if mnemonic.check(words):
             seed = Mnemonic.to_seed(words, passphrase=passphrase)
-            self.root_priv = bip32_master_key(seed)
+            self.root_node = BIP32Node.from_seed(seed)
         else:
             raise HermitError("Wallet words failed checksum.")
 
     def lock(self) -> None:
-        self.root_priv = None
+        self.signature_memo.clear()
+        self.root_node = None
+
+    def fingerprint(self) -> str:
+        """Return the hex fingerprint of the wallet's master key"""
+        return self._unlocked_root_node().identifier()[:4].hex()
 
     def extended_public_key(self, bip32_path: str) -> str:
-        self.unlock()
-        xprv = self.extended_private_key(bip32_path)
-        return bip32_privtopub(xprv)
+        return self._cached_or_public_node(bip32_sequence(bip32_path)).to_xpub()
 
     def public_key(self, bip32_path: str) -> str:
-        xpub = self.extended_public_key(bip32_path)
-        return bip32_extract_key(xpub)
+        return self._cached_or_public_node(bip32_sequence(bip32_path)).public_key.hex()
+
+    def export_extended_public_key(self, bip32_path: str) -> str:
+        """Return the xpub at a path, remembering it in the public key cache"""
+        return self._exported_node(bip32_sequence(bip32_path)).to_xpub()
+
+    def export_public_key(self, bip32_path: str) -> str:
+        """Return the public key at a path, remembering it in the public key cache"""
+        return self._exported_node(bip32_sequence(bip32_path)).public_key.hex()
+
+    def child_public_keys(self, bip32_path: str, indices: range) -> List[str]:
+        """Return the public keys of the given non-hardened children of a path
+
+        The node at `bip32_path` is derived once and each child is then
+        derived publicly from it.  The children are not cached.
+
+        Example:
+
+            wallet.child_public_keys("m/45'/0'/0'/0", range(1000))
+
+        """
+        parent = self._public_node(bip32_sequence(bip32_path))
+        return [child.public_key.hex()
+                for child in parent.public_children(indices)]
+
+    def derive_many(self,
+                    bip32_paths: Iterable[str],
+                    root_node: Optional[BIP32Node] = None) -> Dict[str, Dict]:
+        """Return the keys at each of the given BIP32 paths
+
+        The paths are sorted into derivation order so that every
+        distinct node of the tree they span is derived exactly once,
+        and each node's public key is computed only once.
+
+        If `root_node` is given, keys are derived from it instead of
+        from the wallet's root, which is never unlocked, and the nodes
+        derived are not kept in the wallet's derivation cache (so they
+        do not outlive a ``lock``).
+
+        The returned dictionary maps each path to a dictionary with
+        the following items:
+
+        * ``xprv`` -- the extended private key
+        * ``xpub`` -- the extended public key
+        * ``private_key`` -- the private key
+        * ``public_key`` -- the public key
+        """
+        if root_node is None:
+            root_node = self._unlocked_root_node()
+            derivation_cache = self.derivation_cache
+        else:
+            derivation_cache = DerivationCache(self.DERIVATION_CACHE_SIZE)
+        sequences = {bip32_path: bip32_sequence(bip32_path)
+                     for bip32_path in set(bip32_paths)}
+        keys = {}
+        for bip32_path in sorted(sequences, key=sequences.__getitem__):
+            node = derivation_cache.derive(root_node, sequences[bip32_path])
+            keys[bip32_path] = dict(
+                xprv=node.to_xprv(),
+                xpub=node.to_xpub(),
+                private_key=self._private_key(node).hex(),
+                public_key=node.public_key.hex())
+        return keys
 
     def extended_private_key(self, bip32_path: str) -> str:
+        return self._node(bip32_path).to_xprv()
+
+    def _node(self, bip32_path: str) -> BIP32Node:
+        return self.derivation_cache.derive(self._unlocked_root_node(),
+                                            bip32_sequence(bip32_path))
+
+    def _unlocked_root_node(self) -> BIP32Node:
         self.unlock()
-        xprv = self.root_priv
-        for child_id in bip32_sequence(bip32_path):
-            xprv = bip32_ckd(xprv, child_id)
-        return str(xprv)
+        root_node = self.root_node
+        if root_node is None:
+            raise HermitError("Wallet is locked.")
+        return root_node
+
+    @staticmethod
+    def _private_key(node: BIP32Node) -> bytes:
+        if node.private_key is None:
+            raise HermitError("Cannot export a private key from a public key.")
+        return node.private_key
+
+    def _cached_or_public_node(self, sequence: Tuple[int, ...]) -> BIP32Node:
+        if self.public_key_cache is not None and not self.unlocked():
+            cached = self._cached_public_node(self.public_key_cache, sequence)
+            if cached is not None:
+                return cached
+        return self._public_node(sequence)
+
+    def _exported_node(self, sequence: Tuple[int, ...]) -> BIP32Node:
+        node = self._cached_or_public_node(sequence)
+        if self.public_key_cache is None or not self.unlocked():
+            return node
+
+        # Only the last hardened ancestor is stored: everything below
+        # it can be derived publicly, so the cache stays one entry per
+        # account however many keys are exported from it.
+        offset = hardened_prefix_length(sequence)
+        account = self.derivation_cache.derive(self._unlocked_root_node(),
+                                               sequence[:offset])
+        self.public_key_cache.store(
+            self.shards.digest(),
+            self.fingerprint(),
+            {bip32_path_from_sequence(sequence[:offset]): account.to_xpub()})
+        return node
+
+    def _cached_public_node(self,
+                            public_key_cache: PublicKeyCache,
+                            sequence: Tuple[int, ...]) -> Optional[BIP32Node]:
+        xpubs = public_key_cache.xpubs(self.shards.digest())
+        offset = hardened_prefix_length(sequence)
+        for depth in range(len(sequence), offset - 1, -1):
+            xpub = xpubs.get(bip32_path_from_sequence(sequence[:depth]))
+            if xpub is not None:
+                node = BIP32Node.from_extended_key(xpub)
+                for index in sequence[depth:]:
+                    node = node.public_child(index)
+                return node
+        return None
+
+    def _public_node(self, sequence: Tuple[int, ...]) -> BIP32Node:
+        offset = hardened_prefix_length(sequence)
+        account = self.derivation_cache.derive(self._unlocked_root_node(),
+                                               sequence[:offset])
+        if offset == len(sequence):
+            return account
+        return self.public_derivation_cache.derive(account,
+                                                   sequence,
+                                                   offset=offset,
+                                                   public=True)
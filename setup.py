@@ -40,7 +40,8 @@ setuptools.setup(
         "Operating System :: OS Independent",
     ],
     scripts=[
-        'bin/hermit'
+        'bin/hermit',
+        'bin/hermit-sign',
     ],
     install_requires=install_requires,
     data_files=[
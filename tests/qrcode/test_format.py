@@ -46,3 +46,47 @@ class TestEncodeQRCodeData(object):
     def test_bytes(self):
         with pytest.raises(hermit.InvalidSignatureRequest):
             hermit.encode_qr_code_data(_DECODED.encode('utf-8'))
+
+
+@pytest.mark.qrcode
+class TestPSBTRoundTrip(object):
+
+    def test_psbt_is_carried_as_binary(self):
+        psbt = b'psbt\xff' + bytes(range(256))
+        encoded = hermit.encode_qr_code_data(base64.b64encode(psbt).decode('ascii'))
+        assert gzip.decompress(base64.b32decode(encoded)) == psbt
+        assert hermit.decode_qr_code_data(encoded) == base64.b64encode(psbt).decode('ascii')
+
+    def test_invalid_psbt_base64(self):
+        with pytest.raises(hermit.InvalidSignatureRequest):
+            hermit.encode_qr_code_data('cHNidP8!')
+
+
+@pytest.mark.qrcode
+class TestDecompressionLimit(object):
+
+    def test_within_limit(self):
+        encoded = hermit.encode_qr_code_data('a' * 1000)
+        assert hermit.decode_qr_code_data(encoded, max_size=1000) == 'a' * 1000
+
+    def test_over_limit(self):
+        encoded = hermit.encode_qr_code_data('a' * 1001)
+        with pytest.raises(hermit.InvalidSignatureRequest) as e_info:
+            hermit.decode_qr_code_data(encoded, max_size=1000)
+        assert str(e_info.value) == "Invalid signature request: Decompressed data is too large."
+
+    def test_decompression_bomb(self):
+        # About 100 KB, inflating to 100 MB
+        encoded = base64.b32encode(gzip.compress(b'\x00' * 100000000))
+        with pytest.raises(hermit.InvalidSignatureRequest):
+            hermit.decode_qr_code_data(encoded)
+
+    def test_truncated(self):
+        encoded = base64.b32encode(gzip.compress(_DECODED.encode('utf-8'))[:-12])
+        with pytest.raises(hermit.InvalidSignatureRequest) as e_info:
+            hermit.decode_qr_code_data(encoded)
+        assert str(e_info.value) == "Invalid signature request: Not gzipped."
+
+    def test_multiple_members(self):
+        encoded = base64.b32encode(gzip.compress(b'foo') + gzip.compress(b'bar'))
+        assert hermit.decode_qr_code_data(encoded) == _DECODED
@@ -0,0 +1,65 @@
+import os
+from unittest.mock import Mock, patch
+
+import pytest
+import shamir_mnemonic
+
+from hermit import shamir_share
+from hermit.errors import HermitError
+from hermit.shards import Shard
+from hermit.shards.planner import kdf_cost, unlock_plans
+
+
+def _family(group_threshold, groups, iteration_exponent=0):
+    with patch.object(shamir_mnemonic, 'RANDOM_BYTES', os.urandom):
+        mnemonic_groups = shamir_share.generate_mnemonics(
+            group_threshold, groups, b'\x00' * 32,
+            iteration_exponent=iteration_exponent)
+    return [Shard('{}{}'.format(group_index, member_index), mnemonic, Mock())
+            for (group_index, mnemonics) in enumerate(mnemonic_groups)
+            for (member_index, mnemonic) in enumerate(mnemonics)]
+
+
+class TestUnlockPlans(object):
+
+    def test_cheapest_plan_first(self):
+        shards = _family(2, [(1, 1), (2, 3), (3, 5)])
+        plans = unlock_plans(shards)
+        assert plans[0].names() == ['00', '10', '11']
+        assert plans[0].cost == 3 * kdf_cost(shards[0])
+        # 3 from groups 1 & 2, 10 from groups 1 & 3, 30 from groups 2 & 3
+        assert len(plans) == 43
+        assert [plan.cost for plan in plans] == sorted(plan.cost for plan in plans)
+        assert len(plans[-1].shards) == 5
+
+    def test_limit(self):
+        shards = _family(2, [(1, 1), (2, 3), (3, 5)])
+        plans = unlock_plans(shards, limit=2)
+        assert [plan.names() for plan in plans] == [['00', '10', '11'],
+                                                    ['00', '10', '12']]
+
+    def test_copies_are_alternatives(self):
+        shards = _family(1, [(2, 2)])
+        shards.append(Shard('copy', shards[0].encrypted_mnemonic, Mock()))
+        plans = unlock_plans(shards)
+        assert sorted(plan.names() for plan in plans) == [['00', '01'],
+                                                          ['copy', '01']]
+
+    def test_cost_follows_iteration_exponent(self):
+        cheap = _family(1, [(2, 2)])
+        expensive = _family(1, [(1, 1)], iteration_exponent=2)
+        plans = unlock_plans(expensive + cheap)
+        assert [len(plan.shards) for plan in plans] == [2, 1]
+        assert kdf_cost(expensive[0]) == 4 * kdf_cost(cheap[0])
+
+    def test_unsatisfiable_families_are_skipped(self):
+        incomplete = _family(1, [(2, 2)])[:1]
+        complete = _family(1, [(1, 1)])
+        plans = unlock_plans(incomplete + complete)
+        assert [plan.shards for plan in plans] == [complete]
+
+    def test_no_satisfiable_family_is_error(self):
+        shards = _family(2, [(1, 1), (2, 3)])
+        with pytest.raises(HermitError) as e_info:
+            unlock_plans([shards[0], shards[1]])
+        assert str(e_info.value) == "There are not enough shards available to unlock this secret."
@@ -1,6 +1,7 @@
 import unittest
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 
+from hermit import shamir_share
 from hermit.shards import Shard
 
 class TestShard(object):
@@ -90,3 +91,24 @@ class TestShard(object):
         shard = Shard('NAME', encrypted_mnemonic_1, self.interface)
         string_value = shard.to_str()
         assert string_value == 'NAME (family:5610 group:3 member:4)'
+
+    def test_header_is_decoded_once(self, encrypted_mnemonic_1):
+        with patch('hermit.shards.shard.shamir_share.decode_mnemonic',
+                   wraps=shamir_share.decode_mnemonic) as mock_decode:
+            shard = Shard('NAME', encrypted_mnemonic_1, self.interface)
+            assert shard.to_str() == 'NAME (family:5610 group:3 member:4)'
+            assert shard.share_id == 5610
+            assert shard.shard_id == (2, 3)
+            assert shard.to_str() == 'NAME (family:5610 group:3 member:4)'
+        assert mock_decode.call_count == 1
+
+    def test_shard_stores_packed_bytes(self, encrypted_mnemonic_1):
+        shard = Shard('foo', encrypted_mnemonic_1, self.interface)
+        assert not hasattr(shard, '__dict__')
+        assert shard.to_bytes() == shamir_share.mnemonic_to_bytes(encrypted_mnemonic_1)
+        assert shard.encrypted_mnemonic == encrypted_mnemonic_1
+
+    def test_empty_shard(self):
+        shard = Shard('foo', None, self.interface)
+        assert shard.encrypted_mnemonic is None
+        assert shard.to_bytes() is None
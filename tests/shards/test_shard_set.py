@@ -1,16 +1,21 @@
 import bson
+import os
+import pytest
 import unittest
 from unittest.mock import Mock, create_autospec, mock_open, call, patch
 
 import hermit
-from hermit.shards import ShardSet
+from hermit import shamir_share
+from hermit.shards import Shard, ShardSet, ThresholdTracker, check_satisfaction_criteria
 import shamir_mnemonic
 
 class TestShardSet(object):
 
     def setup(self):
         self.interface = Mock()
+        self.interface.choose_unlock_plan.return_value = None
         self.config = create_autospec(hermit.config.HermitConfig)
+        self.config.decryption_processes = 2
         config_patch = patch('hermit.shards.shard_set.HermitConfig.load', return_value=self.config)
 
         self.config_patch = config_patch.start()
@@ -199,6 +204,24 @@ class TestShardSet(object):
 
         assert self.rg.random.call_args_list == [call(2), call(28)]
 
+    def test_get_secret_seed_decrypting_in_process(self, zero_wallet_words, password_1, password_2):
+        self.config.decryption_processes = 1
+        self.interface.enter_wallet_words.return_value = zero_wallet_words
+        self.interface.confirm_password.side_effect = [password_1, password_2]
+        self.interface.get_password.side_effect = [password_1, password_2]
+        self.interface.get_name_for_shard.side_effect = ['one', 'two']
+        self.interface.choose_shard.side_effect = ['one', 'two']
+        self.interface.enter_group_information.return_value = [1,[(2,2)]]
+        shard_set = ShardSet(self.interface)
+        shard_set._shards_loaded = True
+
+        shard_set.create_share_from_wallet_words()
+
+        with patch('hermit.shards.shard_set.ProcessPoolExecutor') as mock_executor:
+            result_bytes = shard_set.secret_seed()
+            assert not mock_executor.called
+        assert result_bytes == b'\x00'*32
+
     def test_get_secret_seed_complicated_groups_with_wallet_words(self, zero_wallet_words, zero_bytes):
 
         # This is a somewhat complicated scenario.
@@ -250,6 +273,65 @@ class TestShardSet(object):
 
         assert self.rg.random.call_args_list == [call(2), call(28), call(28), call(32), call(28)]
 
+    def test_get_secret_seed_from_unlock_plan(self, zero_wallet_words, zero_bytes):
+        # Same shards as above, but unlocked with the cheapest plan: the
+        # 1 of 1 group and two shards of the 2 of 3 group.
+        self.interface.enter_wallet_words.return_value = zero_wallet_words
+
+        self.interface.confirm_password.side_effect = [b'0', b'1', b'2', b'3', b'4', b'5', b'6', b'7', b'8']
+        self.interface.get_name_for_shard.side_effect = ['0', '10', '11', '12', '20', '21', '22', '23', '24']
+        self.interface.choose_unlock_plan.side_effect = lambda plans: plans[0].names()
+        self.interface.get_password.side_effect = [b'0', b'1', b'2']
+        self.interface.enter_group_information.return_value = [2,[(1,1), (2,3), (3,5)]]
+
+        shard_set = ShardSet(self.interface)
+        shard_set._shards_loaded = True
+
+        shard_set.create_share_from_wallet_words()
+        result_bytes = shard_set.secret_seed()
+        assert result_bytes == zero_bytes
+
+        plans = self.interface.choose_unlock_plan.call_args[0][0]
+        assert len(plans) == ShardSet.UNLOCK_PLAN_LIMIT
+        assert self.interface.get_password.call_args_list == [
+            call(shard_set.shards[name].to_str()) for name in ['0', '10', '11']]
+        assert self.interface.choose_shard.call_count == 0
+
+    @pytest.mark.parametrize('manual', [True, False])
+    def test_single_shard_is_decrypted_in_process(self, zero_wallet_words, zero_bytes, manual):
+        self.interface.enter_wallet_words.return_value = zero_wallet_words
+        self.interface.confirm_password.side_effect = [b'0']
+        self.interface.get_name_for_shard.side_effect = ['only']
+        self.interface.enter_group_information.return_value = [1,[(1,1)]]
+        if manual:
+            self.interface.choose_shard.side_effect = ['only']
+        else:
+            self.interface.choose_unlock_plan.side_effect = lambda plans: plans[0].names()
+        self.interface.get_password.side_effect = [b'0']
+        shard_set = ShardSet(self.interface)
+        shard_set._shards_loaded = True
+        shard_set.create_share_from_wallet_words()
+
+        with patch('hermit.shards.shard_set.ProcessPoolExecutor') as mock_executor:
+            assert shard_set.secret_seed() == zero_bytes
+            assert not mock_executor.return_value.submit.called
+
+    def test_get_secret_seed_without_enough_shards(self, zero_wallet_words):
+        self.interface.enter_wallet_words.return_value = zero_wallet_words
+        self.interface.confirm_password.side_effect = [b'1', b'2']
+        self.interface.get_name_for_shard.side_effect = ['one', 'two']
+        self.interface.enter_group_information.return_value = [1,[(2,2)]]
+        shard_set = ShardSet(self.interface)
+        shard_set._shards_loaded = True
+        shard_set.create_share_from_wallet_words()
+        shard_set.delete_shard('two')
+
+        with pytest.raises(hermit.errors.HermitError) as e_info:
+            shard_set.secret_seed()
+        assert str(e_info.value) == "There are not enough shards available to unlock this secret."
+        assert self.interface.choose_unlock_plan.call_count == 0
+        assert self.interface.get_password.call_count == 0
+
     def test_enter_shard_words(self, encrypted_mnemonic_1):
         shard_set = ShardSet(interface=self.interface)
         shard_set._shards_loaded = True
@@ -261,3 +343,108 @@ class TestShardSet(object):
         assert self.interface.enter_shard_words.call_count == 1
         assert 'x' in shard_set.shards
         assert shard_set.shards['x'].encrypted_mnemonic == encrypted_mnemonic_1
+
+    def test_index_follows_changes(self, zero_wallet_words, password_1, password_2):
+        self.interface.enter_wallet_words.return_value = zero_wallet_words
+        self.interface.confirm_password.side_effect = [password_1, password_2]
+        self.interface.get_name_for_shard.side_effect = ['one', 'two']
+        self.interface.enter_group_information.return_value = [1,[(2,2)]]
+        self.interface.get_change_password.return_value = (password_1, password_1)
+        shard_set = ShardSet(self.interface)
+        shard_set._shards_loaded = True
+        shard_set.create_share_from_wallet_words()
+
+        share_id = shard_set.shards['one'].share_id
+        assert list(shard_set.index.families) == [share_id]
+        assert shard_set.index.group(share_id, 0) == [shard_set.shards['one'],
+                                                      shard_set.shards['two']]
+
+        shard_set.copy_shard('one', 'three')
+        assert [shard.name for shard in shard_set.index.member(share_id, 0, 0)] == ['one', 'three']
+
+        shard_set.delete_shard('one')
+        assert [shard.name for shard in shard_set.index.member(share_id, 0, 0)] == ['three']
+        assert len(shard_set.index) == 2
+
+        shard_set.clear_shards()
+        assert shard_set.index.families == {}
+
+    def test_list_shards_by_family(self, capsys):
+        shard_set = ShardSet(self.interface)
+        shard_set._shards_loaded = True
+        for (number, shard) in enumerate(_family(1, [(2, 2)]) + _family(1, [(1, 1)])):
+            shard.name = 'shard{}'.format(number)
+            shard_set._add_shard(shard)
+        shard_set.list_shards()
+
+        lines = capsys.readouterr().out.splitlines()
+        families = sorted(shard_set.index.families)
+        family_lines = [line for line in lines if line.startswith('Family')]
+        assert family_lines == ["Family {}:".format(share_id) for share_id in families]
+        assert len(lines) == 5
+
+
+def _family(group_threshold, groups):
+    with patch.object(shamir_mnemonic, 'RANDOM_BYTES', os.urandom):
+        mnemonic_groups = shamir_share.generate_mnemonics(
+            group_threshold, groups, b'\x00' * 32)
+    return [Shard('{}{}'.format(group_index, member_index), mnemonic, Mock())
+            for (group_index, mnemonics) in enumerate(mnemonic_groups)
+            for (member_index, mnemonic) in enumerate(mnemonics)]
+
+
+class TestThresholdTracker(object):
+
+    def test_satisfied(self):
+        shards = _family(2, [(1, 1), (2, 3), (3, 5)])
+        tracker = ThresholdTracker(shards)
+        assert tracker.satisfiable()
+        assert not tracker.satisfied()
+
+        tracker.add(shards[0])
+        assert tracker.filled == {0}
+        tracker.add(shards[1])
+        assert not tracker.satisfied()
+        assert len(tracker.unfilled_candidates()) == 2 + 5
+        tracker.add(shards[2])
+        assert tracker.filled == {0, 1}
+        assert tracker.satisfied()
+
+    def test_remove(self):
+        shards = _family(1, [(2, 2)])
+        tracker = ThresholdTracker(shards)
+        tracker.add(shards[0])
+        tracker.add(shards[1])
+        assert tracker.satisfied()
+        tracker.remove(shards[1])
+        assert not tracker.satisfied()
+        assert tracker.unfilled_candidates() == [shards[1]]
+
+    def test_copies_count_once(self):
+        shards = _family(1, [(2, 3)])
+        copy = Shard('copy', shards[0].encrypted_mnemonic, Mock())
+        tracker = ThresholdTracker(shards + [copy])
+        tracker.add(shards[0])
+        tracker.add(copy)
+        assert not tracker.satisfied()
+        assert copy not in tracker.unfilled_candidates()
+
+    def test_discard(self):
+        shards = _family(2, [(1, 1), (2, 3), (3, 5)])
+        tracker = ThresholdTracker(shards)
+        tracker.discard(shards[0])
+        assert tracker.satisfiable()
+        tracker.discard(shards[1])
+        tracker.discard(shards[2])
+        assert not tracker.satisfiable()
+
+    def test_check_satisfaction_criteria(self):
+        shards = _family(2, [(1, 1), (2, 3), (3, 5)])
+        assert check_satisfaction_criteria(shards[:2]) == (False, {0})
+        assert check_satisfaction_criteria(shards[:3]) == (True, {0, 1})
+
+    def test_no_shards_are_not_satisfied(self):
+        tracker = ThresholdTracker([])
+        assert not tracker.satisfied()
+        assert not tracker.satisfiable()
+        assert check_satisfaction_criteria([]) == (False, set())
@@ -1,6 +1,8 @@
 from prompt_toolkit import prompt, PromptSession, HTML, print_formatted_text
 from unittest.mock import patch, create_autospec
 import json
+import threading
+import time
 import pytest
 
 import hermit
@@ -197,3 +199,84 @@ class TestSigner(object):
 
 
         
+
+    def test_precomputation_is_available_after_confirmation(self,
+                                                            mock_input,
+                                                            mock_display_qr_code,
+                                                            mock_request):
+        class PrecomputingSigner(Signer):
+            def precompute(self):
+                return 'precomputed'
+
+            def create_signature(self):
+                self.signature = {'precomputed': self._precomputed()}
+
+        mock_input.return_value = 'y'
+        mock_request.return_value = json.dumps(self.request)
+        signer = PrecomputingSigner(self.wallet)
+        signer.sign(testnet=True)
+        assert signer.signature == {'precomputed': 'precomputed'}
+        # Only returned once
+        assert signer._precomputed() is None
+
+    def test_precomputation_runs_while_confirming(self,
+                                                  mock_input,
+                                                  mock_display_qr_code,
+                                                  mock_request):
+        started = threading.Event()
+
+        class PrecomputingSigner(Signer):
+            def precompute(self):
+                started.set()
+
+        def confirm(prompt):
+            assert started.wait(5)
+            return 'y'
+
+        mock_input.side_effect = confirm
+        mock_request.return_value = json.dumps(self.request)
+        PrecomputingSigner(self.wallet).sign(testnet=True)
+
+    def test_declining_discards_precomputation(self,
+                                               mock_input,
+                                               mock_display_qr_code,
+                                               mock_request):
+        release = threading.Event()
+        discarded = []
+
+        class PrecomputingSigner(Signer):
+            def precompute(self):
+                release.wait(5)
+                discarded.append(self.precomputation_discarded())
+                return 'precomputed'
+
+        mock_input.return_value = 'N'
+        mock_request.return_value = json.dumps(self.request)
+        signer = PrecomputingSigner(self.wallet)
+        signer.sign(testnet=True)
+        assert signer.precomputation_discarded()
+        assert signer._precomputed() is None
+        release.set()
+        for _ in range(500):
+            if discarded:
+                break
+            time.sleep(0.01)
+        assert discarded == [True]
+        assert signer.signature is None
+
+    def test_failed_precomputation_is_ignored(self,
+                                              mock_input,
+                                              mock_display_qr_code,
+                                              mock_request):
+        class PrecomputingSigner(Signer):
+            def precompute(self):
+                raise ValueError("failed")
+
+            def create_signature(self):
+                self.signature = {'precomputed': self._precomputed()}
+
+        mock_input.return_value = 'y'
+        mock_request.return_value = json.dumps(self.request)
+        signer = PrecomputingSigner(self.wallet)
+        signer.sign(testnet=True)
+        assert signer.signature == {'precomputed': None}
@@ -1,16 +1,24 @@
 import json
+import threading
+from hashlib import sha256
 from unittest.mock import patch, create_autospec
 
+import bitcoin
+from bitcoin.core.script import (SignatureHash,
+                                 SIGHASH_ALL,
+                                 SIGVERSION_WITNESS_V0)
+import ecdsa
 import pytest
 
 import hermit
+from hermit import secp256k1
 from hermit.signer import BitcoinSigner
+from hermit.signer.bitcoin_signer import generate_multisig_address
 from hermit.wallet import HDWallet
 
 # TODO: mainnet test
 # TODO: more test vectors - use bitcoin_multisig tests
 # TODO: multi-input test
-# TODO: generate_multisig_address tests
 
 
 class FakeShards:
@@ -413,6 +421,37 @@ class TestBitcoinSignerValidation(object):
                     + "invalid input index.")
         assert str(e_info.value) == expected
 
+    def test_request_input_limit(self, mock_request):
+        mock_request.return_value = json.dumps(self.request)
+        with pytest.raises(hermit.errors.InvalidSignatureRequest) as e_info:
+            BitcoinSigner(self.wallet,
+                          request_limits={'max_request_inputs': 2}).sign(testnet=True)
+
+        expected = ("Invalid signature request: "
+                    + "too many inputs.")
+        assert str(e_info.value) == expected
+        assert mock_request.call_args[1] == {'max_size': 1048576}
+
+    def test_input_index_must_fit_outpoint(self, mock_request):
+        self.request['inputs'][0][2]['index'] = 2**32
+        mock_request.return_value = json.dumps(self.request)
+        with pytest.raises(hermit.errors.InvalidSignatureRequest) as e_info:
+            BitcoinSigner(self.wallet).sign(testnet=True)
+
+        expected = ("Invalid signature request: "
+                    + "invalid input index.")
+        assert str(e_info.value) == expected
+
+    def test_input_amount_cannot_exceed_money_supply(self, mock_request):
+        self.request['inputs'][0][2]['amount'] = 21000000 * 10**8 + 1
+        mock_request.return_value = json.dumps(self.request)
+        with pytest.raises(hermit.errors.InvalidSignatureRequest) as e_info:
+            BitcoinSigner(self.wallet).sign(testnet=True)
+
+        expected = ("Invalid signature request: "
+                    + "invalid input amount.")
+        assert str(e_info.value) == expected
+
     #
     # Outputs
     #
@@ -709,3 +748,320 @@ class TestBitcoinSignerValidation(object):
 
 
         
+
+
+class TestGenerateMultisigAddress(object):
+
+    # The BIP173 P2WSH test vector: a 1-of-1 checksig witness script
+    witness_script = "210279be667ef9dcbbac55a06295ce870b07029bfcdb2dce28d959f2815b16f81798ac"
+
+    def test_p2wsh_address(self):
+        assert (generate_multisig_address(self.witness_script, True, 'p2wsh')
+                == "tb1qrp33g0q5c5txsp9arysrx4k6zdkfs4nce4xj0gdcccefvpysxf3q0sl5k7")
+        bitcoin.SelectParams('mainnet')
+        assert (generate_multisig_address(self.witness_script, False, 'p2wsh')
+                == "bc1qrp33g0q5c5txsp9arysrx4k6zdkfs4nce4xj0gdcccefvpysxf3qccfmv3")
+
+    def test_p2sh_p2wsh_address(self):
+        bitcoin.SelectParams('mainnet')
+        witness_program = "0020" + sha256(bytes.fromhex(self.witness_script)).hexdigest()
+        assert (generate_multisig_address(self.witness_script, False, 'p2sh-p2wsh')
+                == generate_multisig_address(witness_program, False, 'p2sh'))
+
+
+@patch('hermit.signer.displayer.display_qr_code')
+@patch('hermit.signer.base.input')
+@patch('hermit.signer.reader.read_qr_code')
+class TestBitcoinSignerSegwit(object):
+
+    @pytest.fixture(autouse=True)
+    def setup_wallet_and_request(self,
+                                 fixture_opensource_bitcoin_vector,
+                                 opensource_wallet_words):
+        self.wallet = HDWallet()
+        self.wallet.shards = FakeShards(opensource_wallet_words)
+        self.request = fixture_opensource_bitcoin_vector['request']
+
+    def _signatures(self, mock_display_qr_code):
+        return json.loads(mock_display_qr_code.call_args[0][0])['signatures']
+
+    @pytest.mark.parametrize('script_type', ['p2wsh', 'p2sh-p2wsh'])
+    def test_signs_bip143_signature_hashes(self,
+                                           mock_request,
+                                           mock_input,
+                                           mock_display_qr_code,
+                                           script_type):
+        for input_group in self.request['inputs']:
+            input_group.insert(0, script_type)
+        mock_request.return_value = json.dumps(self.request)
+        mock_input.return_value = 'y'
+
+        signer = BitcoinSigner(self.wallet)
+        signer.sign(testnet=True)
+
+        tx = signer._transaction()
+        signatures = self._signatures(mock_display_qr_code)
+        assert len(signatures) == len(signer.compiled)
+        for input_index in range(len(signer.compiled)):
+            group = signer.compiled.group(input_index)
+            assert group.script_type == script_type
+            assert group.address == generate_multisig_address(
+                group.script.hex(), True, script_type)
+            sighash = SignatureHash(group.script,
+                                    tx, input_index, SIGHASH_ALL,
+                                    amount=signer.compiled.amounts[input_index],
+                                    sigversion=SIGVERSION_WITNESS_V0)
+            public_key = bytes.fromhex(self.wallet.public_key(group.bip32_path))
+            (r, s) = ecdsa.util.sigdecode_der(bytes.fromhex(signatures[input_index]),
+                                              secp256k1.N)
+            assert secp256k1.verify_digest(secp256k1.decompress(public_key),
+                                           sighash, r, s)
+
+    def test_witness_script_size_is_limited(self,
+                                            mock_request,
+                                            mock_input,
+                                            mock_display_qr_code):
+        self.request['inputs'][0][0] = "51" * 3601
+        self.request['inputs'][0].insert(0, 'p2wsh')
+        mock_request.return_value = json.dumps(self.request)
+
+        with pytest.raises(hermit.errors.InvalidSignatureRequest) as e_info:
+            BitcoinSigner(self.wallet).sign(testnet=True)
+
+        assert str(e_info.value) == "Invalid signature request: witness script is too large."
+
+
+@patch('hermit.signer.displayer.display_qr_code')
+@patch('hermit.signer.base.input')
+@patch('hermit.signer.reader.read_qr_code')
+class TestBitcoinSignerPrecomputation(object):
+
+    @pytest.fixture(autouse=True)
+    def setup_wallet_and_request(self,
+                                 fixture_opensource_bitcoin_vector,
+                                 opensource_wallet_words):
+        self.wallet = HDWallet()
+        self.wallet.shards = FakeShards(opensource_wallet_words)
+        self.vector = fixture_opensource_bitcoin_vector
+
+    def _confirm_after_precomputation(self, signer, precomputed, answer):
+        def confirm(prompt):
+            precomputed.append(signer._precomputation.result())
+            return answer
+        return confirm
+
+    def test_precomputes_keys_when_unlocked(self,
+                                            mock_request,
+                                            mock_input,
+                                            mock_display_qr_code):
+        self.wallet.unlock()
+        mock_request.return_value = json.dumps(self.vector['request'])
+        signer = BitcoinSigner(self.wallet)
+        precomputed = []
+        mock_input.side_effect = self._confirm_after_precomputation(
+            signer, precomputed, 'y')
+
+        with patch.object(signer, '_keys', wraps=signer._keys) as mock_keys:
+            signer.sign(testnet=True)
+            # Only derived in the background
+            assert not mock_keys.called
+
+        assert set(precomputed[0]) == {'keys', 'root_node', 'signature_hashes'}
+        assert len(precomputed[0]['signature_hashes']) == len(signer.compiled)
+        mock_display_qr_code.assert_called_once_with(
+            json.dumps(self.vector['expected_signature']), name='Signature')
+
+    def test_does_not_unlock_to_precompute(self,
+                                           mock_request,
+                                           mock_input,
+                                           mock_display_qr_code):
+        mock_request.return_value = json.dumps(self.vector['request'])
+        signer = BitcoinSigner(self.wallet)
+        precomputed = []
+        mock_input.side_effect = self._confirm_after_precomputation(
+            signer, precomputed, 'y')
+
+        signer.sign(testnet=True)
+
+        assert set(precomputed[0]) == {'signature_hashes'}
+        mock_display_qr_code.assert_called_once_with(
+            json.dumps(self.vector['expected_signature']), name='Signature')
+
+    def test_declining_signs_nothing(self,
+                                     mock_request,
+                                     mock_input,
+                                     mock_display_qr_code):
+        self.wallet.unlock()
+        mock_request.return_value = json.dumps(self.vector['request'])
+        signer = BitcoinSigner(self.wallet)
+        precomputed = []
+        mock_input.side_effect = self._confirm_after_precomputation(
+            signer, precomputed, 'n')
+
+        with patch('hermit.signer.bitcoin_signer._sign_digests') as mock_sign:
+            signer.sign(testnet=True)
+            assert not mock_sign.called
+
+        assert signer.signature is None
+        assert signer._precomputed() is None
+        assert not mock_display_qr_code.called
+
+    def test_declining_stops_key_derivation(self,
+                                            mock_request,
+                                            mock_input,
+                                            mock_display_qr_code):
+        self.wallet.unlock()
+        request = self.vector['request']
+        second_group = list(request['inputs'][0][:1]) + [
+            "m/45'/1'/500'/200/27",
+            {"txid": "aa" * 32, "index": 0, "amount": 1000}]
+        request['inputs'].append(second_group)
+        mock_request.return_value = json.dumps(request)
+        signer = BitcoinSigner(self.wallet)
+
+        deriving = threading.Event()
+        derived_paths = []
+
+        def derive(bip32_paths, root_node=None):
+            derived_paths.extend(bip32_paths)
+            deriving.set()
+            signer._precomputation_discarded.wait(timeout=10)
+            return {}
+
+        def decline(prompt):
+            deriving.wait(timeout=10)
+            return 'n'
+
+        mock_input.side_effect = decline
+        with patch.object(self.wallet, 'derive_many', side_effect=derive):
+            signer.sign(testnet=True)
+            # Precomputation has stopped by the time signing returns
+            assert derived_paths == ["m/45'/1'/500'/200/26"]
+
+        assert signer.signature is None
+        assert not mock_display_qr_code.called
+
+    def test_locking_while_confirming_discards_precomputed_keys(self,
+                                                               mock_request,
+                                                               mock_input,
+                                                               mock_display_qr_code):
+        self.wallet.unlock()
+        mock_request.return_value = json.dumps(self.vector['request'])
+        signer = BitcoinSigner(self.wallet)
+        precomputed = []
+
+        def confirm_after_relock(prompt):
+            precomputed.append(signer._precomputation.result())
+            self.wallet.lock()
+            return 'y'
+
+        mock_input.side_effect = confirm_after_relock
+        with patch.object(signer, '_keys', wraps=signer._keys) as mock_keys:
+            signer.sign(testnet=True)
+            assert mock_keys.called
+
+        # Signing unlocked the wallet again rather than using keys
+        # precomputed before the lock
+        assert 'keys' in precomputed[0]
+        assert self.wallet.root_node is not precomputed[0]['root_node']
+        mock_display_qr_code.assert_called_once_with(
+            json.dumps(self.vector['expected_signature']), name='Signature')
+
+    def test_locking_stops_key_derivation_without_unlocking(self,
+                                                            mock_request,
+                                                            mock_input,
+                                                            mock_display_qr_code):
+        self.wallet.unlock()
+        request = self.vector['request']
+        second_group = list(request['inputs'][0][:1]) + [
+            "m/45'/1'/500'/200/27",
+            {"txid": "aa" * 32, "index": 0, "amount": 1000}]
+        request['inputs'].append(second_group)
+        mock_request.return_value = json.dumps(request)
+        signer = BitcoinSigner(self.wallet)
+        derive_many = self.wallet.derive_many
+        derived_paths = []
+
+        def derive_then_lock(bip32_paths, root_node=None):
+            keys = derive_many(bip32_paths, root_node=root_node)
+            derived_paths.extend(bip32_paths)
+            self.wallet.lock()
+            return keys
+
+        def decline(prompt):
+            signer._precomputation.result()
+            return 'n'
+
+        mock_input.side_effect = decline
+        with patch.object(self.wallet, 'derive_many', side_effect=derive_then_lock):
+            signer.sign(testnet=True)
+
+        assert derived_paths == ["m/45'/1'/500'/200/26"]
+        # Nothing unlocked the wallet again or cached keys after the lock
+        assert not self.wallet.unlocked()
+        assert len(self.wallet.derivation_cache) == 0
+
+
+@patch('hermit.signer.displayer.display_qr_code')
+@patch('hermit.signer.base.input')
+@patch('hermit.signer.reader.read_qr_code')
+class TestBitcoinSignerSignatureMemo(object):
+
+    @pytest.fixture(autouse=True)
+    def setup_wallet_and_request(self,
+                                 fixture_opensource_bitcoin_vector,
+                                 opensource_wallet_words):
+        self.wallet = HDWallet()
+        self.wallet.shards = FakeShards(opensource_wallet_words)
+        self.wallet.unlock()
+        self.vector = fixture_opensource_bitcoin_vector
+
+    def test_rescanned_request_is_not_signed_again(self,
+                                                   mock_request,
+                                                   mock_input,
+                                                   mock_display_qr_code):
+        mock_request.return_value = json.dumps(self.vector['request'])
+        mock_input.return_value = 'y'
+        BitcoinSigner(self.wallet).sign(testnet=True)
+
+        # Same request, differently encoded
+        mock_request.return_value = json.dumps(self.vector['request'], indent=2)
+        with patch('hermit.signer.bitcoin_signer._sign_digests') as mock_sign:
+            BitcoinSigner(self.wallet).sign(testnet=True)
+            assert not mock_sign.called
+
+        assert mock_input.call_count == 1
+        expected = json.dumps(self.vector['expected_signature'])
+        assert mock_display_qr_code.call_count == 2
+        mock_display_qr_code.assert_called_with(expected, name='Signature')
+
+    def test_declined_request_is_not_memoized(self,
+                                              mock_request,
+                                              mock_input,
+                                              mock_display_qr_code):
+        mock_request.return_value = json.dumps(self.vector['request'])
+        mock_input.return_value = 'n'
+        BitcoinSigner(self.wallet).sign(testnet=True)
+        assert self.wallet.signature_memo == {}
+
+    def test_memo_is_per_network(self,
+                                 mock_request,
+                                 mock_input,
+                                 mock_display_qr_code):
+        mock_request.return_value = json.dumps(self.vector['request'])
+        mock_input.return_value = 'y'
+        signer = BitcoinSigner(self.wallet)
+        signer.sign(testnet=True)
+        signer.testnet = False
+        assert signer._memoized_signature() is None
+
+    def test_lock_clears_memo(self,
+                              mock_request,
+                              mock_input,
+                              mock_display_qr_code):
+        mock_request.return_value = json.dumps(self.vector['request'])
+        mock_input.return_value = 'y'
+        BitcoinSigner(self.wallet).sign(testnet=True)
+        self.wallet.lock()
+        BitcoinSigner(self.wallet).sign(testnet=True)
+        assert mock_input.call_count == 2
@@ -0,0 +1,171 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import bitcoin
+from bitcoin.core.script import CScript
+from bitcoin.wallet import CBitcoinAddress, P2SHBitcoinAddress
+import pytest
+
+import hermit
+from hermit.signer import BitcoinSigner
+from hermit.signer.network import MAINNET, TESTNET, LookupCache, Network, network
+from hermit.wallet import HDWallet
+
+
+ADDRESSES = {
+    'mainnet': [
+        '1Ma2DrB78K7jmAwaomqZNRMCvgQrNjE2QC',
+        '3J98t1WpEZ73CNmQviecrnyiWrnqRhWNLy',
+        'bc1qw508d6qejxtdg4y5r3zarvary0c5xw7kv8f3t4',
+        'bc1qrp33g0q5c5txsp9arysrx4k6zdkfs4nce4xj0gdcccefvpysxf3qccfmv3',
+    ],
+    'testnet': [
+        '2NCcmVAirNBDTQYvecdDpKNJVdKJruwdUSZ',
+        'mipcBbFg9gMiCh81Kj8tqqdgoZub1ZJRfn',
+        'tb1q0vv0vsa4ey69h4zgedd88ldd3fhz366u99tnch',
+        'tb1qacn2sc90qe4f723rqjwr2kf9z004xl6ftzp0nprq9cnland8udqqzxt0tg',
+    ],
+}
+
+
+@pytest.fixture(autouse=True)
+def restore_params():
+    yield
+    bitcoin.SelectParams('mainnet')
+
+
+class TestNetwork(object):
+
+    def test_network(self):
+        assert network(True) is TESTNET
+        assert network(False) is MAINNET
+        assert network() is MAINNET
+
+    @pytest.mark.parametrize('name', ['mainnet', 'testnet'])
+    def test_matches_python_bitcoinlib(self, name):
+        bitcoin.SelectParams(name)
+        for address in ADDRESSES[name]:
+            script_pubkey = CBitcoinAddress(address).to_scriptPubKey()
+            assert network(name == 'testnet').script_pubkey(address) == script_pubkey
+            assert network(name == 'testnet').address(script_pubkey) == address
+
+    def test_rejects_other_networks(self):
+        for address in ADDRESSES['testnet']:
+            with pytest.raises(hermit.errors.InvalidSignatureRequest):
+                MAINNET.script_pubkey(address)
+        for address in ADDRESSES['mainnet']:
+            with pytest.raises(hermit.errors.InvalidSignatureRequest):
+                TESTNET.script_pubkey(address)
+
+    def test_address_requires_standard_script(self):
+        with pytest.raises(ValueError):
+            MAINNET.address(CScript([1, 2, 3]))
+
+    def test_multisig_address(self, fixture_opensource_bitcoin_vector):
+        redeem_script = bytes.fromhex(
+            fixture_opensource_bitcoin_vector['request']['inputs'][0][0])
+        bitcoin.SelectParams('testnet')
+        assert (TESTNET.multisig_address(redeem_script)
+                == str(P2SHBitcoinAddress.from_redeemScript(CScript(redeem_script))))
+
+    def test_does_not_select_params(self):
+        params = bitcoin.params
+        TESTNET.script_pubkey(ADDRESSES['testnet'][0])
+        TESTNET.multisig_address(b'\x51')
+        assert bitcoin.params is params
+
+
+class TestLookupCache(object):
+
+    def test_counts_hits_and_misses(self):
+        cache = LookupCache()
+        assert cache.hit_rate() == 0.0
+        assert cache.get('a', lambda: 1) == 1
+        assert cache.get('a', lambda: 2) == 1
+        assert cache.get('b', lambda: 3) == 3
+        assert (cache.hits, cache.misses) == (1, 2)
+        assert cache.hit_rate() == 1 / 3
+
+    def test_evicts_least_recently_used(self):
+        cache = LookupCache(max_size=2)
+        cache.get('a', lambda: 1)
+        cache.get('b', lambda: 2)
+        cache.get('a', lambda: 1)
+        cache.get('c', lambda: 3)
+        assert len(cache) == 2
+        assert list(cache.values) == ['a', 'c']
+
+    def test_errors_are_not_cached(self):
+        cache = LookupCache()
+
+        def fail():
+            raise ValueError("no")
+
+        with pytest.raises(ValueError):
+            cache.get('a', fail)
+        assert len(cache) == 0
+        assert cache.get('a', lambda: 1) == 1
+
+    def test_clear(self):
+        cache = LookupCache()
+        cache.get('a', lambda: 1)
+        cache.get('a', lambda: 1)
+        cache.clear()
+        assert (len(cache), cache.hits, cache.misses) == (0, 0, 0)
+
+
+class TestNetworkCaches(object):
+
+    def test_caches_are_per_network(self):
+        testnet = Network('testnet', 111, 196, 'tb', cache_size=8)
+        mainnet = Network('mainnet', 0, 5, 'bc', cache_size=8)
+        script = b'\x51'
+        assert testnet.multisig_address(script) != mainnet.multisig_address(script)
+        assert testnet.multisig_address(script) == testnet.multisig_address(script)
+        assert (testnet.address_cache.hits, testnet.address_cache.misses) == (2, 1)
+        assert (mainnet.address_cache.hits, mainnet.address_cache.misses) == (0, 1)
+
+    def test_script_types_are_cached_separately(self):
+        testnet = Network('testnet', 111, 196, 'tb')
+        script = b'\x51'
+        addresses = {testnet.multisig_address(script, script_type)
+                     for script_type in ('p2sh', 'p2wsh', 'p2sh-p2wsh')}
+        assert len(addresses) == 3
+
+    def test_repeated_outputs_hit_the_cache(self, fixture_opensource_bitcoin_vector):
+        request = fixture_opensource_bitcoin_vector['request']
+        request['outputs'] = [dict(output, amount=1000)
+                              for output in request['outputs'] * 50]
+        signer = BitcoinSigner(HDWallet())
+        signer.request = request
+        signer.testnet = True
+        misses = TESTNET.script_pubkey_cache.misses
+        signer.validate_request()
+        assert TESTNET.script_pubkey_cache.misses - misses <= 2
+
+
+class TestSignerNetworks(object):
+
+    def _validated_signer(self, request, testnet):
+        signer = BitcoinSigner(HDWallet())
+        signer.request = request
+        signer.testnet = testnet
+        signer.validate_request()
+        return signer
+
+    def test_validates_both_networks_concurrently(self, fixture_opensource_bitcoin_vector):
+        params = bitcoin.params
+        testnet_request = fixture_opensource_bitcoin_vector['request']
+        mainnet_request = json.loads(json.dumps(testnet_request))
+        mainnet_request['outputs'][0]['address'] = ADDRESSES['mainnet'][0]
+        mainnet_request['outputs'][1]['address'] = ADDRESSES['mainnet'][1]
+
+        jobs = [(testnet_request, True), (mainnet_request, False)] * 20
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            signers = list(executor.map(lambda job: self._validated_signer(*job), jobs))
+
+        for (signer, (request, testnet)) in zip(signers, jobs):
+            assert signer.compiled.output_addresses == [output['address']
+                                                        for output in request['outputs']]
+            assert signer.compiled.groups[0].address[0] == ('2' if testnet else '3')
+        assert bitcoin.params is params
@@ -0,0 +1,315 @@
+from base64 import b64encode
+from hashlib import sha256
+from unittest.mock import patch
+
+import bitcoin
+from bitcoin.core import (COutPoint,
+                          CMutableTxIn,
+                          CMutableTxOut,
+                          CTransaction,
+                          lx)
+from bitcoin.core.script import CScript, SignatureHash, SIGHASH_ALL
+from bitcoin.core.serialize import VarIntSerializer
+from bitcoin.wallet import CBitcoinAddress
+import ecdsa
+import pytest
+
+import hermit
+from hermit import secp256k1
+from hermit.signer import BitcoinSigner
+from hermit.signer.psbt import PSBT, PSBT_MAGIC, _read_map
+from hermit.wallet import HDWallet, bip32_sequence
+
+
+class FakeShards:
+    def __init__(self, words):
+        self.words = words
+
+    def wallet_words(self):
+        return self.words
+
+
+def _pair(key_type, key_data, value):
+    key = bytes([key_type]) + key_data
+    return (VarIntSerializer.serialize(len(key)) + key
+            + VarIntSerializer.serialize(len(value)) + value)
+
+
+def _psbt(tx, input_maps, output_count):
+    return (PSBT_MAGIC
+            + _pair(0x00, b'', tx.serialize()) + b'\x00'
+            + b''.join(b''.join(_pair(*pair) for pair in pairs) + b'\x00'
+                       for pairs in input_maps)
+            + b'\x00' * output_count)
+
+
+def _partial_signatures(data):
+    psbt = PSBT.parse(data)
+    view = memoryview(data)
+    offset = len(PSBT_MAGIC)
+    for (_, _, _, offset) in _read_map(view, offset):
+        pass
+    signatures = []
+    for _ in psbt.inputs:
+        input_signatures = {}
+        for (key_type, key_data, value, offset) in _read_map(view, offset):
+            if key_type == 0x02:
+                input_signatures[bytes(key_data)] = bytes(value)
+        signatures.append(input_signatures)
+    return signatures
+
+
+@patch('hermit.signer.displayer.display_qr_code')
+@patch('hermit.signer.base.input')
+@patch('hermit.signer.reader.read_qr_code')
+class TestBitcoinSignerPSBT(object):
+
+    @pytest.fixture(autouse=True)
+    def setup_wallet_and_psbt(self,
+                              fixture_opensource_bitcoin_vector,
+                              opensource_wallet_words):
+        bitcoin.SelectParams('testnet')
+        self.wallet = HDWallet()
+        self.wallet.shards = FakeShards(opensource_wallet_words)
+        request = fixture_opensource_bitcoin_vector['request']
+        (redeem_script, bip32_path) = request['inputs'][0][:2]
+        self.redeem_script = bytes.fromhex(redeem_script)
+        self.bip32_path = bip32_path
+        self.public_key = bytes.fromhex(self.wallet.public_key(bip32_path))
+        fingerprint = bytes.fromhex(self.wallet.fingerprint())
+        self.derivation = fingerprint + b''.join(
+            index.to_bytes(4, 'little') for index in bip32_sequence(bip32_path))
+
+        script_pubkey = CScript([bitcoin.core.script.OP_HASH160,
+                                 bitcoin.core.Hash160(self.redeem_script),
+                                 bitcoin.core.script.OP_EQUAL])
+        self.amounts = [input['amount'] for input in request['inputs'][0][2:]]
+        self.utxos = [CTransaction([CMutableTxIn(COutPoint(lx(input['txid']),
+                                                           input['index']))],
+                                   [CMutableTxOut(amount, script_pubkey)])
+                      for (input, amount) in zip(request['inputs'][0][2:],
+                                                 self.amounts)]
+        self.tx = CTransaction(
+            [CMutableTxIn(COutPoint(utxo.GetTxid(), 0)) for utxo in self.utxos],
+            [CMutableTxOut(output['amount'],
+                           CBitcoinAddress(output['address']).to_scriptPubKey())
+             for output in request['outputs']])
+
+    def _input_maps(self):
+        return [[(0x00, b'', utxo.serialize()),
+                 (0x04, b'', self.redeem_script),
+                 (0x06, self.public_key, self.derivation)]
+                for utxo in self.utxos]
+
+    def _sign(self, data, mock_request, mock_input):
+        mock_request.return_value = b64encode(data).decode('ascii')
+        mock_input.return_value = 'y'
+        signer = BitcoinSigner(self.wallet)
+        signer.sign(testnet=True)
+        return signer
+
+    def test_signs_p2sh_inputs(self,
+                               mock_request,
+                               mock_input,
+                               mock_display_qr_code):
+        data = _psbt(self.tx, self._input_maps(), len(self.tx.vout))
+        self._sign(data, mock_request, mock_input)
+
+        signed = mock_display_qr_code.call_args[0][0]
+        assert signed.startswith('cHNidP8')
+        signed_data = bytes(PSBT.from_base64(signed).data)
+        signatures = _partial_signatures(signed_data)
+        assert len(signatures) == len(self.tx.vin)
+        point = secp256k1.decompress(self.public_key)
+        for (input_index, input_signatures) in enumerate(signatures):
+            signature = input_signatures[self.public_key]
+            assert signature[-1] == SIGHASH_ALL
+            sighash = SignatureHash(CScript(self.redeem_script),
+                                    self.tx, input_index, SIGHASH_ALL)
+            (r, s) = ecdsa.util.sigdecode_der(signature[:-1], secp256k1.N)
+            assert secp256k1.verify_digest(point, sighash, r, s)
+
+    def test_signed_psbt_keeps_original_fields(self,
+                                               mock_request,
+                                               mock_input,
+                                               mock_display_qr_code):
+        input_maps = self._input_maps()
+        input_maps[0].append((0xfc, b'proprietary', b'value'))
+        data = _psbt(self.tx, input_maps, len(self.tx.vout))
+        self._sign(data, mock_request, mock_input)
+
+        signed_data = bytes(PSBT.from_base64(
+            mock_display_qr_code.call_args[0][0]).data)
+        assert len(signed_data) > len(data)
+        assert b'proprietary' in signed_data
+        first_input = _psbt(self.tx, input_maps[:1], 0)[:-1]
+        assert signed_data.startswith(first_input)
+        assert signed_data.endswith(b'\x00' * len(self.tx.vout))
+
+    def test_signs_p2wsh_inputs(self,
+                                mock_request,
+                                mock_input,
+                                mock_display_qr_code):
+        script_pubkey = CScript([0, sha256(self.redeem_script).digest()])
+        input_maps = [[(0x01, b'', CMutableTxOut(amount, script_pubkey).serialize()),
+                       (0x05, b'', self.redeem_script),
+                       (0x06, self.public_key, self.derivation)]
+                      for amount in self.amounts]
+        data = _psbt(self.tx, input_maps, len(self.tx.vout))
+        signer = self._sign(data, mock_request, mock_input)
+
+        assert [group.script_type for group in signer.compiled.groups] == ['p2wsh'] * 3
+        assert list(signer.compiled.amounts) == self.amounts
+        signatures = _partial_signatures(bytes(PSBT.from_base64(
+            mock_display_qr_code.call_args[0][0]).data))
+        assert all(self.public_key in input_signatures
+                   for input_signatures in signatures)
+
+    def test_already_signed_keys_are_not_duplicated(self,
+                                                    mock_request,
+                                                    mock_input,
+                                                    mock_display_qr_code):
+        input_maps = self._input_maps()
+        input_maps[0].append((0x02, self.public_key, b'\x30\x01'))
+        data = _psbt(self.tx, input_maps, len(self.tx.vout))
+        self._sign(data, mock_request, mock_input)
+
+        signatures = _partial_signatures(bytes(PSBT.from_base64(
+            mock_display_qr_code.call_args[0][0]).data))
+        assert signatures[0] == {self.public_key: b'\x30\x01'}
+        assert self.public_key in signatures[1]
+
+    def test_missing_utxo_is_error(self,
+                                   mock_request,
+                                   mock_input,
+                                   mock_display_qr_code):
+        input_maps = self._input_maps()
+        input_maps[1] = input_maps[1][1:]
+        data = _psbt(self.tx, input_maps, len(self.tx.vout))
+        with pytest.raises(hermit.errors.InvalidSignatureRequest) as e_info:
+            self._sign(data, mock_request, mock_input)
+        assert str(e_info.value) == "Invalid signature request: PSBT input has no UTXO."
+
+    def test_mismatched_utxo_is_error(self,
+                                      mock_request,
+                                      mock_input,
+                                      mock_display_qr_code):
+        input_maps = self._input_maps()
+        input_maps[0][0] = (0x00, b'', self.utxos[1].serialize())
+        data = _psbt(self.tx, input_maps, len(self.tx.vout))
+        with pytest.raises(hermit.errors.InvalidSignatureRequest) as e_info:
+            self._sign(data, mock_request, mock_input)
+        assert str(e_info.value) == "Invalid signature request: PSBT input UTXO does not match its outpoint."
+
+    def _witness_utxo(self, input_index, amount):
+        return (0x01, b'', CMutableTxOut(amount, self.utxos[input_index].vout[0].scriptPubKey).serialize())
+
+    @pytest.mark.parametrize('witness_utxo_first', [True, False])
+    def test_p2sh_amount_comes_from_previous_transaction(self,
+                                                         mock_request,
+                                                         mock_input,
+                                                         mock_display_qr_code,
+                                                         witness_utxo_first):
+        input_maps = self._input_maps()
+        for (input_index, pairs) in enumerate(input_maps):
+            witness_utxo = self._witness_utxo(input_index, self.amounts[input_index])
+            if witness_utxo_first:
+                pairs.insert(0, witness_utxo)
+            else:
+                pairs.append(witness_utxo)
+        data = _psbt(self.tx, input_maps, len(self.tx.vout))
+        signer = self._sign(data, mock_request, mock_input)
+        assert list(signer.compiled.amounts) == self.amounts
+
+    @pytest.mark.parametrize('witness_utxo_first', [True, False])
+    def test_mismatched_witness_utxo_amount_is_error(self,
+                                                     mock_request,
+                                                     mock_input,
+                                                     mock_display_qr_code,
+                                                     witness_utxo_first):
+        input_maps = self._input_maps()
+        witness_utxo = self._witness_utxo(0, self.amounts[0] * 10)
+        if witness_utxo_first:
+            input_maps[0].insert(0, witness_utxo)
+        else:
+            input_maps[0].append(witness_utxo)
+        data = _psbt(self.tx, input_maps, len(self.tx.vout))
+        with pytest.raises(hermit.errors.InvalidSignatureRequest) as e_info:
+            self._sign(data, mock_request, mock_input)
+        assert str(e_info.value) == "Invalid signature request: PSBT input UTXOs do not agree on its amount."
+
+    def test_mismatched_utxo_after_witness_utxo_is_error(self,
+                                                         mock_request,
+                                                         mock_input,
+                                                         mock_display_qr_code):
+        input_maps = self._input_maps()
+        input_maps[0][0] = (0x00, b'', self.utxos[1].serialize())
+        input_maps[0].insert(0, self._witness_utxo(0, self.amounts[0]))
+        data = _psbt(self.tx, input_maps, len(self.tx.vout))
+        with pytest.raises(hermit.errors.InvalidSignatureRequest) as e_info:
+            self._sign(data, mock_request, mock_input)
+        assert str(e_info.value) == "Invalid signature request: PSBT input UTXO does not match its outpoint."
+
+    def test_p2sh_witness_utxo_alone_is_error(self,
+                                              mock_request,
+                                              mock_input,
+                                              mock_display_qr_code):
+        input_maps = self._input_maps()
+        input_maps[1][0] = self._witness_utxo(1, self.amounts[1])
+        data = _psbt(self.tx, input_maps, len(self.tx.vout))
+        with pytest.raises(hermit.errors.InvalidSignatureRequest) as e_info:
+            self._sign(data, mock_request, mock_input)
+        assert str(e_info.value) == "Invalid signature request: PSBT legacy input has no previous transaction."
+        assert not mock_display_qr_code.called
+
+    def test_key_from_another_wallet_is_error(self,
+                                              mock_request,
+                                              mock_input,
+                                              mock_display_qr_code):
+        input_maps = self._input_maps()
+        input_maps[2][2] = (0x06, self.public_key, b'\x00' * 4 + self.derivation[4:])
+        data = _psbt(self.tx, input_maps, len(self.tx.vout))
+        with pytest.raises(hermit.errors.InvalidSignatureRequest) as e_info:
+            self._sign(data, mock_request, mock_input)
+        assert str(e_info.value) == "Invalid signature request: PSBT input has no key from this wallet."
+
+    def test_truncated_psbt_is_error(self,
+                                     mock_request,
+                                     mock_input,
+                                     mock_display_qr_code):
+        data = _psbt(self.tx, self._input_maps(), len(self.tx.vout))
+        with pytest.raises(hermit.errors.InvalidSignatureRequest) as e_info:
+            self._sign(data[:-10], mock_request, mock_input)
+        assert str(e_info.value) == "Invalid signature request: PSBT is truncated."
+
+    def test_trailing_data_is_error(self,
+                                    mock_request,
+                                    mock_input,
+                                    mock_display_qr_code):
+        data = _psbt(self.tx, self._input_maps(), len(self.tx.vout))
+        with pytest.raises(hermit.errors.InvalidSignatureRequest) as e_info:
+            self._sign(data + b'\x00', mock_request, mock_input)
+        assert str(e_info.value) == "Invalid signature request: PSBT has trailing data."
+
+    @pytest.mark.parametrize('key_type', [0x00, 0x01])
+    def test_oversized_length_in_utxo_is_error(self,
+                                               mock_request,
+                                               mock_input,
+                                               mock_display_qr_code,
+                                               key_type):
+        oversized = b'\xff' + (0x65ecd027048d83ff).to_bytes(8, 'little')
+        if key_type == 0x00:
+            # A previous transaction whose first scriptSig is oversized
+            utxo = self.utxos[0].serialize()[:41] + oversized
+            message = "invalid transaction in PSBT"
+        else:
+            utxo = self.amounts[0].to_bytes(8, 'little') + oversized
+            message = "invalid UTXO in PSBT"
+        input_maps = self._input_maps()
+        input_maps[0].insert(0, (key_type, b'', utxo))
+        input_maps[0] = [pair for pair in input_maps[0]
+                         if pair[0] != key_type or pair[2] == utxo]
+        data = _psbt(self.tx, input_maps, len(self.tx.vout))
+        with pytest.raises(hermit.errors.InvalidSignatureRequest) as e_info:
+            self._sign(data, mock_request, mock_input)
+        assert str(e_info.value) == "Invalid signature request: {}.".format(message)
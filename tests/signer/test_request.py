@@ -0,0 +1,61 @@
+import copy
+
+import bitcoin
+from bitcoin.core import b2lx
+from bitcoin.wallet import CBitcoinAddress
+
+from hermit.signer import BitcoinSigner
+from hermit.wallet import HDWallet
+
+
+def _compiled(request):
+    signer = BitcoinSigner(HDWallet())
+    signer.request = request
+    signer.testnet = True
+    signer.validate_request()
+    return signer.compiled
+
+
+class TestCompiledRequest(object):
+
+    def test_compiles_inputs_and_outputs(self, fixture_opensource_bitcoin_vector):
+        request = fixture_opensource_bitcoin_vector['request']
+        compiled = _compiled(request)
+        (redeem_script, bip32_path, *inputs) = request['inputs'][0]
+
+        assert len(compiled) == len(inputs)
+        assert len(compiled.groups) == 1
+        for (input_index, input) in enumerate(inputs):
+            group = compiled.group(input_index)
+            assert group.script_type == 'p2sh'
+            assert group.script.hex() == redeem_script
+            assert group.bip32_path == bip32_path
+            assert b2lx(compiled.txid(input_index)) == input['txid']
+            assert compiled.indices[input_index] == input['index']
+            assert compiled.amounts[input_index] == input['amount']
+
+        bitcoin.SelectParams('testnet')
+        assert compiled.output_addresses == [output['address']
+                                             for output in request['outputs']]
+        assert compiled.output_scripts == [
+            CBitcoinAddress(output['address']).to_scriptPubKey()
+            for output in request['outputs']]
+        assert compiled.fee() == (sum(input['amount'] for input in inputs)
+                                  - sum(output['amount']
+                                        for output in request['outputs']))
+
+    def test_request_is_not_modified(self, fixture_opensource_bitcoin_vector):
+        request = fixture_opensource_bitcoin_vector['request']
+        original = copy.deepcopy(request)
+        _compiled(request)
+        assert request == original
+
+    def test_transaction(self, fixture_opensource_bitcoin_vector):
+        request = fixture_opensource_bitcoin_vector['request']
+        compiled = _compiled(request)
+        tx = compiled.transaction()
+        assert [(b2lx(txin.prevout.hash), txin.prevout.n) for txin in tx.vin] == [
+            (input['txid'], input['index']) for input in request['inputs'][0][2:]]
+        assert [txout.nValue for txout in tx.vout] == [
+            output['amount'] for output in request['outputs']]
+        assert [txout.scriptPubKey for txout in tx.vout] == compiled.output_scripts
@@ -0,0 +1,74 @@
+import json
+from json import JSONDecodeError
+
+import pytest
+
+import hermit
+from hermit.signer.request_parser import RequestParser
+
+
+class TestRequestParser(object):
+
+    documents = [
+        '{}',
+        '[]',
+        ' {"a": [1, -2.5, 3e2, true, false, null, "x\\u00e9\\"y"], "b": {}} ',
+        '"string"',
+        '12345678901234567890123',
+        '[[[[]]], {"": [{}]}]',
+    ]
+
+    @pytest.mark.parametrize('document', documents)
+    def test_matches_json_loads(self, document):
+        assert RequestParser().parse(document) == json.loads(document)
+
+    def test_matches_json_loads_on_fixtures(self, fixture_opensource_bitcoin_vector):
+        document = json.dumps(fixture_opensource_bitcoin_vector['request'])
+        assert RequestParser().parse(document) == json.loads(document)
+
+    @pytest.mark.parametrize('document', [
+        '', 'nope', '{"a" 1}', '{"a": 1,}', '[1 2]', '{1: 2}', '[1] [2]', '"abc',
+    ])
+    def test_rejects_invalid_json_like_json_loads(self, document):
+        with pytest.raises(JSONDecodeError) as expected:
+            json.loads(document)
+        with pytest.raises(JSONDecodeError) as e_info:
+            RequestParser().parse(document)
+        assert str(e_info.value) == str(expected.value)
+
+    def test_size_limit(self):
+        parser = RequestParser({'max_request_size': 10})
+        assert parser.parse('[1, 2, 3]') == [1, 2, 3]
+        with pytest.raises(hermit.errors.InvalidSignatureRequest) as e_info:
+            parser.parse('[1, 2, 3, 4]')
+        assert str(e_info.value) == "Invalid signature request: request is too large."
+
+    def test_depth_limit(self):
+        parser = RequestParser({'max_request_depth': 3})
+        assert parser.parse('[[[]]]') == [[[]]]
+        with pytest.raises(hermit.errors.InvalidSignatureRequest) as e_info:
+            parser.parse('[[[{}]]]')
+        assert str(e_info.value) == "Invalid signature request: request is nested too deeply."
+
+    def test_deep_nesting_is_rejected_before_the_end(self):
+        with pytest.raises(hermit.errors.InvalidSignatureRequest):
+            RequestParser().parse('[' * 100000)
+
+    def test_input_limit(self):
+        parser = RequestParser({'max_request_inputs': 3})
+        group = '["script", "m/1", {}, {}]'
+        assert len(parser.parse('{"inputs": [%s]}' % group)['inputs']) == 1
+        with pytest.raises(hermit.errors.InvalidSignatureRequest) as e_info:
+            parser.parse('{"inputs": [%s, %s]}' % (group, group))
+        assert str(e_info.value) == "Invalid signature request: too many inputs."
+        with pytest.raises(hermit.errors.InvalidSignatureRequest) as e_info:
+            parser.parse('{"inputs": [[], [], [], []]}')
+        assert str(e_info.value) == "Invalid signature request: too many input groups."
+
+    def test_limit_is_checked_before_the_end(self):
+        parser = RequestParser({'max_request_outputs': 2})
+        # The document is malformed after the third output, which is
+        # never reached.
+        with pytest.raises(hermit.errors.InvalidSignatureRequest) as e_info:
+            parser.parse('{"outputs": [{}, {}, {}, !')
+        assert str(e_info.value) == "Invalid signature request: too many outputs."
@@ -0,0 +1,120 @@
+import hashlib
+import json
+import struct
+
+from bitcoin.core import (COutPoint,
+                          CMutableTxIn,
+                          CMutableTxOut,
+                          CTransaction,
+                          lx)
+from bitcoin.core.script import (CScript,
+                                 OP_CHECKSIG,
+                                 OP_CODESEPARATOR,
+                                 SignatureHash,
+                                 SIGHASH_ALL,
+                                 SIGVERSION_WITNESS_V0)
+import pytest
+
+from hermit.signer import BitcoinSigner
+from hermit.signer.sighash import (LegacySignatureHasher,
+                                   SegwitSignatureHasher,
+                                   TaprootSignatureHasher)
+from hermit.wallet import HDWallet
+
+
+def _request_fixtures():
+    filenames = ["tests/fixtures/opensource_bitcoin_test_vector_0.json",
+                 "tests/fixtures/opensource_bitcoin_test_vector_1.json"]
+    requests = []
+    for filename in filenames:
+        with open(filename, 'r') as f:
+            requests.append(json.load(f)['request'])
+    return requests
+
+
+def _signer(request):
+    signer = BitcoinSigner(HDWallet())
+    signer.request = request
+    signer.testnet = True
+    signer.validate_request()
+    return signer
+
+
+class TestLegacySignatureHasher(object):
+
+    @pytest.mark.parametrize('request_data', _request_fixtures())
+    def test_matches_signature_hash_on_fixtures(self, request_data):
+        signer = _signer(request_data)
+        tx = signer._transaction()
+        hasher = LegacySignatureHasher(tx)
+        for input_index in range(len(signer.compiled)):
+            script = signer.compiled.group(input_index).script
+            assert (hasher.signature_hash(input_index, script)
+                    == SignatureHash(script, tx, input_index, SIGHASH_ALL))
+
+    def test_inputs_in_any_order(self):
+        tx = CTransaction(
+            [CMutableTxIn(COutPoint(lx('aa' * 32), index), nSequence=index)
+             for index in range(50)],
+            [CMutableTxOut(1000, CScript([OP_CHECKSIG]))],
+            nLockTime=99)
+        hasher = LegacySignatureHasher(tx)
+        script = CScript([OP_CHECKSIG])
+        for input_index in [3, 49, 4, 0, 2, 2, 1, 48]:
+            assert (hasher.signature_hash(input_index, script)
+                    == SignatureHash(script, tx, input_index, SIGHASH_ALL))
+
+    def test_removes_code_separators(self):
+        tx = CTransaction([CMutableTxIn(COutPoint(lx('bb' * 32), 0))],
+                          [CMutableTxOut(1000, CScript([OP_CHECKSIG]))])
+        script = CScript([OP_CODESEPARATOR, OP_CHECKSIG])
+        assert (LegacySignatureHasher(tx).signature_hash(0, script)
+                == SignatureHash(script, tx, 0, SIGHASH_ALL))
+
+
+class TestSegwitSignatureHasher(object):
+
+    def test_matches_signature_hash(self):
+        tx = CTransaction(
+            [CMutableTxIn(COutPoint(lx('cc' * 32), index), nSequence=index)
+             for index in range(20)],
+            [CMutableTxOut(1000 + index, CScript([OP_CHECKSIG]))
+             for index in range(3)],
+            nLockTime=42)
+        hasher = SegwitSignatureHasher(tx)
+        script = CScript([OP_CHECKSIG])
+        for input_index in [5, 0, 19, 5]:
+            amount = 10000 * (input_index + 1)
+            assert (hasher.signature_hash(input_index, script, amount)
+                    == SignatureHash(script, tx, input_index, SIGHASH_ALL,
+                                     amount=amount,
+                                     sigversion=SIGVERSION_WITNESS_V0))
+
+
+class TestTaprootSignatureHasher(object):
+
+    def test_matches_bip341_message(self):
+        tx = CTransaction(
+            [CMutableTxIn(COutPoint(lx('dd' * 32), index), nSequence=index)
+             for index in range(4)],
+            [CMutableTxOut(5000, CScript([OP_CHECKSIG]))],
+            nLockTime=7,
+            nVersion=2)
+        amounts = [1000 * (index + 1) for index in range(4)]
+        script_pubkeys = [b'\x51\x20' + bytes([index]) * 32 for index in range(4)]
+        hasher = TaprootSignatureHasher(tx, amounts, script_pubkeys)
+
+        sha = lambda data: hashlib.sha256(data).digest()
+        for input_index in range(4):
+            message = (b'\x00\x00'
+                       + struct.pack('<i', 2)
+                       + struct.pack('<I', 7)
+                       + sha(b''.join(txin.prevout.serialize() for txin in tx.vin))
+                       + sha(b''.join(struct.pack('<q', amount) for amount in amounts))
+                       + sha(b''.join(bytes([len(spk)]) + spk for spk in script_pubkeys))
+                       + sha(b''.join(struct.pack('<I', txin.nSequence) for txin in tx.vin))
+                       + sha(b''.join(txout.serialize() for txout in tx.vout))
+                       + b'\x00'
+                       + struct.pack('<I', input_index))
+            tag = sha(b'TapSighash')
+            assert hasher.signature_hash(input_index) == sha(tag + tag + message)
@@ -0,0 +1,149 @@
+import json
+from unittest.mock import patch
+
+import pytest
+
+import hermit
+from hermit import secp256k1
+from hermit.signer import TaprootSigner
+from hermit.signer.sighash import TaprootSignatureHasher
+from hermit.signer.taproot_signer import (decode_taproot_address,
+                                          encode_taproot_address,
+                                          taproot_output_key,
+                                          taproot_private_key)
+from hermit.wallet import HDWallet
+
+BIP86_WORDS = ("abandon abandon abandon abandon abandon abandon "
+               "abandon abandon abandon abandon abandon about")
+
+
+class FakeShards:
+    def __init__(self, words):
+        self.words = words
+
+    def wallet_words(self):
+        return self.words
+
+
+@pytest.fixture()
+def bip86_wallet():
+    wallet = HDWallet()
+    wallet.shards = FakeShards(BIP86_WORDS)
+    return wallet
+
+
+class TestTaprootKeys(object):
+
+    def test_bip86_vector(self, bip86_wallet):
+        public_key = bytes.fromhex(bip86_wallet.public_key("m/86'/0'/0'/0/0"))
+        assert public_key[1:].hex() == "cc8a4bc64d897bddc5fbc2f670f7a8ba0b386779106cf1223c6fc5d7cd6fc115"
+        output_key = taproot_output_key(public_key)
+        assert output_key.hex() == "a60869f0dbcf1dc659c9cecbaf8050135ea9e8cdc487053f1dc6880949dc684c"
+        assert (encode_taproot_address(output_key)
+                == "bc1p5cyxnuxmeuwuvkwfem96lqzszd02n6xdcjrs20cac6yqjjwudpxqkedrcr")
+
+    def test_private_key_matches_output_key(self, bip86_wallet):
+        keys = bip86_wallet.derive_many(["m/86'/0'/0'/0/1"])["m/86'/0'/0'/0/1"]
+        secret = taproot_private_key(bytes.fromhex(keys['private_key']))
+        assert (secp256k1.x_only(secp256k1.multiply_g(secret))
+                == taproot_output_key(bytes.fromhex(keys['public_key'])))
+
+    def test_address_round_trip(self):
+        output_key = bytes(range(32))
+        for testnet in (True, False):
+            address = encode_taproot_address(output_key, testnet)
+            assert decode_taproot_address(address, testnet) == output_key
+            assert decode_taproot_address(address.upper(), testnet) == output_key
+            assert decode_taproot_address(address, not testnet) is None
+
+    def test_rejects_other_addresses(self):
+        # bech32 (not bech32m) segwit v0 address
+        assert decode_taproot_address("bc1qrp33g0q5c5txsp9arysrx4k6zdkfs4nce4xj0gdcccefvpysxf3qccfmv3") is None
+        address = encode_taproot_address(bytes(32))
+        assert decode_taproot_address(address[:-1] + ('q' if address[-1] != 'q' else 'p')) is None
+
+
+@patch('hermit.signer.displayer.display_qr_code')
+@patch('hermit.signer.base.input')
+@patch('hermit.signer.reader.read_qr_code')
+class TestTaprootSigner(object):
+
+    @pytest.fixture(autouse=True)
+    def setup_request(self, bip86_wallet):
+        self.wallet = bip86_wallet
+        self.request = {
+            "inputs": [
+                ["m/86'/1'/0'/0/0",
+                 {"txid": "aa" * 32, "index": 0, "amount": 50000},
+                 {"txid": "bb" * 32, "index": 1, "amount": 60000}],
+                ["m/86'/1'/0'/1/0",
+                 {"txid": "cc" * 32, "index": 2, "amount": 70000}],
+            ],
+            "outputs": [
+                {"address": encode_taproot_address(bytes(range(32)), True),
+                 "amount": 100000},
+                {"address": "2N8o4Mu5PRAR27TC2eai62CRXarTbQmjyCx",
+                 "amount": 79000},
+            ],
+        }
+
+    def test_signs_every_input(self,
+                               mock_request,
+                               mock_input,
+                               mock_display_qr_code):
+        mock_request.return_value = json.dumps(self.request)
+        mock_input.return_value = 'y'
+
+        signer = TaprootSigner(self.wallet)
+        signer.sign(testnet=True)
+
+        signatures = json.loads(mock_display_qr_code.call_args[0][0])['signatures']
+        assert len(signatures) == 3
+        tx = signer._transaction()
+        assert tx.vout[0].scriptPubKey == b'\x51\x20' + bytes(range(32))
+        hasher = TaprootSignatureHasher(
+            tx,
+            signer.compiled.amounts,
+            [signer.compiled.group(input_index).script_pubkey
+             for input_index in range(len(signer.compiled))])
+        for input_index in range(len(signer.compiled)):
+            address = signer.compiled.group(input_index).address
+            assert address.startswith('tb1p')
+            output_key = decode_taproot_address(address, True)
+            assert secp256k1.schnorr_verify(output_key,
+                                            hasher.signature_hash(input_index),
+                                            bytes.fromhex(signatures[input_index]))
+
+    def test_input_group_requires_input(self,
+                                        mock_request,
+                                        mock_input,
+                                        mock_display_qr_code):
+        self.request['inputs'][1] = ["m/86'/1'/0'/1/0"]
+        mock_request.return_value = json.dumps(self.request)
+
+        with pytest.raises(hermit.errors.InvalidSignatureRequest) as e_info:
+            TaprootSigner(self.wallet).sign(testnet=True)
+
+        assert str(e_info.value) == "Invalid signature request: input group must include BIP32 path and at least one input."
+
+    def test_invalid_output_address_is_error(self,
+                                             mock_request,
+                                             mock_input,
+                                             mock_display_qr_code):
+        self.request['outputs'][0]['address'] = encode_taproot_address(bytes(32), False)
+        mock_request.return_value = json.dumps(self.request)
+
+        with pytest.raises(hermit.errors.InvalidSignatureRequest):
+            TaprootSigner(self.wallet).sign(testnet=True)
+
+    def test_psbt_is_rejected_before_unlocking(self,
+                                               mock_request,
+                                               mock_input,
+                                               mock_display_qr_code):
+        mock_request.return_value = 'cHNidP8BAAoCAAAAAAAAAAAAAAA='
+
+        with pytest.raises(hermit.errors.InvalidSignatureRequest) as e_info:
+            TaprootSigner(self.wallet).sign(testnet=True)
+
+        assert str(e_info.value) == "Invalid signature request: PSBT requests cannot be signed with a taproot signer."
+        assert not self.wallet.unlocked()
@@ -0,0 +1,112 @@
+import json
+from unittest.mock import patch
+
+import pytest
+
+from hermit.batch import main, read_request_file, sign_files
+from hermit.signer.psbt import PSBT_MAGIC
+from hermit.wallet import HDWallet
+
+
+class FakeShards:
+    def __init__(self, words):
+        self.words = words
+
+    def wallet_words(self):
+        return self.words
+
+
+class TestReadRequestFile(object):
+
+    def test_json(self, tmp_path):
+        request_path = tmp_path / 'request.json'
+        request_path.write_text('{"inputs": []}\n')
+        assert read_request_file(str(request_path)) == '{"inputs": []}'
+
+    def test_binary_psbt_is_base64_encoded(self, tmp_path):
+        request_path = tmp_path / 'request.psbt'
+        request_path.write_bytes(PSBT_MAGIC + b'\x00')
+        assert read_request_file(str(request_path)) == 'cHNidP8A'
+
+    def test_qr_code_image(self, fixture_opensource_bitcoin_vector):
+        request_data = read_request_file(
+            'tests/fixtures/opensource_bitcoin_test_vector_0.png')
+        assert json.loads(request_data) == fixture_opensource_bitcoin_vector['request']
+
+
+@patch('hermit.signer.base.input')
+class TestSignFiles(object):
+
+    @pytest.fixture(autouse=True)
+    def setup_wallet_and_requests(self,
+                                  tmp_path,
+                                  fixture_opensource_bitcoin_vector,
+                                  opensource_wallet_words):
+        self.wallet = HDWallet()
+        self.wallet.shards = FakeShards(opensource_wallet_words)
+        self.vector = fixture_opensource_bitcoin_vector
+        self.request_path = tmp_path / 'request.json'
+        self.request_path.write_text(self.vector['request_json'])
+        self.signature_path = tmp_path / 'request.signature.json'
+
+    def test_signs_without_confirmation(self, mock_input):
+        failures = sign_files(self.wallet,
+                              [str(self.request_path)],
+                              testnet=True,
+                              confirm=False)
+        assert failures == 0
+        assert not mock_input.called
+        assert json.loads(self.signature_path.read_text()) == self.vector['expected_signature']
+
+    def test_declined_request_is_not_written(self, mock_input):
+        mock_input.return_value = 'n'
+        failures = sign_files(self.wallet, [str(self.request_path)], testnet=True)
+        assert failures == 0
+        assert not self.signature_path.exists()
+
+    def test_invalid_requests_are_skipped(self, mock_input, tmp_path):
+        invalid_path = tmp_path / 'invalid.json'
+        invalid_path.write_text('{"inputs": []}')
+        output_dir = tmp_path / 'signed'
+        output_dir.mkdir()
+        failures = sign_files(self.wallet,
+                              [str(invalid_path), str(self.request_path)],
+                              output_dir=str(output_dir),
+                              testnet=True,
+                              confirm=False)
+        assert failures == 1
+        assert [path.name for path in output_dir.iterdir()] == ['request.signature.json']
+
+    @pytest.mark.parametrize('request_json', [
+        '5',
+        '{"inputs": [5], "outputs": []}',
+        '{"inputs": [["m/45\'/0\'/0\'", 5]], "outputs": []}',
+        '{"inputs": [], "outputs": [5]}',
+    ])
+    def test_malformed_requests_are_skipped(self, mock_input, tmp_path, request_json):
+        malformed_path = tmp_path / 'malformed.json'
+        malformed_path.write_text(request_json)
+        failures = sign_files(self.wallet,
+                              [str(malformed_path), str(self.request_path)],
+                              testnet=True,
+                              confirm=False)
+        assert failures == 1
+        assert self.signature_path.exists()
+
+    def test_signature_path_collision_is_skipped(self, mock_input, tmp_path, capsys):
+        other_path = tmp_path / 'request.txt'
+        other_path.write_text('{"inputs": []}')
+        failures = sign_files(self.wallet,
+                              [str(self.request_path), str(other_path)],
+                              testnet=True,
+                              confirm=False)
+        assert failures == 1
+        assert json.loads(self.signature_path.read_text()) == self.vector['expected_signature']
+        assert "already holds the signature of {}".format(self.request_path) in capsys.readouterr().out
+
+    def test_main_locks_wallet_when_done(self, mock_input):
+        with patch('hermit.batch.HDWallet', return_value=self.wallet):
+            status = main(['--testnet', '--yes', str(self.request_path)])
+        assert status == 0
+        assert not self.wallet.unlocked()
+        assert self.signature_path.exists()
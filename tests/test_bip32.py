@@ -0,0 +1,75 @@
+import pytest
+
+import hermit
+from hermit.bip32 import BIP32Node
+
+
+class TestBIP32NodeSerialization(object):
+
+    def test_xprv_round_trip(self, bip32_vectors):
+        for seed in bip32_vectors:
+            for path in bip32_vectors[seed]:
+                xprv = bip32_vectors[seed][path]['xprv']
+                assert BIP32Node.from_extended_key(xprv).to_xprv() == xprv
+
+    def test_xpub_round_trip(self, bip32_vectors):
+        for seed in bip32_vectors:
+            for path in bip32_vectors[seed]:
+                xpub = bip32_vectors[seed][path]['xpub']
+                node = BIP32Node.from_extended_key(xpub)
+                assert node.private_key is None
+                assert node.to_xpub() == xpub
+
+    def test_xprv_to_xpub(self, bip32_vectors):
+        for seed in bip32_vectors:
+            for path in bip32_vectors[seed]:
+                node = BIP32Node.from_extended_key(bip32_vectors[seed][path]['xprv'])
+                assert node.to_xpub() == bip32_vectors[seed][path]['xpub']
+
+    def test_from_seed(self, bip32_vectors):
+        for seed in bip32_vectors:
+            node = BIP32Node.from_seed(bytes.fromhex(seed))
+            assert node.to_xprv() == bip32_vectors[seed]['m']['xprv']
+
+    def test_bad_checksum_raises_error(self, bip32_vectors):
+        seed = list(bip32_vectors.keys())[0]
+        xprv = bip32_vectors[seed]['m']['xprv']
+        with pytest.raises(hermit.errors.HermitError) as e_info:
+            BIP32Node.from_extended_key(xprv[:-1] + ('1' if xprv[-1] != '1' else '2'))
+        assert str(e_info.value) == "Invalid extended key."
+
+
+class TestBIP32NodeChild(object):
+
+    def test_public_node_cannot_derive_private_child(self, bip32_vectors):
+        seed = list(bip32_vectors.keys())[0]
+        node = BIP32Node.from_extended_key(bip32_vectors[seed]['m']['xpub'])
+        with pytest.raises(hermit.errors.HermitError):
+            node.child(0)
+        with pytest.raises(hermit.errors.HermitError):
+            node.to_xprv()
+
+    def test_public_child_matches_private_child(self, bip32_vectors):
+        for seed in bip32_vectors:
+            node = BIP32Node.from_extended_key(bip32_vectors[seed]['m']['xprv'])
+            for index in (0, 1, 2**31 - 1):
+                assert node.public_child(index).to_xpub() == node.child(index).to_xpub()
+
+    def test_public_child_of_xpub(self, bip32_vectors):
+        seed = '000102030405060708090a0b0c0d0e0f'
+        node = BIP32Node.from_extended_key(bip32_vectors[seed]["m/0'/1/2'"]['xpub'])
+        assert node.public_child(2).to_xpub() == bip32_vectors[seed]["m/0'/1/2'/2"]['xpub']
+
+    def test_public_children(self, bip32_vectors):
+        seed = list(bip32_vectors.keys())[0]
+        node = BIP32Node.from_extended_key(bip32_vectors[seed]['m']['xpub'])
+        children = node.public_children(range(3, 6))
+        assert [child.to_xpub() for child in children] == [
+            node.public_child(index).to_xpub() for index in range(3, 6)]
+
+    def test_public_node_cannot_derive_hardened_child(self, bip32_vectors):
+        seed = list(bip32_vectors.keys())[0]
+        node = BIP32Node.from_extended_key(bip32_vectors[seed]['m']['xpub'])
+        with pytest.raises(hermit.errors.HermitError) as e_info:
+            node.public_child(2**31)
+        assert str(e_info.value) == "Cannot derive a hardened child from a public key."
@@ -63,3 +63,67 @@ class TestHermitPaths(object):
                                        {'persistShards': 'foo {0}'}}
         config = HermitConfig.load()
         assert config.commands['persistShards'] == 'foo {}'.format(config.shards_file)
+
+    #
+    # Public key cache
+    #
+
+    @patch('hermit.config.path.exists')
+    @patch('hermit.config.yaml.safe_load')
+    @patch('hermit.config.open')
+    def test_public_key_cache_file_defaults_next_to_shards(self, mock_open, mock_safe_load, mock_exists):
+        mock_exists.return_value = True
+        mock_safe_load.return_value = {'shards_file': 'shards_file'}
+        config = HermitConfig.load()
+        assert config.public_key_cache_file == 'shards_file.pubkeys'
+
+        mock_safe_load.return_value = {'public_key_cache_file': 'cache_file'}
+        config = HermitConfig.load()
+        assert config.public_key_cache_file == 'cache_file'
+
+    #
+    # Signing
+    #
+
+    @patch('hermit.config.path.exists')
+    @patch('hermit.config.yaml.safe_load')
+    @patch('hermit.config.open')
+    def test_parallel_signing_settings(self, mock_open, mock_safe_load, mock_exists):
+        mock_exists.return_value = True
+        mock_safe_load.return_value = {}
+        config = HermitConfig.load()
+        assert config.signing_processes == 1
+        assert config.parallel_signing_threshold == 256
+
+        mock_safe_load.return_value = {'signing_processes': 4,
+                                       'parallel_signing_threshold': 100}
+        config = HermitConfig.load()
+        assert config.signing_processes == 4
+        assert config.parallel_signing_threshold == 100
+
+    @patch('hermit.config.path.exists')
+    @patch('hermit.config.yaml.safe_load')
+    @patch('hermit.config.open')
+    def test_decryption_processes(self, mock_open, mock_safe_load, mock_exists):
+        mock_exists.return_value = True
+        mock_safe_load.return_value = {}
+        assert HermitConfig.load().decryption_processes == 1
+
+        mock_safe_load.return_value = {'decryption_processes': 3}
+        assert HermitConfig.load().decryption_processes == 3
+
+    @patch('hermit.config.path.exists')
+    @patch('hermit.config.yaml.safe_load')
+    @patch('hermit.config.open')
+    def test_request_limits(self, mock_open, mock_safe_load, mock_exists):
+        mock_exists.return_value = True
+        mock_safe_load.return_value = {}
+        config = HermitConfig.load()
+        assert config.request_limits == HermitConfig.DefaultRequestLimits
+
+        mock_safe_load.return_value = {'max_request_size': 4096,
+                                       'max_request_inputs': 10}
+        config = HermitConfig.load()
+        assert config.request_limits['max_request_size'] == 4096
+        assert config.request_limits['max_request_inputs'] == 10
+        assert config.request_limits['max_request_outputs'] == 10000
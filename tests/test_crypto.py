@@ -0,0 +1,94 @@
+from unittest.mock import patch
+
+import pytest
+
+from hermit import crypto
+
+
+def _available_backends():
+    backends = []
+    for backend_class in crypto.BACKEND_CLASSES:
+        try:
+            backends.append(backend_class())
+        except OSError:
+            pass
+    return backends
+
+
+class BrokenBackend(crypto.HermitBackend):
+    name = 'broken'
+
+    def sign_digests(self, requests):
+        return [b'\x30' for _ in requests]
+
+
+class MissingBackend(crypto.HermitBackend):
+    name = 'missing'
+
+    def __init__(self):
+        raise OSError("not installed")
+
+
+class TestBackends(object):
+
+    @pytest.mark.parametrize('backend', _available_backends(),
+                             ids=lambda backend: backend.name)
+    def test_passes_known_answers(self, backend):
+        assert backend.passes_known_answers()
+
+    @pytest.mark.parametrize('backend', _available_backends(),
+                             ids=lambda backend: backend.name)
+    def test_rejects_invalid_private_key(self, backend):
+        with pytest.raises(ValueError):
+            backend.public_key(b'\x00' * 32)
+
+    @pytest.mark.parametrize('backend', _available_backends(),
+                             ids=lambda backend: backend.name)
+    def test_matches_hermit_backend(self, backend):
+        reference = crypto.HermitBackend()
+        private_keys = [bytes([index]) * 32 for index in range(1, 8)]
+        digests = [bytes([index + 100]) * 32 for index in range(1, 8)]
+        for private_key in private_keys:
+            public_key = reference.public_key(private_key)
+            assert backend.public_key(private_key) == public_key
+            assert (backend.tweak_public_key(public_key, private_key)
+                    == reference.tweak_public_key(public_key, private_key))
+        requests = list(zip(private_keys, digests))
+        assert backend.sign_digests(requests) == reference.sign_digests(requests)
+
+
+class TestLibSecp256k1Backend(object):
+
+    @patch('hermit.crypto.ctypes.CDLL')
+    def test_context_can_sign_tweak_and_is_randomized(self, mock_cdll):
+        lib = mock_cdll.return_value
+        lib.secp256k1_context_create.return_value = 1
+        lib.secp256k1_context_randomize.return_value = 1
+        crypto.LibSecp256k1Backend('libsecp256k1.so')
+        lib.secp256k1_context_create.assert_called_once_with(0x301)
+        (_, seed) = lib.secp256k1_context_randomize.call_args[0]
+        assert len(seed) == 32
+
+    @patch('hermit.crypto.ctypes.CDLL')
+    def test_unrandomized_context_is_unavailable(self, mock_cdll):
+        lib = mock_cdll.return_value
+        lib.secp256k1_context_create.return_value = 1
+        lib.secp256k1_context_randomize.return_value = 0
+        with pytest.raises(OSError):
+            crypto.LibSecp256k1Backend('libsecp256k1.so')
+
+
+class TestSelectBackend(object):
+
+    def test_skips_broken_and_missing_backends(self):
+        selected = crypto.select_backend(
+            [MissingBackend, BrokenBackend, crypto.PythonLibrariesBackend])
+        assert selected.name == 'pybitcointools+ecdsa'
+
+    def test_raises_error_without_working_backend(self):
+        with pytest.raises(RuntimeError):
+            crypto.select_backend([MissingBackend, BrokenBackend])
+
+    def test_backend_is_selected_once(self):
+        assert crypto.backend() is crypto.backend()
+        assert crypto.backend().passes_known_answers()
@@ -40,3 +40,24 @@ class TestBitcoinSigningIntegration(object):
                                                 name='Signature')
 
         # assert captured.out == expected_display
+
+    def test_opensource_bitcoin_vectors_in_parallel(self,
+                                                    mock_request,
+                                                    mock_input,
+                                                    mock_display_qr_code,
+                                                    fixture_opensource_shard_set,
+                                                    fixture_opensource_bitcoin_vectors):
+        test_vector = fixture_opensource_bitcoin_vectors
+        wallet = HDWallet()
+        wallet.shards = fixture_opensource_shard_set
+        mock_request.return_value = test_vector['request_json']
+        mock_input.return_value = 'y'
+
+        signer = BitcoinSigner(wallet,
+                               signing_processes=2,
+                               parallel_signing_threshold=1)
+        signer.sign(testnet=True)
+
+        mock_display_qr_code.assert_called_once_with(
+            json.dumps(test_vector['expected_signature']),
+            name='Signature')
@@ -0,0 +1,39 @@
+from hermit.pubkey_cache import PublicKeyCache
+
+
+class TestPublicKeyCache(object):
+
+    def test_empty_without_file(self, tmp_path):
+        cache = PublicKeyCache(str(tmp_path / 'shards.bson.pubkeys'))
+        assert cache.xpubs('digest') == {}
+
+    def test_store_persists(self, tmp_path):
+        filename = str(tmp_path / 'shards.bson.pubkeys')
+        PublicKeyCache(filename).store('digest', 'abcd1234', {"m/45'": 'xpub1'})
+
+        cache = PublicKeyCache(filename)
+        assert cache.xpubs('digest') == {"m/45'": 'xpub1'}
+        assert cache.xpubs('digest', 'abcd1234') == {"m/45'": 'xpub1'}
+        assert cache.xpubs('digest', 'ffffffff') == {}
+
+    def test_changed_shards_invalidate_entries(self, tmp_path):
+        filename = str(tmp_path / 'shards.bson.pubkeys')
+        cache = PublicKeyCache(filename)
+        cache.store('digest', 'abcd1234', {"m/45'": 'xpub1'})
+        assert cache.xpubs('other digest') == {}
+
+        cache.store('other digest', 'abcd1234', {"m/44'": 'xpub2'})
+        assert PublicKeyCache(filename).entries == {
+            'abcd1234': {'shards': 'other digest', 'xpubs': {"m/44'": 'xpub2'}}}
+
+    def test_ambiguous_wallets_are_not_used_while_locked(self, tmp_path):
+        cache = PublicKeyCache(str(tmp_path / 'shards.bson.pubkeys'))
+        cache.store('digest', 'abcd1234', {"m/45'": 'xpub1'})
+        cache.store('digest', '1234abcd', {"m/45'": 'xpub2'})
+        assert cache.xpubs('digest') == {}
+        assert cache.xpubs('digest', '1234abcd') == {"m/45'": 'xpub2'}
+
+    def test_corrupt_file_is_empty(self, tmp_path):
+        filename = tmp_path / 'shards.bson.pubkeys'
+        filename.write_bytes(b'not bson')
+        assert PublicKeyCache(str(filename)).xpubs('digest') == {}
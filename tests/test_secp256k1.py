@@ -0,0 +1,141 @@
+from hashlib import sha256
+from random import Random
+
+import ecdsa
+import pytest
+from pybitcointools import G, N, fast_add, fast_multiply
+
+from hermit import secp256k1
+
+
+def _scalars(count):
+    rng = Random(1234)
+    edge = [1, 2, 3, 255, 256, 257, 2**64, N - 1, N - 2, N // 2]
+    return edge + [rng.randrange(1, N) for _ in range(count)]
+
+
+class TestPointArithmetic(object):
+
+    def test_multiply_g(self):
+        for scalar in _scalars(20):
+            assert secp256k1.multiply_g(scalar) == fast_multiply(G, scalar)
+
+    def test_multiply_g_zero_is_infinity(self):
+        assert secp256k1.multiply_g(0) is None
+        assert secp256k1.multiply_g(N) is None
+
+    def test_multiply(self):
+        point = fast_multiply(G, 0xdeadbeef)
+        for scalar in _scalars(20):
+            assert secp256k1.multiply(point, scalar) == fast_multiply(point, scalar)
+
+    def test_add(self):
+        p = fast_multiply(G, 12345)
+        q = fast_multiply(G, 67890)
+        assert secp256k1.add(p, q) == fast_add(p, q)
+        assert secp256k1.add(p, p) == fast_multiply(G, 2 * 12345)
+        assert secp256k1.add(p, (p[0], secp256k1.P - p[1])) is None
+        assert secp256k1.add(None, q) == q
+
+    def test_compress_round_trip(self):
+        for scalar in _scalars(5):
+            point = secp256k1.multiply_g(scalar)
+            assert secp256k1.decompress(secp256k1.compress(point)) == point
+
+    def test_decompress_rejects_bad_data(self):
+        with pytest.raises(ValueError):
+            secp256k1.decompress(b'\x04' + b'\x00' * 32)
+        with pytest.raises(ValueError):
+            secp256k1.decompress(b'\x02' + (5).to_bytes(32, 'big'))
+
+    def test_batch_inverse(self):
+        values = [3, 7, 2**200 + 1, secp256k1.P - 1]
+        inverses = secp256k1.batch_inverse(values, secp256k1.P)
+        assert inverses == [pow(v, secp256k1.P - 2, secp256k1.P) for v in values]
+
+
+class TestECDSA(object):
+
+    def test_signatures_match_ecdsa(self):
+        rng = Random(5678)
+        for secret in _scalars(10):
+            digest = sha256(rng.getrandbits(256).to_bytes(32, 'big')).digest()
+            signing_key = ecdsa.SigningKey.from_string(
+                secret.to_bytes(32, 'big'), curve=ecdsa.SECP256k1)
+            expected = signing_key.sign_digest_deterministic(
+                digest,
+                sha256,
+                sigencode=ecdsa.util.sigencode_der_canonize)
+            assert secp256k1.sign_digest(secret, digest) == expected
+
+    def test_signatures_are_low_s_and_verify(self):
+        secret = 0x1e99423a4ed27608a15a2616a2b0e9e52ced330ac530edcc32c8ffc6a526aedd
+        point = secp256k1.multiply_g(secret)
+        digest = sha256(b'hermit').digest()
+        signature = secp256k1.sign_digest(secret, digest)
+        (r, s) = ecdsa.util.sigdecode_der(signature, N)
+        assert s <= N // 2
+        assert secp256k1.verify_digest(point, digest, r, s)
+        assert not secp256k1.verify_digest(point, sha256(b'other').digest(), r, s)
+
+    def test_batch_signatures_match_ecdsa(self):
+        rng = Random(91011)
+        requests = [(secret, sha256(rng.getrandbits(256).to_bytes(32, 'big')).digest())
+                    for secret in _scalars(20)]
+        assert secp256k1.sign_digests(requests) == [
+            ecdsa.SigningKey.from_string(
+                secret.to_bytes(32, 'big'),
+                curve=ecdsa.SECP256k1).sign_digest_deterministic(
+                    digest,
+                    sha256,
+                    sigencode=ecdsa.util.sigencode_der_canonize)
+            for (secret, digest) in requests]
+
+    def test_empty_batch(self):
+        assert secp256k1.sign_digests([]) == []
+
+
+class TestSchnorr(object):
+
+    # From the BIP340 test vectors
+    vectors = [
+        ("0000000000000000000000000000000000000000000000000000000000000003",
+         "F9308A019258C31049344F85F89D5229B531C845836F99B08601F113BCE036F9",
+         "0000000000000000000000000000000000000000000000000000000000000000",
+         "0000000000000000000000000000000000000000000000000000000000000000",
+         "E907831F80848D1069A5371B402410364BDF1C5F8307B0084C55F1CE2DCA8215"
+         "25F66A4A85EA8B71E482A74F382D2CE5EBEEE8FDB2172F477DF4900D310536C0"),
+        ("B7E151628AED2A6ABF7158809CF4F3C762E7160F38B4DA56A784D9045190CFEF",
+         "DFF1D77F2A671C5F36183726DB2341BE58FEAE1DA2DECED843240F7B502BA659",
+         "0000000000000000000000000000000000000000000000000000000000000001",
+         "243F6A8885A308D313198A2E03707344A4093822299F31D0082EFA98EC4E6C89",
+         "6896BD60EEAE296DB48A229FF71DFE071BDE413E6D43F917DC8DCF8C78DE3341"
+         "8906D11AC976ABCCB20B091292BFF4EA897EFCB639EA871CFA95F6DE339E4B0A"),
+    ]
+
+    def test_bip340_vectors(self):
+        for (secret, public_key, aux_rand, message, signature) in self.vectors:
+            secret = int(secret, 16)
+            public_key = bytes.fromhex(public_key)
+            message = bytes.fromhex(message)
+            signature = bytes.fromhex(signature)
+            assert secp256k1.x_only(secp256k1.multiply_g(secret)) == public_key
+            assert secp256k1.schnorr_sign(secret, message,
+                                          bytes.fromhex(aux_rand)) == signature
+            assert secp256k1.schnorr_verify(public_key, message, signature)
+
+    def test_verify_rejects_modified_signature(self):
+        (_, public_key, _, message, signature) = self.vectors[1]
+        signature = bytearray(bytes.fromhex(signature))
+        signature[63] ^= 1
+        assert not secp256k1.schnorr_verify(bytes.fromhex(public_key),
+                                            bytes.fromhex(message),
+                                            bytes(signature))
+
+    def test_tagged_hash(self):
+        tag = sha256(b'BIP0340/challenge').digest()
+        assert (secp256k1.tagged_hash('BIP0340/challenge', b'data')
+                == sha256(tag + tag + b'data').digest())
+        # The cached midstate must not be advanced by earlier calls
+        assert (secp256k1.tagged_hash('BIP0340/challenge', b'data')
+                == sha256(tag + tag + b'data').digest())
@@ -1,6 +1,8 @@
 import json
+from unittest.mock import patch
 import pytest
 
+from hermit.pubkey_cache import PublicKeyCache
 from hermit.wallet import HDWallet
 import hermit
 
@@ -175,3 +177,165 @@ class TestHDWalletExtendedPrivateKey(object):
                     xprv = wallet.extended_private_key(path)
                     expected_xprv = bip32_vectors[seed][path]['xprv']
                     assert xprv == expected_xprv
+
+
+class TestHDWalletDerivationCache(object):
+
+    def test_prefixes_are_cached(self, bip32_vectors):
+        seed = list(bip32_vectors.keys())[0]
+        wallet = HDWallet()
+        wallet.root_priv = bip32_vectors[seed]['m']['xprv']
+        wallet.extended_private_key("m/0'/1/2'")
+        assert set(wallet.derivation_cache.nodes.keys()) == {
+            (2**31,), (2**31, 1), (2**31, 1, 2**31 + 2)}
+
+    def test_cached_prefix_is_not_rederived(self, bip32_vectors):
+        seed = list(bip32_vectors.keys())[0]
+        wallet = HDWallet()
+        wallet.root_priv = bip32_vectors[seed]['m']['xprv']
+        wallet.extended_private_key("m/0'/1")
+        with patch('hermit.bip32.BIP32Node.child', autospec=True, side_effect=hermit.bip32.BIP32Node.child) as mock_child:
+            xprv = wallet.extended_private_key("m/0'/1/2'")
+            assert mock_child.call_count == 1
+        assert xprv == bip32_vectors[seed]["m/0'/1/2'"]['xprv']
+
+    def test_least_recently_used_nodes_are_evicted(self, bip32_vectors):
+        seed = list(bip32_vectors.keys())[0]
+        wallet = HDWallet()
+        wallet.derivation_cache.max_size = 2
+        wallet.root_priv = bip32_vectors[seed]['m']['xprv']
+        wallet.extended_private_key("m/0'/1/2'")
+        assert list(wallet.derivation_cache.nodes.keys()) == [
+            (2**31, 1), (2**31, 1, 2**31 + 2)]
+
+    def test_lock_clears_cache(self, opensource_wallet_words):
+        wallet = HDWallet()
+        wallet.shards = FakeShards(opensource_wallet_words)
+        wallet.extended_private_key("m/45'/1'/120'/20/26")
+        assert len(wallet.derivation_cache) == 5
+        wallet.lock()
+        assert len(wallet.derivation_cache) == 0
+
+    def test_lock_clears_signature_memo(self, opensource_wallet_words):
+        wallet = HDWallet()
+        wallet.shards = FakeShards(opensource_wallet_words)
+        wallet.unlock()
+        wallet.signature_memo['key'] = {'signatures': []}
+        wallet.lock()
+        assert wallet.signature_memo == {}
+
+
+class TestHDWalletDeriveMany(object):
+
+    def test_bip32_vectors(self, bip32_vectors):
+        for seed in bip32_vectors:
+            wallet = HDWallet()
+            wallet.root_priv = bip32_vectors[seed]['m']['xprv']
+            paths = [path for path in bip32_vectors[seed] if path != "m"]
+            keys = wallet.derive_many(reversed(paths))
+            assert set(keys.keys()) == set(paths)
+            for path in paths:
+                assert keys[path]['xprv'] == bip32_vectors[seed][path]['xprv']
+                assert keys[path]['xpub'] == bip32_vectors[seed][path]['xpub']
+                assert keys[path]['public_key'] == bip32_vectors[seed][path]['pubkey']
+
+    def test_each_node_is_derived_once(self, opensource_wallet_words):
+        wallet = HDWallet()
+        wallet.shards = FakeShards(opensource_wallet_words)
+        paths = ["m/45'/1'/120'/20/{}".format(i) for i in range(10)]
+        paths += ["m/45'/1'/120'/21/{}".format(i) for i in range(10)]
+        with patch('hermit.bip32.BIP32Node.child', autospec=True, side_effect=hermit.bip32.BIP32Node.child) as mock_child:
+            wallet.derive_many(paths + paths)
+            # 3 hardened nodes, 2 change nodes, 20 leaves
+            assert mock_child.call_count == 25
+
+
+class TestHDWalletPublicDerivation(object):
+
+    def test_non_hardened_tail_is_derived_publicly(self, bip32_vectors):
+        seed = '000102030405060708090a0b0c0d0e0f'
+        wallet = HDWallet()
+        wallet.root_priv = bip32_vectors[seed]['m']['xprv']
+        path = "m/0'/1/2'/2/1000000000"
+        assert wallet.extended_public_key(path) == bip32_vectors[seed][path]['xpub']
+        assert list(wallet.public_derivation_cache.nodes.keys()) == [
+            (2**31, 1, 2**31 + 2, 2), (2**31, 1, 2**31 + 2, 2, 1000000000)]
+        assert (2**31, 1, 2**31 + 2, 2) not in wallet.derivation_cache.nodes
+
+    def test_child_public_keys(self, opensource_wallet_words):
+        wallet = HDWallet()
+        wallet.shards = FakeShards(opensource_wallet_words)
+        pubkeys = wallet.child_public_keys("m/45'/0'/0'/0", range(5))
+        assert pubkeys == [wallet.public_key("m/45'/0'/0'/0/{}".format(i))
+                           for i in range(5)]
+        keys = wallet.derive_many(["m/45'/0'/0'/0/{}".format(i) for i in range(5)])
+        assert pubkeys == [keys["m/45'/0'/0'/0/{}".format(i)]['public_key']
+                           for i in range(5)]
+
+    def test_lock_clears_public_cache(self, opensource_wallet_words):
+        wallet = HDWallet()
+        wallet.shards = FakeShards(opensource_wallet_words)
+        wallet.public_key("m/45'/0'/0'/0/0")
+        assert len(wallet.public_derivation_cache) == 2
+        wallet.lock()
+        assert len(wallet.public_derivation_cache) == 0
+
+
+class FakeDigestShards(FakeShards):
+    def __init__(self, words, digest='digest'):
+        FakeShards.__init__(self, words)
+        self.shards_digest = digest
+        self.wallet_words_calls = 0
+
+    def wallet_words(self):
+        self.wallet_words_calls += 1
+        return self.words
+
+    def digest(self):
+        return self.shards_digest
+
+
+class TestHDWalletPublicKeyCache(object):
+
+    def test_exported_keys_are_available_while_locked(self, tmp_path, opensource_wallet_words):
+        cache = PublicKeyCache(str(tmp_path / 'pubkeys'))
+        wallet = HDWallet(public_key_cache=cache)
+        wallet.shards = FakeDigestShards(opensource_wallet_words)
+        xpub = wallet.export_extended_public_key("m/45'/0'/0'/0")
+        pubkey = wallet.export_public_key("m/45'/0'/0'/0/7")
+        wallet.lock()
+
+        other = HDWallet(public_key_cache=PublicKeyCache(str(tmp_path / 'pubkeys')))
+        other.shards = FakeDigestShards(opensource_wallet_words)
+        assert other.extended_public_key("m/45'/0'/0'/0") == xpub
+        assert other.public_key("m/45'/0'/0'/0/7") == pubkey
+        # Derived publicly from the cached account xpub
+        assert other.public_key("m/45'/0'/0'/1/3") == wallet.public_key("m/45'/0'/0'/1/3")
+        assert other.shards.wallet_words_calls == 0
+        assert not other.unlocked()
+
+    def test_changed_shards_require_unlock(self, tmp_path, opensource_wallet_words):
+        wallet = HDWallet(public_key_cache=PublicKeyCache(str(tmp_path / 'pubkeys')))
+        wallet.shards = FakeDigestShards(opensource_wallet_words)
+        wallet.export_extended_public_key("m/45'/0'/0'")
+        wallet.lock()
+
+        wallet.shards.shards_digest = 'changed'
+        wallet.export_extended_public_key("m/45'/0'/0'")
+        assert wallet.shards.wallet_words_calls == 2
+
+    def test_only_account_xpubs_are_stored(self, tmp_path, opensource_wallet_words):
+        cache = PublicKeyCache(str(tmp_path / 'pubkeys'))
+        wallet = HDWallet(public_key_cache=cache)
+        wallet.shards = FakeDigestShards(opensource_wallet_words)
+        for index in range(5):
+            wallet.export_public_key("m/45'/0'/0'/0/{}".format(index))
+        assert list(cache.xpubs('digest')) == ["m/45'/0'/0'"]
+
+    def test_public_keys_are_not_stored(self, tmp_path, opensource_wallet_words):
+        filename = tmp_path / 'pubkeys'
+        wallet = HDWallet(public_key_cache=PublicKeyCache(str(filename)))
+        wallet.shards = FakeDigestShards(opensource_wallet_words)
+        wallet.extended_public_key("m/45'/0'/0'")
+        wallet.public_key("m/45'/0'/0'/0/7")
+        assert not filename.exists()